@@ -0,0 +1,151 @@
+"""Analítica de ventas sobre tablas de acumulados.
+
+Cada venta registrada encola una tarea (app/tareas.py) que suma su aporte a los acumulados por
+día, producto, categoría y tipo de envío (`acumular_venta`), de modo que las consultas de los
+endpoints leen pocas filas sin importar el tamaño del historial. La tarea corre en segundo plano
+después del commit de la venta: los acumulados son eventualmente consistentes y pueden ir unos
+instantes por detrás. `reconstruir` recalcula todo desde Venta → Pedido → CarritoProducto →
+Producto/ProductoCategoria.
+
+Los ingresos por día y por envío son el total de la venta (incluye envío); por producto y
+categoría son precio × cantidad de las líneas del carrito.
+"""
+
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import delete, desc, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+V, P, CP = models.Venta, models.Pedido, models.CarritoProducto
+PR, PC = models.Producto, models.ProductoCategoria
+
+def _upsert_sumando(stmt, modelo, clave: str):
+    """ON CONFLICT (clave) DO UPDATE sumando las columnas acumuladas"""
+    t = modelo.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=[clave],
+        set_={c.name: t.c[c.name] + stmt.excluded[c.name] for c in t.columns if c.name != clave},
+    )
+
+def _lineas_por(columna, carrito_id):
+    """(columna, 1 venta, unidades, ingresos) de las líneas de un carrito agrupadas por `columna`"""
+    q = select(
+        columna, literal(1), func.sum(CP.cantidad), func.sum(PR.precio * CP.cantidad)
+    ).select_from(CP).join(PR, PR.pk_id_producto == CP.fk_id_producto)
+    if columna is PC.fk_id_categoria:
+        q = q.join(PC, PC.fk_id_producto == CP.fk_id_producto)
+    return q.where(CP.fk_id_carrito_compra == carrito_id).group_by(columna)
+
+def acumular_venta(db: Session, venta_id: int) -> None:
+    """Sumar una venta a los acumulados (sin commit).
+
+    Es el manejador de la tarea `analitica.acumular_venta` (app/tareas.py): corre en segundo plano
+    después del commit de la venta, y su transacción se confirma al marcar la tarea como hecha.
+    """
+    fila = db.execute(
+        select(V.fecha_venta, V.total, P.fk_id_carrito_compra, P.fk_id_envio)
+        .join(P, P.pk_id_pedido == V.fk_id_pedido).where(V.pk_id_venta == venta_id)
+    ).first()
+    if fila is None:
+        raise ValueError('Venta no existe')
+    fecha, total, carrito_id, envio_id = fila
+
+    insertar = {'postgresql': pg_insert, 'sqlite': sqlite_insert}.get(db.get_bind().dialect.name)
+    if insertar is None:
+        # Sin ON CONFLICT en el motor: recalcular todo es lento pero correcto
+        reconstruir(db)
+        return
+
+    columnas = ['ventas', 'unidades', 'ingresos']
+    for modelo, columna in (
+        (models.VentaPorProducto, CP.fk_id_producto), (models.VentaPorCategoria, PC.fk_id_categoria),
+    ):
+        stmt = insertar(modelo).from_select([columna.key] + columnas, _lineas_por(columna, carrito_id))
+        db.execute(_upsert_sumando(stmt, modelo, columna.key))
+
+    if fecha is not None:
+        unidades = select(func.coalesce(func.sum(CP.cantidad), 0)).where(
+            CP.fk_id_carrito_compra == carrito_id
+        ).scalar_subquery()
+        stmt = insertar(models.VentaDiaria).values(dia=fecha.date(), ventas=1, unidades=unidades, ingresos=total)
+        db.execute(_upsert_sumando(stmt, models.VentaDiaria, 'dia'))
+    stmt = insertar(models.VentaPorEnvio).values(fk_id_envio=envio_id, ventas=1, ingresos=total)
+    db.execute(_upsert_sumando(stmt, models.VentaPorEnvio, 'fk_id_envio'))
+
+def reconstruir(conexion) -> None:
+    """Recalcular todos los acumulados desde el historial (Session o Connection; sin commit)"""
+    for modelo in (models.VentaDiaria, models.VentaPorProducto, models.VentaPorCategoria, models.VentaPorEnvio):
+        conexion.execute(delete(modelo))
+
+    unidades = select(func.coalesce(func.sum(CP.cantidad), 0)).where(
+        CP.fk_id_carrito_compra == P.fk_id_carrito_compra
+    ).scalar_subquery()
+    por_venta = select(
+        func.date(V.fecha_venta).label('dia'), V.total, unidades.label('unidades')
+    ).join(P, P.pk_id_pedido == V.fk_id_pedido).where(V.fecha_venta.isnot(None)).subquery()
+    conexion.execute(insert(models.VentaDiaria).from_select(
+        ['dia', 'ventas', 'unidades', 'ingresos'],
+        select(por_venta.c.dia, func.count(), func.sum(por_venta.c.unidades), func.sum(por_venta.c.total))
+        .group_by(por_venta.c.dia),
+    ))
+
+    for modelo, columna in (
+        (models.VentaPorProducto, CP.fk_id_producto), (models.VentaPorCategoria, PC.fk_id_categoria),
+    ):
+        q = select(
+            columna, func.count(func.distinct(V.pk_id_venta)), func.sum(CP.cantidad), func.sum(PR.precio * CP.cantidad)
+        ).select_from(V).join(P, P.pk_id_pedido == V.fk_id_pedido).join(
+            CP, CP.fk_id_carrito_compra == P.fk_id_carrito_compra
+        ).join(PR, PR.pk_id_producto == CP.fk_id_producto)
+        if columna is PC.fk_id_categoria:
+            q = q.join(PC, PC.fk_id_producto == CP.fk_id_producto)
+        conexion.execute(insert(modelo).from_select(
+            [columna.key, 'ventas', 'unidades', 'ingresos'], q.group_by(columna)
+        ))
+
+    conexion.execute(insert(models.VentaPorEnvio).from_select(
+        ['fk_id_envio', 'ventas', 'ingresos'],
+        select(P.fk_id_envio, func.count(), func.sum(V.total)).join(P, P.pk_id_pedido == V.fk_id_pedido)
+        .group_by(P.fk_id_envio),
+    ))
+
+def reconstruir_y_confirmar(db: Session) -> None:
+    reconstruir(db)
+    db.commit()
+
+# Consultas
+
+def ventas_por_dia(db: Session, desde: Optional[date] = None, hasta: Optional[date] = None):
+    q = select(models.VentaDiaria)
+    if desde is not None:
+        q = q.where(models.VentaDiaria.dia >= desde)
+    if hasta is not None:
+        q = q.where(models.VentaDiaria.dia <= hasta)
+    return db.execute(q.order_by(models.VentaDiaria.dia)).scalars().all()
+
+def ventas_por_producto(db: Session, limit: int):
+    """Productos con más ingresos (usa el índice sobre ingresos)"""
+    vp = models.VentaPorProducto
+    q = select(vp.fk_id_producto, PR.nombre, PR.marca, vp.ventas, vp.unidades, vp.ingresos).outerjoin(
+        PR, PR.pk_id_producto == vp.fk_id_producto
+    ).order_by(desc(vp.ingresos)).limit(limit)
+    return [dict(fila._mapping) for fila in db.execute(q)]
+
+def ventas_por_categoria(db: Session):
+    vc = models.VentaPorCategoria
+    q = select(vc.fk_id_categoria, models.Categoria.descripcion, vc.ventas, vc.unidades, vc.ingresos).outerjoin(
+        models.Categoria, models.Categoria.pk_id_categoria == vc.fk_id_categoria
+    ).order_by(desc(vc.ingresos))
+    return [dict(fila._mapping) for fila in db.execute(q)]
+
+def ventas_por_envio(db: Session):
+    ve = models.VentaPorEnvio
+    q = select(ve.fk_id_envio, models.Envio.tipo_envio, ve.ventas, ve.ingresos).outerjoin(
+        models.Envio, models.Envio.pk_id_envio == ve.fk_id_envio
+    ).order_by(desc(ve.ingresos))
+    return [dict(fila._mapping) for fila in db.execute(q)]
@@ -0,0 +1,151 @@
+"""Precalentamiento del worker al arrancar y estado de disponibilidad (GET /ready).
+
+El ciclo de vida de la app lanza `precalentamiento` en segundo plano: abre a la vez
+DB_POOL_PRECALENTAR conexiones del pool (y de la réplica, si hay) y las devuelve, y ejecuta
+una vez las consultas del catálogo y del carrito. Así quedan compiladas las sentencias, se
+construye el índice de búsqueda en memoria y las páginas calientes quedan en el caché de la
+base. Mientras tanto /health responde (el proceso vive), pero /ready responde 503. Si la base
+no responde se reintenta con espera creciente, sin bloquear el arranque del servidor.
+
+El esquema no se toca aquí: se aplica con `python migrar.py`. Solo se informa si faltan
+migraciones.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+
+from app import crud, database, migraciones
+from app.config import DB_POOL_PRECALENTAR, PRODUCTOS_PAGE_SIZE
+
+logger = logging.getLogger("uvicorn.error")
+
+# Referencia para medir cuánto tarda el worker desde que se importa la app hasta estar listo
+_importado_en = time.perf_counter()
+
+def _motores() -> dict:
+    """Motores a precalentar: la primaria y, si hay, la réplica (los async si DB_ASYNC)"""
+    motores = {'primaria': database.async_engine or database.engine}
+    replica = database.async_read_engine or database.read_engine
+    if replica is not None:
+        motores['replica'] = replica
+    return motores
+
+async def _abrir_conexiones(motor, n: int) -> int:
+    """Abrir `n` conexiones a la vez y devolverlas al pool; retorna cuántas se abrieron"""
+    pool = getattr(motor, 'sync_engine', motor).pool
+    if not isinstance(pool, QueuePool):
+        return 0  # SQLite en memoria: una conexión por hilo, sin pool que llenar
+    n = min(n, pool.size())
+    if n <= 0:
+        return 0
+    if isinstance(motor, AsyncEngine):
+        conexiones = await asyncio.gather(*(motor.connect().start() for _ in range(n)), return_exceptions=True)
+        cerrar = [c.close() for c in conexiones if not isinstance(c, BaseException)]
+        await asyncio.gather(*cerrar)
+    else:
+        conexiones = await asyncio.gather(*(run_in_threadpool(motor.connect) for _ in range(n)), return_exceptions=True)
+        for c in conexiones:
+            if not isinstance(c, BaseException):
+                c.close()
+    errores = [c for c in conexiones if isinstance(c, BaseException)]
+    if errores:
+        raise errores[0]
+    return n
+
+def _consultas_calientes(db) -> None:
+    """Las consultas de las rutas más usadas, con parámetros que no devuelven nada o casi nada"""
+    crud.listar_productos(db, PRODUCTOS_PAGE_SIZE)
+    crud.buscar_productos(db, 'precalentamiento', 1)  # en SQLite construye el índice invertido
+    crud.listar_envios(db)
+    crud.obtener_carrito_cliente(db, 0)
+    crud.filas_carrito_productos(db, 0)
+    crud.resumenes_carritos(db, [0])
+
+def _version_esquema(db) -> int:
+    return migraciones.version_actual(db.connection())
+
+class Precalentamiento:
+    """Tarea de arranque que marca el worker como listo al terminar"""
+
+    def __init__(self, conexiones: int):
+        self.conexiones = conexiones
+        self.listo = False
+        self.intentos = 0
+        self.ultimo_error: Optional[str] = None
+        self.tiempos: dict[str, float] = {}
+        self.conexiones_abiertas: dict[str, int] = {}
+        self.esquema: dict[str, int] = {}
+        self._tarea: Optional[asyncio.Task] = None
+
+    def iniciar(self) -> None:
+        self.tiempos['importacion_segundos'] = round(time.perf_counter() - _importado_en, 3)
+        self._tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self) -> None:
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+
+    async def _bucle(self) -> None:
+        inicio = time.perf_counter()
+        while True:
+            self.intentos += 1
+            try:
+                await self._ejecutar()
+                break
+            except Exception as e:
+                self.ultimo_error = f'{type(e).__name__}: {e}'
+                espera = min(2 ** self.intentos, 30)
+                logger.warning("Precalentamiento fallido (intento %d), se reintenta en %d s: %s",
+                               self.intentos, espera, self.ultimo_error)
+                await asyncio.sleep(espera)
+        self.tiempos['precalentamiento_segundos'] = round(time.perf_counter() - inicio, 3)
+        self.tiempos['arranque_segundos'] = round(time.perf_counter() - _importado_en, 3)
+        self.listo = True
+        logger.info("Worker listo en %.2f s: %s", self.tiempos['arranque_segundos'], self.tiempos)
+
+    async def _ejecutar(self) -> None:
+        etapa = time.perf_counter()
+        for nombre, motor in _motores().items():
+            try:
+                self.conexiones_abiertas[nombre] = await _abrir_conexiones(motor, self.conexiones)
+            except Exception:
+                if nombre == 'primaria':
+                    raise
+                # Sin réplica las lecturas pasan a la primaria (app/database.py): no impide estar listo
+                logger.warning("No se pudo precalentar el pool de la réplica", exc_info=True)
+        self.tiempos['pool_segundos'] = round(time.perf_counter() - etapa, 3)
+
+        etapa = time.perf_counter()
+        await database.con_sesion(_consultas_calientes)
+        self.tiempos['consultas_segundos'] = round(time.perf_counter() - etapa, 3)
+
+        esperada = migraciones.MIGRACIONES[-1].version
+        version = await database.con_sesion(_version_esquema)
+        self.esquema = {'version': version, 'esperada': esperada}
+        if version < esperada:
+            logger.warning("El esquema está en la versión %d y el código espera la %d: falta `python migrar.py`",
+                           version, esperada)
+
+    def estadisticas(self) -> dict:
+        return {
+            'listo': self.listo,
+            'intentos': self.intentos,
+            'ultimo_error': None if self.listo else self.ultimo_error,
+            'tiempos': self.tiempos,
+            'conexiones_abiertas': self.conexiones_abiertas,
+            'esquema': self.esquema,
+        }
+
+precalentamiento = Precalentamiento(DB_POOL_PRECALENTAR)
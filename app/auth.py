@@ -1,3 +1,8 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import jwt, JWTError
@@ -6,9 +11,13 @@ from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
-from app.config import JWT_SECRET_KEY, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from app.database import get_db
+from app.config import (
+    JWT_SECRET_KEY, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
+    BCRYPT_ROUNDS, HASH_WORKERS, HASH_MAX_PENDIENTES,
+)
+from app.database import Sesion, get_sesion, ejecutar
 from app import models
+from app.cache import usuarios_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -18,7 +27,65 @@ def verify_password(plain: str, hashed: str) -> bool:
     return bcrypt.checkpw(plain.encode('utf-8'), hashed.encode('utf-8'))
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+def necesita_rehash(hashed: str) -> bool:
+    """True si el hash guardado usa un costo distinto a BCRYPT_ROUNDS (formato $2b$<costo>$...)"""
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+class PoolHashing:
+    """Hilos dedicados a bcrypt con tope de trabajos pendientes (bcrypt libera el GIL).
+
+    Si ya hay max_pendientes trabajos en curso o en cola, rechaza de inmediato en lugar de
+    encolar: así una ráfaga de logins no deja sin CPU al resto de peticiones del worker.
+    """
+
+    def __init__(self, workers: int, max_pendientes: int):
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self.pendientes = 0
+        self.rechazados = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._lock = threading.Lock()
+
+    async def ejecutar(self, fn, *args):
+        with self._lock:
+            if self.pendientes >= self.max_pendientes:
+                self.rechazados += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Servidor ocupado, intenta de nuevo en unos segundos",
+                    headers={"Retry-After": "1"},
+                )
+            self.pendientes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pendientes': self.max_pendientes,
+                'pendientes': self.pendientes,
+                'rechazados': self.rechazados,
+                'bcrypt_rounds': BCRYPT_ROUNDS,
+            }
+
+pool_hashing = PoolHashing(workers=HASH_WORKERS, max_pendientes=HASH_MAX_PENDIENTES)
+
+async def verificar_contrasena(plain: str, hashed: str) -> bool:
+    """verify_password en el pool de hashing (503 si está saturado)"""
+    return await pool_hashing.ejecutar(verify_password, plain, hashed)
+
+async def hashear_contrasena(password: str) -> str:
+    """get_password_hash en el pool de hashing (503 si está saturado)"""
+    return await pool_hashing.ejecutar(get_password_hash, password)
 
 # Tokens
 
@@ -29,7 +96,36 @@ def create_access_token(subject: str, expires_minutes: int = ACCESS_TOKEN_EXPIRE
 
 # Dependency current user
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> models.Cliente:
+@dataclass(frozen=True)
+class UsuarioActual:
+    """Identidad del usuario autenticado; es lo que se guarda en la caché de tokens"""
+    pk_id_cliente: int
+    correo: str
+    primer_nombre: str
+    primer_apellido: str
+    es_administrador: bool
+
+    @classmethod
+    def desde_cliente(cls, cliente: models.Cliente) -> "UsuarioActual":
+        return cls(
+            pk_id_cliente=cliente.pk_id_cliente,
+            correo=cliente.correo,
+            primer_nombre=cliente.primer_nombre,
+            primer_apellido=cliente.primer_apellido,
+            es_administrador=bool(cliente.es_administrador),
+        )
+
+def invalidar_usuario_cache(cliente_id: int) -> int:
+    """Descarta los tokens cacheados de un cliente (p. ej. al cambiar su rol)"""
+    return usuarios_cache.invalidar_si(lambda u: u.pk_id_cliente == cliente_id)
+
+def _cliente_por_correo(db: Session, correo: str) -> Optional[models.Cliente]:
+    return db.query(models.Cliente).filter(models.Cliente.correo == correo).first()
+
+async def get_current_user(db: Sesion = Depends(get_sesion), token: str = Depends(oauth2_scheme)) -> UsuarioActual:
+    usuario = usuarios_cache.obtener(token)
+    if usuario is not None:
+        return usuario
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Token inválido o expirado",
@@ -42,7 +138,11 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    cliente = db.query(models.Cliente).filter(models.Cliente.correo == correo).first()
+    cliente = await ejecutar(db, _cliente_por_correo, correo)
     if not cliente:
         raise credentials_exception
-    return cliente
+    usuario = UsuarioActual.desde_cliente(cliente)
+    # La entrada nunca sobrevive al vencimiento del propio token
+    restante = payload.get("exp", 0) - time.time()
+    usuarios_cache.guardar(token, usuario, ttl=restante)
+    return usuario
@@ -1,17 +1,24 @@
 """Utilidades de autorización para funciones administrativas"""
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.auth import get_current_user
-from app import models
+from app import crud
+from app.auth import get_current_user, UsuarioActual
+from app.database import Sesion, get_sesion, ejecutar
+
+async def confirmar_administrador(db: Sesion, usuario: UsuarioActual) -> bool:
+    """El rol de administrador de la caché de tokens, confirmado en la base.
+
+    La caché es por worker: si otro proceso le quitó el rol, aquí seguiría hasta que venza
+    AUTH_CACHE_TTL_SECONDS. Solo consulta la base cuando la caché dice que es administrador.
+    """
+    return usuario.es_administrador and await ejecutar(db, crud.es_administrador, usuario.pk_id_cliente)
 
 async def get_current_admin_user(
-    current_user: models.Cliente = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+    current_user: UsuarioActual = Depends(get_current_user),
+    db: Sesion = Depends(get_sesion),
+) -> UsuarioActual:
     """Verificar que el usuario actual sea administrador"""
-    if not current_user or not current_user.es_administrador:
+    if not current_user or not await confirmar_administrador(db, current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Acceso denegado. Se requieren permisos de administrador"
@@ -0,0 +1,138 @@
+"""Búsqueda de texto completo en productos (nombre, marca, descripción).
+
+En PostgreSQL se usa el índice GIN `ix_producto_busqueda` sobre la expresión
+`models.vector_busqueda_producto()` (migración v5)
+y `ts_rank` para ordenar. En otros motores (SQLite en desarrollo y pruebas) se usa
+`IndiceInvertido`, un índice en memoria del proceso que se construye desde la tabla y se
+mantiene con las altas de productos de ese proceso. Las de otros workers se detectan porque
+cambia la cantidad o el mayor ID de producto (se reconstruye en la siguiente búsqueda); las
+ediciones hechas en otro worker se ven a más tardar al vencer BUSQUEDA_INDICE_TTL_SECONDS.
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import BUSQUEDA_INDICE_TTL_SECONDS
+
+# PostgreSQL
+
+vector_producto = models.vector_busqueda_producto
+
+def consulta_pg(texto: str):
+    return func.websearch_to_tsquery(models.ts_config(), texto)
+
+# Índice invertido en memoria
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+PESOS = {'nombre': 3.0, 'marca': 2.0, 'descripcion': 1.0}
+
+def tokenizar(texto: Optional[str]) -> list[str]:
+    """Minúsculas, sin tildes, tokens alfanuméricos de 2+ caracteres"""
+    if not texto:
+        return []
+    plano = unicodedata.normalize('NFKD', texto.lower()).encode('ascii', 'ignore').decode('ascii')
+    return [t for t in _TOKEN.findall(plano) if len(t) > 1]
+
+class IndiceInvertido:
+    """token -> {pk_id_producto: peso acumulado por campo}; ranking tipo tf-idf"""
+
+    def __init__(self, ttl: float = BUSQUEDA_INDICE_TTL_SECONDS):
+        self.ttl = ttl
+        self._postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self._documentos: dict[int, list[str]] = {}
+        self._construido = False
+        self._construido_en = 0.0
+        self._firma: Optional[tuple] = None
+        self._lock = threading.RLock()
+
+    def _agregar(self, pk: int, campos: dict) -> None:
+        self._quitar(pk)
+        tokens = []
+        for campo, peso in PESOS.items():
+            for token in tokenizar(campos.get(campo)):
+                posting = self._postings[token]
+                posting[pk] = posting.get(pk, 0.0) + peso
+                tokens.append(token)
+        self._documentos[pk] = tokens
+
+    def _quitar(self, pk: int) -> None:
+        for token in set(self._documentos.pop(pk, ())):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(pk, None)
+                if not posting:
+                    del self._postings[token]
+
+    @staticmethod
+    def _firma_tabla(db: Session) -> tuple:
+        """(cantidad, mayor ID) de productos: cambia con las altas y bajas de cualquier worker"""
+        p = models.Producto
+        return tuple(db.execute(select(func.count(), func.max(p.pk_id_producto))).one())
+
+    def construir(self, db: Session) -> None:
+        p = models.Producto
+        firma = self._firma_tabla(db)
+        filas = db.execute(select(p.pk_id_producto, p.nombre, p.marca, p.descripcion))
+        with self._lock:
+            self._postings.clear()
+            self._documentos.clear()
+            for pk, nombre, marca, descripcion in filas:
+                self._agregar(pk, {'nombre': nombre, 'marca': marca, 'descripcion': descripcion})
+            self._construido = True
+            self._construido_en = time.monotonic()
+            self._firma = firma
+
+    def _vigente(self, db: Session) -> bool:
+        if not self._construido:
+            return False
+        if self.ttl > 0 and time.monotonic() - self._construido_en > self.ttl:
+            return False
+        return self._firma_tabla(db) == self._firma
+
+    def actualizar(self, producto: models.Producto) -> None:
+        """Indexar un producto nuevo o modificado (si el índice ya está construido)"""
+        with self._lock:
+            if self._construido:
+                nuevo = producto.pk_id_producto not in self._documentos
+                self._agregar(producto.pk_id_producto, {
+                    'nombre': producto.nombre, 'marca': producto.marca, 'descripcion': producto.descripcion,
+                })
+                if nuevo and self._firma is not None:
+                    cantidad, mayor = self._firma
+                    self._firma = (cantidad + 1, max(mayor or 0, producto.pk_id_producto))
+
+    def invalidar(self) -> None:
+        """Forzar reconstrucción en la próxima búsqueda (p. ej. tras cargas masivas)"""
+        with self._lock:
+            self._construido = False
+
+    def buscar(self, db: Session, texto: str, limit: int, offset: int = 0) -> list[tuple[int, float]]:
+        """(pk, score) de los productos que contienen todos los términos, de mayor a menor score"""
+        with self._lock:
+            if not self._vigente(db):
+                self.construir(db)
+            terminos = set(tokenizar(texto))
+            if not terminos:
+                return []
+            postings = [self._postings.get(t, {}) for t in terminos]
+            if not all(postings):
+                return []
+            total = max(len(self._documentos), 1)
+            candidatos = set.intersection(*(set(p) for p in postings))
+            puntajes = {
+                pk: sum(p[pk] * math.log(1 + total / len(p)) for p in postings)
+                for pk in candidatos
+            }
+        orden = sorted(puntajes.items(), key=lambda kv: (-kv[1], kv[0]))
+        return orden[offset:offset + limit]
+
+indice_productos = IndiceInvertido()
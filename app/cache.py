@@ -0,0 +1,90 @@
+"""Caché en proceso LRU con expiración por entrada (TTL)"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from app.config import (
+    AUTH_CACHE_MAXSIZE, AUTH_CACHE_TTL_SECONDS, RESPUESTAS_CACHE_MAXSIZE, RESPUESTAS_CACHE_TTL_SECONDS,
+)
+
+class CacheTTL:
+    """Diccionario acotado: descarta la entrada menos usada al llenarse y las vencidas al leerlas"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expira = entry
+            if expira <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def guardar(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidar(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidar_si(self, predicado: Callable[[Any], bool]) -> int:
+        """Elimina las entradas cuyo valor cumple el predicado. Retorna cuántas se eliminaron"""
+        with self._lock:
+            claves = [k for k, (v, _) in self._data.items() if predicado(v)]
+            for k in claves:
+                del self._data[k]
+            return len(claves)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+# Token JWT -> identidad del usuario autenticado (ver app.auth.get_current_user)
+usuarios_cache = CacheTTL(maxsize=AUTH_CACHE_MAXSIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+# (recurso, ruta, query) -> cuerpo JSON ya serializado + ETag (ver app.cache_http)
+respuestas_cache = CacheTTL(maxsize=RESPUESTAS_CACHE_MAXSIZE, ttl=RESPUESTAS_CACHE_TTL_SECONDS)
+
+# recurso -> time.monotonic() de su última invalidación en este proceso
+_invalidado_en: dict[str, float] = {}
+
+def invalidar_respuestas(recurso: str) -> int:
+    """Descarta las respuestas cacheadas de un recurso (p. ej. 'productos') tras una escritura"""
+    _invalidado_en[recurso] = time.monotonic()
+    return respuestas_cache.invalidar_si(lambda r: r.recurso == recurso)
+
+def invalidado_hace(recurso: str) -> float:
+    """Segundos desde la última invalidación del recurso (infinito si nunca se invalidó)"""
+    return time.monotonic() - _invalidado_en.get(recurso, float('-inf'))
@@ -0,0 +1,55 @@
+"""Respuestas GET cacheadas en el servidor con ETag fuerte y GET condicional.
+
+El cuerpo JSON se serializa una vez y se guarda con su ETag (sha256 del cuerpo) en
+`respuestas_cache`; las peticiones siguientes no consultan la base ni serializan, y si
+traen `If-None-Match` con el mismo ETag reciben 304 sin cuerpo. Las escrituras del
+recurso (crud.crear_producto, crud.crear_envio) invalidan sus entradas, pero solo en el
+proceso que las hizo: con varios workers, los demás sirven la respuesta anterior hasta que
+vence RESPUESTAS_CACHE_TTL_SECONDS.
+
+Con réplica de lectura, lo generado poco después de una invalidación no se guarda: la
+réplica podría no tener todavía la escritura y la entrada vieja duraría todo el TTL.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.cache import invalidado_hace, respuestas_cache
+from app.config import DB_LECTURA_PRIMARIA_SEGUNDOS, RESPUESTAS_CACHE_CONTROL
+from app.database import hay_replica
+
+@dataclass(frozen=True)
+class RespuestaCacheada:
+    recurso: str
+    cuerpo: bytes
+    etag: str
+
+def _etag(cuerpo: bytes) -> str:
+    return '"' + hashlib.sha256(cuerpo).hexdigest()[:32] + '"'
+
+def _coincide(if_none_match: str, etag: str) -> bool:
+    # Comparación débil (RFC 9110 §13.1.2): se ignora el prefijo W/
+    candidatos = [c.strip().removeprefix('W/') for c in if_none_match.split(',')]
+    return '*' in candidatos or etag in candidatos
+
+async def responder_con_cache(
+    request: Request, recurso: str, generar: Callable[[], Awaitable[BaseModel | bytes]]
+) -> Response:
+    """Responde desde la caché o genera, serializa y guarda la respuesta de `recurso`"""
+    clave = (recurso, request.url.path, tuple(sorted(request.query_params.multi_items())))
+    entrada = respuestas_cache.obtener(clave)
+    if entrada is None:
+        resultado = await generar()
+        cuerpo = resultado if isinstance(resultado, bytes) else resultado.model_dump_json().encode('utf-8')
+        entrada = RespuestaCacheada(recurso=recurso, cuerpo=cuerpo, etag=_etag(cuerpo))
+        if not hay_replica() or invalidado_hace(recurso) > DB_LECTURA_PRIMARIA_SEGUNDOS:
+            respuestas_cache.guardar(clave, entrada)
+    headers = {'ETag': entrada.etag, 'Cache-Control': RESPUESTAS_CACHE_CONTROL}
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and _coincide(if_none_match, entrada.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entrada.cuerpo, media_type='application/json', headers=headers)
@@ -0,0 +1,37 @@
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from app import analitica, schemas
+from app.auth_utils import get_current_admin_user
+from app.database import Sesion, get_sesion, get_sesion_lectura, ejecutar
+
+router = APIRouter(prefix="/analitica", tags=["analitica"], dependencies=[Depends(get_current_admin_user)])
+
+@router.get("/ventas/diarias", response_model=list[schemas.VentasDia])
+async def ventas_diarias(
+    desde: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    hasta: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    db: Sesion = Depends(get_sesion_lectura),
+):
+    """Ventas, unidades e ingresos por día (solo admin)"""
+    return await ejecutar(db, analitica.ventas_por_dia, desde, hasta)
+
+@router.get("/ventas/productos", response_model=list[schemas.VentasProducto])
+async def ventas_productos(limit: int = Query(20, ge=1, le=200), db: Sesion = Depends(get_sesion_lectura)):
+    """Productos con más ingresos (solo admin)"""
+    return await ejecutar(db, analitica.ventas_por_producto, limit)
+
+@router.get("/ventas/categorias", response_model=list[schemas.VentasCategoria])
+async def ventas_categorias(db: Sesion = Depends(get_sesion_lectura)):
+    """Ingresos por categoría (solo admin)"""
+    return await ejecutar(db, analitica.ventas_por_categoria)
+
+@router.get("/ventas/envios", response_model=list[schemas.VentasEnvio])
+async def ventas_envios(db: Sesion = Depends(get_sesion_lectura)):
+    """Ingresos por tipo de envío (solo admin)"""
+    return await ejecutar(db, analitica.ventas_por_envio)
+
+@router.post("/reconstruir", status_code=204)
+async def reconstruir(db: Sesion = Depends(get_sesion)):
+    """Recalcular los acumulados desde el historial completo (solo admin)"""
+    await ejecutar(db, analitica.reconstruir_y_confirmar)
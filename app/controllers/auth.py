@@ -1,52 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
 from app import schemas, crud
-from app.database import get_db
-from app.auth import get_password_hash, verify_password, create_access_token, get_current_user
+from app.database import Sesion, get_sesion, ejecutar
+from app.auth import (
+    hashear_contrasena, verificar_contrasena, necesita_rehash, create_access_token, get_current_user,
+)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", response_model=schemas.ClienteOut, status_code=201)
-def register(data: schemas.ClienteCreate, db: Session = Depends(get_db)):
+async def register(data: schemas.ClienteCreate, db: Sesion = Depends(get_sesion)):
     # Validar correo único
-    existente = crud.obtener_cliente_por_correo(db, data.correo)
+    existente = await ejecutar(db, crud.obtener_cliente_por_correo, data.correo)
     if existente:
         raise HTTPException(status_code=400, detail="Correo ya registrado")
     
-    # Hashear contraseña
-    hashed = get_password_hash(data.contrasena)
+    # Hashear contraseña en el pool de bcrypt (503 si está saturado)
+    hashed = await hashear_contrasena(data.contrasena)
     
-    # Crear cliente con contraseña hasheada
-    from app import models
-    cliente = models.Cliente(
-        primer_nombre=data.primer_nombre,
-        segundo_nombre=data.segundo_nombre,
-        primer_apellido=data.primer_apellido,
-        segundo_apellido=data.segundo_apellido,
-        fecha_nac=data.fecha_nac,
-        cedula=data.cedula,
-        correo=data.correo,
-        contrasena=hashed,
-        es_administrador=False
-    )
-    db.add(cliente)
-    db.flush()  # ID disponible
-    
-    # Crear carrito automático
-    carrito = models.CarritoCompra(fk_id_cliente=cliente.pk_id_cliente)
-    db.add(carrito)
-    db.commit()
-    db.refresh(cliente)
-    return cliente
+    # Crear cliente con contraseña hasheada y su carrito automático
+    return await ejecutar(db, crud.crear_cliente, data, hashed)
 
 @router.post("/login", response_model=schemas.Token)
-def login(payload: schemas.LoginRequest, db: Session = Depends(get_db)):
-    cliente = crud.obtener_cliente_por_correo(db, payload.correo)
-    if not cliente or not verify_password(payload.contrasena, cliente.contrasena):
+async def login(payload: schemas.LoginRequest, db: Sesion = Depends(get_sesion)):
+    cliente = await ejecutar(db, crud.obtener_cliente_por_correo, payload.correo)
+    if not cliente or not await verificar_contrasena(payload.contrasena, cliente.contrasena):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciales inválidas")
+    # Migrar el hash al costo configurado aprovechando que tenemos la contraseña en claro
+    if necesita_rehash(cliente.contrasena):
+        try:
+            nuevo_hash = await hashear_contrasena(payload.contrasena)
+            await ejecutar(db, crud.actualizar_contrasena, cliente.pk_id_cliente, nuevo_hash)
+        except HTTPException:
+            pass  # pool saturado: se reintenta en el próximo login
     token = create_access_token(subject=cliente.correo)
     return {"access_token": token, "token_type": "bearer"}
 
 @router.get("/me", response_model=schemas.UserMe)
-def me(current=Depends(get_current_user)):
+async def me(current=Depends(get_current_user)):
     return current
@@ -1,59 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app import crud, schemas
-from app.database import get_db
-from app.auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app import crud, mantenimiento, schemas
+from app.config import CARRITO_ABANDONO_HORAS, LOTE_MAX_IDS
+from app.database import Sesion, get_sesion, get_sesion_lectura, ejecutar
+from app.auth import UsuarioActual, get_current_user
+from app.auth_utils import get_current_admin_user
+from app.serializacion import RespuestaJSON, filas_a_json
 
 router = APIRouter(prefix="/carrito", tags=["carrito"])
 
 @router.get("/me", response_model=schemas.CarritoOut)
-def obtener_carrito_me(db: Session = Depends(get_db), current=Depends(get_current_user)):
-    carrito = crud.obtener_carrito_cliente(db, current.pk_id_cliente)
+async def obtener_carrito_me(db: Sesion = Depends(get_sesion), current=Depends(get_current_user)):
+    carrito = await ejecutar(db, crud.obtener_carrito_cliente, current.pk_id_cliente)
     if not carrito:
         raise HTTPException(status_code=404, detail='Carrito no encontrado')
     return carrito
 
+@router.get("/resumenes", response_model=list[schemas.CarritoResumen])
+async def obtener_resumenes(ids: list[int] = Query(...), db: Sesion = Depends(get_sesion_lectura)):
+    """Resumen de varios carritos en una sola consulta (?ids=1&ids=2)"""
+    if len(ids) > LOTE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f'Máximo {LOTE_MAX_IDS} carritos por consulta')
+    resumenes = await ejecutar(db, crud.resumenes_carritos, ids)
+    return [schemas.CarritoResumen(**resumenes[cid]) for cid in dict.fromkeys(ids)]
+
 @router.get("/{id_cliente}", response_model=schemas.CarritoOut)
-def obtener_carrito(id_cliente: int, db: Session = Depends(get_db)):
-    carrito = crud.obtener_carrito_cliente(db, id_cliente)
+async def obtener_carrito(id_cliente: int, db: Sesion = Depends(get_sesion)):
+    carrito = await ejecutar(db, crud.obtener_carrito_cliente, id_cliente)
     if not carrito:
         raise HTTPException(status_code=404, detail='Carrito no encontrado')
     return carrito
 
 @router.post("/{carrito_id}/productos", response_model=schemas.CarritoProductoOut)
-def agregar_producto(carrito_id: int, data: schemas.CarritoProductoAdd, db: Session = Depends(get_db)):
+async def agregar_producto(carrito_id: int, data: schemas.CarritoProductoAdd, db: Sesion = Depends(get_sesion)):
     try:
-        return crud.agregar_producto_carrito(db, carrito_id, data)
+        return await ejecutar(db, crud.agregar_producto_carrito, carrito_id, data)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
 
-@router.get("/{carrito_id}/productos", response_model=list[schemas.CarritoProductoOut])
-def listar_productos_carrito(carrito_id: int, db: Session = Depends(get_db)):
-    return crud.listar_carrito_productos(db, carrito_id)
+@router.get("/{carrito_id}/productos", response_model=list[schemas.CarritoProductoOut], response_class=RespuestaJSON)
+async def listar_productos_carrito(carrito_id: int, db: Sesion = Depends(get_sesion_lectura)):
+    filas = await ejecutar(db, crud.filas_carrito_productos, carrito_id)
+    return RespuestaJSON(filas_a_json(filas, anidar=('producto', len(crud.COLUMNAS_LINEA_CARRITO))))
+
+@router.patch("/{carrito_id}/items", response_model=schemas.CarritoActualizado)
+async def aplicar_operaciones(carrito_id: int, payload: schemas.CarritoOperaciones, db: Sesion = Depends(get_sesion)):
+    """Aplicar varias operaciones add/set/remove en una sola transacción; retorna ítems y resumen"""
+    if len(payload.operaciones) > LOTE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f'Máximo {LOTE_MAX_IDS} operaciones por petición')
+    try:
+        return await ejecutar(db, crud.aplicar_operaciones_carrito, carrito_id, payload.operaciones)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
 
 @router.get("/{carrito_id}/resumen", response_model=schemas.CarritoResumen)
-def obtener_resumen(carrito_id: int, db: Session = Depends(get_db)):
-    data = crud.resumen_carrito(db, carrito_id)
+async def obtener_resumen(carrito_id: int, db: Sesion = Depends(get_sesion_lectura)):
+    data = await ejecutar(db, crud.resumen_carrito, carrito_id)
     return schemas.CarritoResumen(**data)
 
 @router.patch("/item/{carrito_producto_id}", response_model=schemas.CarritoProductoOut)
-def actualizar_item(carrito_producto_id: int, payload: schemas.CarritoProductoUpdate, db: Session = Depends(get_db)):
+async def actualizar_item(carrito_producto_id: int, payload: schemas.CarritoProductoUpdate, db: Sesion = Depends(get_sesion)):
     try:
-        reg = crud.actualizar_carrito_producto(db, carrito_producto_id, payload.cantidad)
+        reg = await ejecutar(db, crud.actualizar_carrito_producto, carrito_producto_id, payload.cantidad)
         return reg
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
 
 @router.delete("/item/{carrito_producto_id}")
-def eliminar_item(carrito_producto_id: int, db: Session = Depends(get_db)):
+async def eliminar_item(carrito_producto_id: int, db: Sesion = Depends(get_sesion)):
     try:
-        crud.eliminar_carrito_producto(db, carrito_producto_id)
+        await ejecutar(db, crud.eliminar_carrito_producto, carrito_producto_id)
         return {"deleted": True}
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
 
 @router.post("/nuevo", response_model=schemas.CarritoOut)
-def solicitar_nuevo_carrito(db: Session = Depends(get_db), current=Depends(get_current_user)):
-    """Crear un nuevo carrito para el usuario (después de hacer un pedido con el anterior)"""
-    nuevo_carrito = crud.crear_nuevo_carrito(db, current.pk_id_cliente)
+async def solicitar_nuevo_carrito(db: Sesion = Depends(get_sesion), current=Depends(get_current_user)):
+    """Empezar un carrito vacío: el abierto se reutiliza si está vacío y, si no, queda abandonado"""
+    nuevo_carrito = await ejecutar(db, crud.crear_nuevo_carrito, current.pk_id_cliente)
     return nuevo_carrito
+
+@router.post("/barrer")
+async def barrer_carritos(
+    horas: int = Query(CARRITO_ABANDONO_HORAS, ge=1),
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+    db: Sesion = Depends(get_sesion)
+):
+    """Abandonar los carritos abiertos sin cambios en `horas` y borrar las líneas de los abandonados (solo admin)"""
+    return await ejecutar(db, mantenimiento.barrer_carritos, horas)
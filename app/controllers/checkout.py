@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app import crud, schemas
+from app.auth import get_current_user
+from app.database import Sesion, get_sesion, ejecutar
+
+router = APIRouter(prefix="/checkout", tags=["checkout"])
+
+@router.post("", response_model=schemas.CheckoutOut, status_code=201)
+async def checkout(data: schemas.CheckoutCreate, db: Sesion = Depends(get_sesion), current=Depends(get_current_user)):
+    """Cerrar el carrito del usuario: crea pedido y venta (total calculado en el servidor) y abre un carrito nuevo"""
+    try:
+        return await ejecutar(db, crud.checkout, current.pk_id_cliente, data)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
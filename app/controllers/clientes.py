@@ -1,46 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from app import crud, schemas
-from app.database import get_db
-from app.auth import get_current_user
-from app.auth_utils import get_current_admin_user
+from app.config import PEDIDOS_PAGE_SIZE, PEDIDOS_PAGE_MAX
+from app.database import Sesion, get_sesion, get_sesion_lectura, ejecutar
+from app.auth import UsuarioActual, get_current_user
+from app.auth_utils import confirmar_administrador, get_current_admin_user
+from app.serializacion import RespuestaJSON, filas_a_json
 
 router = APIRouter(prefix="/clientes", tags=["clientes"])
 
 @router.post("", response_model=schemas.ClienteOut)
-def crear_cliente(data: schemas.ClienteCreate, db: Session = Depends(get_db)):
+async def crear_cliente(data: schemas.ClienteCreate, db: Sesion = Depends(get_sesion)):
     try:
-        return crud.crear_cliente(db, data)
+        return await ejecutar(db, crud.crear_cliente, data)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("", response_model=list[schemas.ClienteOut])
-def listar_clientes(db: Session = Depends(get_db)):
-    return crud.listar_clientes(db)
+@router.get("", response_model=list[schemas.ClienteOut], response_class=RespuestaJSON)
+async def listar_clientes(db: Sesion = Depends(get_sesion_lectura)):
+    return RespuestaJSON(filas_a_json(await ejecutar(db, crud.listar_clientes)))
 
 @router.get("/{cliente_id}", response_model=schemas.ClienteOut)
-def obtener_cliente(cliente_id: int, db: Session = Depends(get_db)):
+async def obtener_cliente(cliente_id: int, db: Sesion = Depends(get_sesion)):
     """Obtener información de un cliente"""
-    cliente = crud.obtener_cliente(db, cliente_id)
+    cliente = await ejecutar(db, crud.obtener_cliente, cliente_id)
     if not cliente:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
     return cliente
 
 @router.get("/{cliente_id}/carritos", response_model=list[schemas.CarritoOut])
-def obtener_carritos_cliente(cliente_id: int, db: Session = Depends(get_db)):
+async def obtener_carritos_cliente(cliente_id: int, db: Sesion = Depends(get_sesion)):
     """Obtener todos los carritos del cliente para ver todos sus pedidos históricos"""
-    return crud.obtener_carritos_cliente(db, cliente_id)
+    return await ejecutar(db, crud.obtener_carritos_cliente, cliente_id)
+
+@router.get("/{cliente_id}/pedidos", response_model=schemas.PedidoDetallePagina)
+async def listar_pedidos_cliente(
+    cliente_id: int,
+    limit: int = Query(PEDIDOS_PAGE_SIZE, ge=1, le=PEDIDOS_PAGE_MAX),
+    cursor: Optional[int] = Query(None, ge=0, description="pk_id_pedido del último pedido de la página anterior"),
+    db: Sesion = Depends(get_sesion),
+    current=Depends(get_current_user)
+):
+    """Historial de pedidos del cliente con envío, venta y productos, del más reciente al más antiguo"""
+    if current.pk_id_cliente != cliente_id and not await confirmar_administrador(db, current):
+        raise HTTPException(status_code=403, detail="Solo puedes ver tus propios pedidos")
+    pedidos, next_cursor = await ejecutar(db, crud.listar_pedidos_cliente, cliente_id, limit, cursor)
+    return schemas.PedidoDetallePagina(items=pedidos, next_cursor=next_cursor, limit=limit)
 
 @router.patch("/{cliente_id}/admin", response_model=schemas.ClienteOut)
-def actualizar_estado_admin(
+async def actualizar_estado_admin(
     cliente_id: int, 
     data: schemas.ClienteUpdateAdmin,
-    current_user: dict = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+    db: Sesion = Depends(get_sesion)
 ):
     """Cambiar estado de administrador de un cliente (solo admin)"""
     try:
-        return crud.actualizar_estado_admin(db, cliente_id, data.es_administrador)
+        return await ejecutar(db, crud.actualizar_estado_admin, cliente_id, data.es_administrador)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
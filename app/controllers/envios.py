@@ -1,20 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import TypeAdapter
 from app import crud, schemas
-from app.database import get_db
+from app.database import Sesion, get_sesion, get_sesion_lectura, ejecutar
+from app.auth import UsuarioActual
 from app.auth_utils import get_current_admin_user
+from app.cache_http import responder_con_cache
 
 router = APIRouter(prefix="/envios", tags=["envios"])
 
 @router.post("", response_model=schemas.EnvioOut)
-def crear_envio(
+async def crear_envio(
     data: schemas.EnvioCreate, 
-    current_user: dict = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+    db: Sesion = Depends(get_sesion)
 ):
     """Crear tipo de envío (solo admin)"""
-    return crud.crear_envio(db, data)
+    return await ejecutar(db, crud.crear_envio, data)
+
+_lista_envios = TypeAdapter(list[schemas.EnvioOut])
 
 @router.get("", response_model=list[schemas.EnvioOut])
-def listar_envios(db: Session = Depends(get_db)):
-    return crud.listar_envios(db)
+async def listar_envios(request: Request, db: Sesion = Depends(get_sesion_lectura)):
+    """Listar tipos de envío (cacheado con ETag)"""
+    async def generar():
+        envios = await ejecutar(db, crud.listar_envios)
+        return _lista_envios.dump_json(_lista_envios.validate_python(envios, from_attributes=True))
+
+    return await responder_con_cache(request, 'envios', generar)
@@ -1,31 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import date
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from app import crud, schemas
-from app.database import get_db
-from app.auth import get_current_user
-from app.auth_utils import get_current_admin_user
+from app.config import LOTE_MAX_IDS, STOCK_RESERVA_MINUTOS
+from app.database import Sesion, get_sesion, get_sesion_lectura, ejecutar
+from app.exportacion import respuesta_exportacion
+from app.auth import UsuarioActual, get_current_user
+from app.auth_utils import confirmar_administrador, get_current_admin_user
+from app.serializacion import RespuestaJSON, filas_a_json
 
 router = APIRouter(prefix="/pedidos", tags=["pedidos"])
 
 @router.post("", response_model=schemas.PedidoOut)
-def crear_pedido(data: schemas.PedidoCreate, db: Session = Depends(get_db)):
+async def crear_pedido(data: schemas.PedidoCreate, db: Sesion = Depends(get_sesion)):
     try:
-        return crud.crear_pedido(db, data)
+        return await ejecutar(db, crud.crear_pedido, data)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
 
-@router.get("", response_model=list[schemas.PedidoList])
-def listar_pedidos(
-    current_user: dict = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+@router.get("", response_model=list[schemas.PedidoList], response_class=RespuestaJSON)
+async def listar_pedidos(
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+    db: Sesion = Depends(get_sesion_lectura)
 ):
     """Listar todos los pedidos (solo admin)"""
-    return crud.listar_pedidos(db)
+    return RespuestaJSON(filas_a_json(await ejecutar(db, crud.listar_pedidos)))
 
-@router.get("/{pedido_id}/total")
-def calcular_total(pedido_id: int, db: Session = Depends(get_db)):
+@router.get("/export")
+async def exportar_pedidos(
+    formato: Literal['csv', 'ndjson'] = 'csv',
+    desde: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    hasta: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    id_desde: Optional[int] = None,
+    id_hasta: Optional[int] = None,
+    accept_encoding: Optional[str] = Header(None),
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+):
+    """Exportar pedidos en streaming como CSV o NDJSON, con filtros por fecha e ID (solo admin)"""
+    stmt = crud.consulta_exportar_pedidos(desde, hasta, id_desde, id_hasta)
+    return respuesta_exportacion(stmt, 'pedidos', formato, accept_encoding)
+
+@router.post("/liberar-vencidos")
+async def liberar_vencidos(
+    minutos: int = Query(STOCK_RESERVA_MINUTOS, ge=1),
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+    db: Sesion = Depends(get_sesion)
+):
+    """Cancelar los pedidos sin venta más antiguos que `minutos` y devolver su stock (solo admin)"""
+    return {"cancelados": await ejecutar(db, crud.liberar_pedidos_vencidos, minutos)}
+
+@router.get("/totales", response_model=list[schemas.PedidoTotal])
+async def calcular_totales(ids: list[int] = Query(...), db: Sesion = Depends(get_sesion)):
+    """Totales de varios pedidos en una sola consulta (?ids=1&ids=2); omite los inexistentes"""
+    if len(ids) > LOTE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f'Máximo {LOTE_MAX_IDS} pedidos por consulta')
+    totales = await ejecutar(db, crud.calcular_totales_pedidos, ids)
+    return [{"pedido_id": pid, "total": totales[pid]} for pid in dict.fromkeys(ids) if pid in totales]
+
+@router.get("/{pedido_id}", response_model=schemas.PedidoDetalle)
+async def obtener_pedido(pedido_id: int, db: Sesion = Depends(get_sesion), current=Depends(get_current_user)):
+    """Pedido con envío, venta y productos (solo su cliente o un admin)"""
+    pedido = await ejecutar(db, crud.obtener_pedido_detalle, pedido_id)
+    if not pedido or (
+        pedido.carrito.fk_id_cliente != current.pk_id_cliente and not await confirmar_administrador(db, current)
+    ):
+        raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    return pedido
+
+@router.get("/{pedido_id}/total", response_model=schemas.PedidoTotal)
+async def calcular_total(pedido_id: int, db: Sesion = Depends(get_sesion)):
     try:
-        total = crud.calcular_total_pedido(db, pedido_id)
+        total = await ejecutar(db, crud.calcular_total_pedido, pedido_id)
         return {"pedido_id": pedido_id, "total": total}
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
+
+@router.delete("/{pedido_id}")
+async def cancelar_pedido(pedido_id: int, db: Sesion = Depends(get_sesion), current=Depends(get_current_user)):
+    """Cancelar un pedido sin venta y devolver el stock reservado (solo su cliente o un admin)"""
+    id_cliente = None if await confirmar_administrador(db, current) else current.pk_id_cliente
+    try:
+        await ejecutar(db, crud.cancelar_pedido, pedido_id, id_cliente)
+        return {"deleted": True}
+    except LookupError as le:
+        raise HTTPException(status_code=404, detail=str(le))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
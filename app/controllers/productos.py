@@ -1,21 +1,111 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app import crud, schemas
-from app.database import get_db
-from app.auth import get_current_user
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from app import crud, importacion, schemas
+from app.config import LOTE_MAX_IDS, PRODUCTOS_PAGE_SIZE, PRODUCTOS_PAGE_MAX
+from app.database import Sesion, get_sesion, get_sesion_lectura, ejecutar
+from app.auth import UsuarioActual
 from app.auth_utils import get_current_admin_user
+from app.cache_http import responder_con_cache
+from app.serializacion import a_json, filas_a_dicts
 
 router = APIRouter(prefix="/productos", tags=["productos"])
 
 @router.post("", response_model=schemas.ProductoOut)
-def crear_producto(
+async def crear_producto(
     data: schemas.ProductoCreate, 
-    current_user: dict = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+    db: Sesion = Depends(get_sesion)
 ):
     """Crear producto (solo admin)"""
-    return crud.crear_producto(db, data)
+    return await ejecutar(db, crud.crear_producto, data)
 
-@router.get("", response_model=list[schemas.ProductoOut])
-def listar_productos(db: Session = Depends(get_db)):
-    return crud.listar_productos(db)
+@router.get("", response_model=schemas.ProductoPagina)
+async def listar_productos(
+    request: Request,
+    limit: int = Query(PRODUCTOS_PAGE_SIZE, ge=1, le=PRODUCTOS_PAGE_MAX),
+    cursor: Optional[int] = Query(None, ge=0, description="pk_id_producto del último ítem de la página anterior"),
+    marca: Optional[str] = None,
+    precio_min: Optional[float] = Query(None, ge=0),
+    precio_max: Optional[float] = Query(None, ge=0),
+    categoria: Optional[int] = Query(None, description="pk_id_categoria"),
+    db: Sesion = Depends(get_sesion_lectura)
+):
+    """Listar catálogo paginado por cursor con filtros por marca, precio y categoría (cacheado con ETag)"""
+    if precio_min is not None and precio_max is not None and precio_min > precio_max:
+        raise HTTPException(status_code=400, detail="precio_min no puede ser mayor que precio_max")
+
+    async def generar():
+        items, next_cursor = await ejecutar(
+            db, crud.listar_productos, limit, cursor=cursor, marca=marca,
+            precio_min=precio_min, precio_max=precio_max, categoria_id=categoria
+        )
+        return a_json({'items': filas_a_dicts(items), 'next_cursor': next_cursor, 'limit': limit})
+
+    return await responder_con_cache(request, 'productos', generar)
+
+@router.get("/search", response_model=schemas.ProductoBusquedaPagina)
+async def buscar_productos(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(PRODUCTOS_PAGE_SIZE, ge=1, le=PRODUCTOS_PAGE_MAX),
+    offset: int = Query(0, ge=0, le=10_000),
+    db: Sesion = Depends(get_sesion_lectura)
+):
+    """Buscar productos por nombre, marca y descripción, ordenados por relevancia (cacheado con ETag)"""
+    async def generar():
+        resultados, next_offset = await ejecutar(db, crud.buscar_productos, q, limit, offset)
+        items = [
+            schemas.ProductoBusqueda(**schemas.ProductoOut.model_validate(prod).model_dump(), rank=rank)
+            for prod, rank in resultados
+        ]
+        return schemas.ProductoBusquedaPagina(items=items, next_offset=next_offset, limit=limit)
+
+    return await responder_con_cache(request, 'productos', generar)
+
+@router.get("/export", response_model=list[schemas.ProductoOut])
+async def exportar_productos(
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+    db: Sesion = Depends(get_sesion_lectura)
+):
+    """Exportar el catálogo completo sin paginar (solo admin)"""
+    return await ejecutar(db, crud.exportar_productos)
+
+@router.post("/import", response_model=schemas.ResultadoImportacion)
+async def importar_productos(
+    archivo: UploadFile = File(..., description="CSV o NDJSON en UTF-8"),
+    formato: Optional[Literal['csv', 'ndjson']] = Query(None, description="Por defecto según la extensión del archivo"),
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+    db: Sesion = Depends(get_sesion)
+):
+    """Crear o actualizar productos en lote por `sku` (solo admin); las filas con error se reportan y no detienen la carga"""
+    formato = formato or importacion.detectar_formato(archivo.filename, archivo.content_type)
+    if formato is None:
+        raise HTTPException(status_code=400, detail="Formato no reconocido: use ?formato=csv o ?formato=ndjson")
+    resultado = schemas.ResultadoImportacion()
+    # Por lote: lectura y validación en el threadpool y escritura en su propia transacción,
+    # así el loop nunca queda bloqueado parseando el archivo
+    lotes = importacion.lotes(importacion.leer_filas(archivo.file, formato))
+    while (validas := await run_in_threadpool(importacion.preparar_lote, lotes, resultado)) is not None:
+        await ejecutar(db, importacion.escribir_lote, validas, resultado)
+    return resultado
+
+@router.get("/stock", response_model=list[schemas.ProductoStock])
+async def consultar_stock(ids: list[int] = Query(...), db: Sesion = Depends(get_sesion_lectura)):
+    """Stock actual de varios productos (?ids=1&ids=2); null = sin control de inventario"""
+    if len(ids) > LOTE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f'Máximo {LOTE_MAX_IDS} productos por consulta')
+    return await ejecutar(db, crud.stock_productos, ids)
+
+@router.patch("/{producto_id}/stock", response_model=schemas.ProductoStock)
+async def ajustar_stock(
+    producto_id: int,
+    data: schemas.StockAjuste,
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+    db: Sesion = Depends(get_sesion)
+):
+    """Fijar el stock o aplicarle un ajuste relativo (solo admin)"""
+    try:
+        return await ejecutar(db, crud.ajustar_stock, producto_id, data)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
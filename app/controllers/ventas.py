@@ -1,17 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import date
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from app import crud, schemas
-from app.database import get_db
+from app.auth import UsuarioActual
+from app.auth_utils import get_current_admin_user
+from app.database import Sesion, get_sesion, get_sesion_lectura, ejecutar
+from app.exportacion import respuesta_exportacion
+from app.serializacion import RespuestaJSON, filas_a_json
 
 router = APIRouter(prefix="/ventas", tags=["ventas"])
 
 @router.post("", response_model=schemas.VentaOut)
-def crear_venta(data: schemas.VentaCreate, db: Session = Depends(get_db)):
+async def crear_venta(data: schemas.VentaCreate, db: Sesion = Depends(get_sesion)):
     try:
-        return crud.registrar_venta(db, data)
+        return await ejecutar(db, crud.registrar_venta, data)
+    except LookupError as le:
+        raise HTTPException(status_code=404, detail=str(le))
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
 
-@router.get("", response_model=list[schemas.VentaList])
-def listar_ventas(db: Session = Depends(get_db)):
-    return crud.listar_ventas(db)
+@router.get("", response_model=list[schemas.VentaList], response_class=RespuestaJSON)
+async def listar_ventas(db: Sesion = Depends(get_sesion_lectura)):
+    return RespuestaJSON(filas_a_json(await ejecutar(db, crud.listar_ventas)))
+
+@router.get("/export")
+async def exportar_ventas(
+    formato: Literal['csv', 'ndjson'] = 'csv',
+    desde: Optional[date] = Query(None, description="Fecha inicial (inclusive)"),
+    hasta: Optional[date] = Query(None, description="Fecha final (inclusive)"),
+    id_desde: Optional[int] = None,
+    id_hasta: Optional[int] = None,
+    accept_encoding: Optional[str] = Header(None),
+    current_user: UsuarioActual = Depends(get_current_admin_user),
+):
+    """Exportar ventas en streaming como CSV o NDJSON, con filtros por fecha e ID (solo admin)"""
+    stmt = crud.consulta_exportar_ventas(desde, hasta, id_desde, id_hasta)
+    return respuesta_exportacion(stmt, 'ventas', formato, accept_encoding)
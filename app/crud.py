@@ -1,11 +1,28 @@
-from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import select, desc
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import select, func, literal, insert, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
 from . import models
 from . import schemas
+from .auth import invalidar_usuario_cache
+from .cache import invalidar_respuestas
+from . import busqueda
+from . import tareas
+from .serializacion import columnas
+
+def _a_moneda(valor) -> Decimal:
+    """Normaliza un importe a Decimal con dos decimales"""
+    return Decimal(str(valor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
 # CLIENTE
 
-def crear_cliente(db: Session, data: schemas.ClienteCreate) -> models.Cliente:
+def crear_cliente(db: Session, data: schemas.ClienteCreate, contrasena_hash: Optional[str] = None) -> models.Cliente:
+    """Crear cliente y su carrito. Si se recibe contrasena_hash se guarda en lugar de la contraseña recibida"""
     cliente = models.Cliente(
         primer_nombre=data.primer_nombre,
         segundo_nombre=data.segundo_nombre,
@@ -14,7 +31,8 @@ def crear_cliente(db: Session, data: schemas.ClienteCreate) -> models.Cliente:
         fecha_nac=data.fecha_nac,
         cedula=data.cedula,
         correo=data.correo,
-        contrasena=data.contrasena,
+        contrasena=contrasena_hash or data.contrasena,
+        es_administrador=False,
     )
     db.add(cliente)
     db.flush()  # ID disponible
@@ -26,7 +44,8 @@ def crear_cliente(db: Session, data: schemas.ClienteCreate) -> models.Cliente:
     return cliente
 
 def listar_clientes(db: Session):
-    return db.execute(select(models.Cliente)).scalars().all()
+    """Filas con las columnas de ClienteOut (sin instancias ORM)"""
+    return db.execute(select(*columnas(models.Cliente, schemas.ClienteOut))).all()
 
 def obtener_cliente(db: Session, cliente_id: int):
     """Obtener un cliente por ID"""
@@ -43,8 +62,23 @@ def actualizar_estado_admin(db: Session, cliente_id: int, es_admin: bool) -> mod
     cliente.es_administrador = es_admin
     db.commit()
     db.refresh(cliente)
+    invalidar_usuario_cache(cliente_id)
     return cliente
 
+def es_administrador(db: Session, cliente_id: int) -> bool:
+    """Rol actual del cliente leído de la base (sin pasar por la caché de tokens)"""
+    return bool(db.execute(
+        select(models.Cliente.es_administrador).where(models.Cliente.pk_id_cliente == cliente_id)
+    ).scalar())
+
+def actualizar_contrasena(db: Session, cliente_id: int, contrasena_hash: str) -> None:
+    """Reemplazar el hash de contraseña guardado (p. ej. al cambiar el costo de bcrypt)"""
+    cliente = db.get(models.Cliente, cliente_id)
+    if not cliente:
+        raise ValueError(f"Cliente {cliente_id} no encontrado")
+    cliente.contrasena = contrasena_hash
+    db.commit()
+
 def obtener_cliente_por_correo(db: Session, correo: str):
     q = select(models.Cliente).where(models.Cliente.correo == correo)
     return db.execute(q).scalar_one_or_none()
@@ -61,35 +95,211 @@ def crear_producto(db: Session, data: schemas.ProductoCreate):
     db.add(producto)
     db.commit()
     db.refresh(producto)
+    invalidar_respuestas('productos')
+    busqueda.indice_productos.actualizar(producto)
     return producto
 
-def listar_productos(db: Session):
-    return db.execute(select(models.Producto)).scalars().all()
+def listar_productos(
+    db: Session,
+    limit: int,
+    cursor: Optional[int] = None,
+    marca: Optional[str] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    categoria_id: Optional[int] = None,
+):
+    """Listar una página del catálogo (keyset sobre pk_id_producto). Retorna (filas de ProductoOut, next_cursor)"""
+    q = select(*columnas(models.Producto, schemas.ProductoOut)).order_by(models.Producto.pk_id_producto)
+    if cursor is not None:
+        q = q.where(models.Producto.pk_id_producto > cursor)
+    if marca:
+        q = q.where(models.Producto.marca == marca)
+    if precio_min is not None:
+        q = q.where(models.Producto.precio >= precio_min)
+    if precio_max is not None:
+        q = q.where(models.Producto.precio <= precio_max)
+    if categoria_id is not None:
+        q = q.where(models.Producto.pk_id_producto.in_(
+            select(models.ProductoCategoria.fk_id_producto).where(
+                models.ProductoCategoria.fk_id_categoria == categoria_id
+            )
+        ))
+    # Se pide una fila extra para saber si hay página siguiente
+    items = db.execute(q.limit(limit + 1)).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = items[-1].pk_id_producto
+    return items, next_cursor
+
+def buscar_productos(db: Session, texto: str, limit: int, offset: int = 0):
+    """Búsqueda de texto completo ordenada por relevancia. Retorna ([(producto, rank)], next_offset)"""
+    if db.get_bind().dialect.name == 'postgresql':
+        vector = busqueda.vector_producto()
+        consulta = busqueda.consulta_pg(texto)
+        rank = func.ts_rank(vector, consulta)
+        q = select(models.Producto, rank).where(vector.op('@@')(consulta)).order_by(
+            rank.desc(), models.Producto.pk_id_producto
+        ).limit(limit + 1).offset(offset)
+        resultados = [(prod, float(r)) for prod, r in db.execute(q)]
+    else:
+        ranking = busqueda.indice_productos.buscar(db, texto, limit + 1, offset)
+        productos = {
+            p.pk_id_producto: p
+            for p in db.execute(
+                select(models.Producto).where(models.Producto.pk_id_producto.in_([pk for pk, _ in ranking]))
+            ).scalars()
+        }
+        resultados = [(productos[pk], score) for pk, score in ranking if pk in productos]
+    next_offset = None
+    if len(resultados) > limit:
+        resultados = resultados[:limit]
+        next_offset = offset + limit
+    return resultados, next_offset
+
+def exportar_productos(db: Session):
+    """Catálogo completo sin paginar (exportación administrativa)"""
+    q = select(models.Producto).order_by(models.Producto.pk_id_producto)
+    return db.execute(q).scalars().all()
+
+def stock_productos(db: Session, producto_ids: list[int]):
+    """Stock actual de varios productos (sin caché: cambia con cada compra)"""
+    q = select(models.Producto.pk_id_producto, models.Producto.stock).where(
+        models.Producto.pk_id_producto.in_(producto_ids)
+    ).order_by(models.Producto.pk_id_producto)
+    return [{'pk_id_producto': pk, 'stock': stock} for pk, stock in db.execute(q)]
+
+def ajustar_stock(db: Session, producto_id: int, data: schemas.StockAjuste) -> dict:
+    """Fijar el stock o sumarle un ajuste en un UPDATE atómico (el ajuste no puede dejarlo negativo)"""
+    p = models.Producto
+    stmt = update(p).where(p.pk_id_producto == producto_id)
+    if 'ajuste' in data.model_fields_set:
+        stmt = stmt.where(p.stock.isnot(None), p.stock + data.ajuste >= 0).values(stock=p.stock + data.ajuste)
+    else:
+        stmt = stmt.values(stock=data.stock)
+    fila = db.execute(
+        stmt.returning(p.pk_id_producto, p.stock), execution_options={'synchronize_session': False}
+    ).first()
+    if fila is None:
+        db.rollback()
+        if not db.get(models.Producto, producto_id):
+            raise ValueError('Producto no existe')
+        raise ValueError('Ajuste inválido: el producto no controla stock o quedaría negativo')
+    db.commit()
+    return {'pk_id_producto': fila[0], 'stock': fila[1]}
 
 # CARRITO
 
 def obtener_carrito_cliente(db: Session, id_cliente: int):
-    """Obtener el carrito más reciente del cliente (ordenado por ID descendente)"""
+    """Obtener el carrito abierto del cliente (único por uq_carrito_abierto_cliente)"""
     q = select(models.CarritoCompra).where(
-        models.CarritoCompra.fk_id_cliente == id_cliente
-    ).order_by(desc(models.CarritoCompra.pk_id_carrito_compra))
-    return db.execute(q).scalars().first()
+        models.CarritoCompra.fk_id_cliente == id_cliente, models.CarritoCompra.estado == 'abierto'
+    )
+    return db.execute(q).scalar_one_or_none()
 
 def crear_nuevo_carrito(db: Session, id_cliente: int) -> models.CarritoCompra:
-    """Crear un nuevo carrito para el cliente (para cuando ya tiene uno bloqueado con un pedido)"""
+    """Abrir un carrito nuevo para el cliente: si el abierto está vacío se reutiliza, si no queda abandonado"""
+    cc = models.CarritoCompra
+    actual = obtener_carrito_cliente(db, id_cliente)
+    if actual is not None:
+        con_lineas = db.execute(
+            select(models.CarritoProducto.pk_id_carrito_producto)
+            .where(models.CarritoProducto.fk_id_carrito_compra == actual.pk_id_carrito_compra).limit(1)
+        ).first()
+        if not con_lineas:
+            return actual
+        db.execute(
+            update(cc).where(cc.pk_id_carrito_compra == actual.pk_id_carrito_compra, cc.estado == 'abierto')
+            .values(estado='abandonado')
+        )
     carrito = models.CarritoCompra(fk_id_cliente=id_cliente)
     db.add(carrito)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otra petición abrió uno al mismo tiempo: se usa ese
+        db.rollback()
+        return obtener_carrito_cliente(db, id_cliente)
     db.refresh(carrito)
     return carrito
 
+def _tocar_carrito(db: Session, carrito_id: int) -> None:
+    """Registrar actividad en un carrito abierto, que queda bloqueado hasta el commit; ValueError si no existe o no está abierto"""
+    cc = models.CarritoCompra
+    tocados = db.execute(
+        update(cc).where(cc.pk_id_carrito_compra == carrito_id, cc.estado == 'abierto').values(actualizado_en=func.now()),
+        execution_options={'synchronize_session': False},
+    ).rowcount
+    if not tocados:
+        existe = db.execute(select(cc.pk_id_carrito_compra).where(cc.pk_id_carrito_compra == carrito_id)).first()
+        db.rollback()
+        raise ValueError('El carrito ya no está abierto' if existe else 'Carrito no existe')
+
+def _cerrar_carrito(db: Session, carrito_id: int, id_cliente: int) -> models.CarritoCompra:
+    """Pasar el carrito a 'pedido' y abrir uno nuevo para el cliente (sin commit); ValueError si no estaba abierto"""
+    cc = models.CarritoCompra
+    cerrados = db.execute(
+        update(cc).where(cc.pk_id_carrito_compra == carrito_id, cc.estado == 'abierto').values(estado='pedido')
+    ).rowcount
+    if not cerrados:
+        db.rollback()
+        raise ValueError('El carrito ya tiene un pedido')
+    nuevo = models.CarritoCompra(fk_id_cliente=id_cliente)
+    db.add(nuevo)
+    return nuevo
+
+def _abandonar_carritos(db: Session, carrito_ids: list[int]) -> None:
+    """Marcar como abandonados carritos cuyo pedido se canceló (sin commit); el barrido borra sus líneas"""
+    cc = models.CarritoCompra
+    db.execute(
+        update(cc).where(cc.pk_id_carrito_compra.in_(carrito_ids)).values(estado='abandonado'),
+        execution_options={'synchronize_session': False},
+    )
+
 # CARRITO PRODUCTO
 
+def _insert_on_conflict(db: Session):
+    """insert() del dialecto en uso si soporta ON CONFLICT ... RETURNING, si no None"""
+    return {'postgresql': pg_insert, 'sqlite': sqlite_insert}.get(db.get_bind().dialect.name)
+
 def agregar_producto_carrito(db: Session, carrito_id: int, data: schemas.CarritoProductoAdd):
+    """Sumar un producto al carrito: un UPDATE del carrito y un upsert de la línea, en una transacción.
+
+    `_tocar_carrito` comprueba que el carrito siga abierto y lo bloquea hasta el commit (un
+    checkout simultáneo espera). La línea se escribe con INSERT ... SELECT FROM producto ... ON
+    CONFLICT (uq_carrito_producto_unico) DO UPDATE SET cantidad = cantidad + excluded.cantidad:
+    si el producto no existe el SELECT no devuelve filas, y dos clics simultáneos suman ambas
+    cantidades sin leer la línea antes.
+    """
+    insert_ = _insert_on_conflict(db)
+    if insert_ is None:
+        return _agregar_producto_carrito_orm(db, carrito_id, data)
+    _tocar_carrito(db, carrito_id)
+    cp = models.CarritoProducto
+    origen = select(
+        literal(carrito_id), models.Producto.pk_id_producto, literal(data.cantidad)
+    ).where(models.Producto.pk_id_producto == data.fk_id_producto)
+    stmt = insert_(cp).from_select(['fk_id_carrito_compra', 'fk_id_producto', 'cantidad'], origen)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[cp.fk_id_carrito_compra, cp.fk_id_producto],
+        set_={'cantidad': cp.cantidad + stmt.excluded.cantidad},
+    ).returning(cp)
+    registro = db.execute(stmt).scalars().first()
+    if registro is None:
+        db.rollback()
+        raise ValueError('Producto no existe')
+    db.commit()
+    # Adjuntar el producto sin marcar el registro como modificado
+    set_committed_value(registro, 'producto', db.get(models.Producto, data.fk_id_producto))
+    return registro
+
+def _agregar_producto_carrito_orm(db: Session, carrito_id: int, data: schemas.CarritoProductoAdd):
+    """Variante leer-modificar-escribir para dialectos sin ON CONFLICT"""
     # validar que existe producto
     prod = db.get(models.Producto, data.fk_id_producto)
     if not prod:
         raise ValueError('Producto no existe')
+    _tocar_carrito(db, carrito_id)
     # buscar si ya existe
     q = select(models.CarritoProducto).where(
         models.CarritoProducto.fk_id_carrito_compra == carrito_id,
@@ -99,7 +309,7 @@ def agregar_producto_carrito(db: Session, carrito_id: int, data: schemas.Carrito
     if existente:
         existente.cantidad += data.cantidad
         db.commit()
-        db.refresh(existente)
+        db.refresh(existente, ['cantidad', 'producto'])
         return existente
     registro = models.CarritoProducto(
         fk_id_carrito_compra=carrito_id,
@@ -108,9 +318,80 @@ def agregar_producto_carrito(db: Session, carrito_id: int, data: schemas.Carrito
     )
     db.add(registro)
     db.commit()
-    db.refresh(registro)
+    db.refresh(registro, ['producto'])
     return registro
 
+def aplicar_operaciones_carrito(db: Session, carrito_id: int, operaciones: list[schemas.CarritoOperacion]):
+    """Aplicar en una transacción una lista de operaciones add/set/remove sobre el carrito.
+
+    Las operaciones se resuelven en memoria (en orden) a la cantidad final por producto y se
+    escriben con a lo sumo un DELETE, un UPDATE ejecutado en lote y un INSERT en lote.
+    """
+    cp = models.CarritoProducto
+    # Bloquear el carrito serializa las mutaciones en lote concurrentes sobre el mismo carrito
+    _tocar_carrito(db, carrito_id)
+    producto_ids = {op.fk_id_producto for op in operaciones}
+    existentes_prod = set(db.execute(
+        select(models.Producto.pk_id_producto).where(models.Producto.pk_id_producto.in_(producto_ids))
+    ).scalars())
+    faltantes = sorted(producto_ids - existentes_prod)
+    if faltantes:
+        db.rollback()
+        raise ValueError(f"Productos no existen: {', '.join(map(str, faltantes))}")
+
+    lineas = {
+        fk_producto: (pk, cantidad)
+        for pk, fk_producto, cantidad in db.execute(
+            select(cp.pk_id_carrito_producto, cp.fk_id_producto, cp.cantidad).where(
+                cp.fk_id_carrito_compra == carrito_id, cp.fk_id_producto.in_(producto_ids)
+            )
+        )
+    }
+    final = {pid: cantidad for pid, (_, cantidad) in lineas.items()}
+    for op in operaciones:
+        if op.op == 'add':
+            final[op.fk_id_producto] = final.get(op.fk_id_producto, 0) + op.cantidad
+        elif op.op == 'set':
+            final[op.fk_id_producto] = op.cantidad
+        else:
+            final[op.fk_id_producto] = 0
+
+    borrar = [lineas[pid][0] for pid, cantidad in final.items() if cantidad <= 0 and pid in lineas]
+    actualizar = [
+        {'pk_id_carrito_producto': lineas[pid][0], 'cantidad': cantidad}
+        for pid, cantidad in final.items()
+        if cantidad > 0 and pid in lineas and lineas[pid][1] != cantidad
+    ]
+    insertar = [
+        {'fk_id_carrito_compra': carrito_id, 'fk_id_producto': pid, 'cantidad': cantidad}
+        for pid, cantidad in final.items() if cantidad > 0 and pid not in lineas
+    ]
+    try:
+        if borrar:
+            db.execute(delete(cp).where(cp.pk_id_carrito_producto.in_(borrar)))
+        if actualizar:
+            db.execute(update(cp), actualizar)
+        if insertar:
+            db.execute(insert(cp), insertar)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise ValueError('El carrito cambió durante la operación, intenta de nuevo')
+    return {
+        'items': listar_carrito_productos(db, carrito_id),
+        'resumen': resumen_carrito(db, carrito_id),
+    }
+
+COLUMNAS_LINEA_CARRITO = columnas(models.CarritoProducto, schemas.CarritoProductoOut)
+
+def filas_carrito_productos(db: Session, carrito_id: int):
+    """Líneas del carrito con su producto en una sola consulta: COLUMNAS_LINEA_CARRITO y luego las de ProductoOut"""
+    cp = models.CarritoProducto
+    q = select(*COLUMNAS_LINEA_CARRITO, *columnas(models.Producto, schemas.ProductoOut)).outerjoin(models.Producto, models.Producto.pk_id_producto == cp.fk_id_producto).where(
+        cp.fk_id_carrito_compra == carrito_id
+    ).order_by(cp.pk_id_carrito_producto)
+    return db.execute(q).all()
+
 def listar_carrito_productos(db: Session, carrito_id: int):
     q = select(models.CarritoProducto).where(
         models.CarritoProducto.fk_id_carrito_compra == carrito_id
@@ -121,30 +402,41 @@ def actualizar_carrito_producto(db: Session, carrito_producto_id: int, cantidad:
     registro = db.get(models.CarritoProducto, carrito_producto_id)
     if not registro:
         raise ValueError('Registro de carrito-producto no existe')
+    _tocar_carrito(db, registro.fk_id_carrito_compra)
     registro.cantidad = cantidad
     db.commit()
-    db.refresh(registro)
+    db.refresh(registro, ['cantidad', 'producto'])
     return registro
 
 def eliminar_carrito_producto(db: Session, carrito_producto_id: int):
     registro = db.get(models.CarritoProducto, carrito_producto_id)
     if not registro:
         raise ValueError('Registro no existe')
+    _tocar_carrito(db, registro.fk_id_carrito_compra)
     db.delete(registro)
     db.commit()
     return True
 
+def resumenes_carritos(db: Session, carrito_ids: list[int]) -> dict[int, dict]:
+    """Subtotal y cantidad de items de varios carritos en una sola consulta agregada"""
+    q = select(
+        models.CarritoProducto.fk_id_carrito_compra,
+        func.coalesce(func.sum(models.Producto.precio * models.CarritoProducto.cantidad), 0),
+        func.coalesce(func.sum(models.CarritoProducto.cantidad), 0),
+    ).join(
+        models.Producto, models.Producto.pk_id_producto == models.CarritoProducto.fk_id_producto
+    ).where(
+        models.CarritoProducto.fk_id_carrito_compra.in_(carrito_ids)
+    ).group_by(models.CarritoProducto.fk_id_carrito_compra)
+    agregados = {cid: (subtotal, items) for cid, subtotal, items in db.execute(q)}
+    resumenes = {}
+    for cid in carrito_ids:
+        subtotal, total_items = agregados.get(cid, (0, 0))
+        resumenes[cid] = {'carrito_id': cid, 'subtotal': _a_moneda(subtotal), 'total_items': int(total_items)}
+    return resumenes
+
 def resumen_carrito(db: Session, carrito_id: int):
-    q = select(models.CarritoProducto).where(models.CarritoProducto.fk_id_carrito_compra == carrito_id)
-    items = db.execute(q).scalars().all()
-    subtotal = 0.0
-    total_items = 0
-    for it in items:
-        prod = db.get(models.Producto, it.fk_id_producto)
-        if prod:
-            subtotal += float(prod.precio) * it.cantidad
-            total_items += it.cantidad
-    return {'carrito_id': carrito_id, 'subtotal': round(subtotal, 2), 'total_items': total_items}
+    return resumenes_carritos(db, [carrito_id])[carrito_id]
 
 # ENVIO
 
@@ -153,6 +445,7 @@ def crear_envio(db: Session, data: schemas.EnvioCreate):
     db.add(envio)
     db.commit()
     db.refresh(envio)
+    invalidar_respuestas('envios')
     return envio
 
 def listar_envios(db: Session):
@@ -160,51 +453,260 @@ def listar_envios(db: Session):
 
 # PEDIDO
 
+def _reservar_stock(db: Session, carrito_id: int) -> None:
+    """Descontar del stock las cantidades del carrito en un solo UPDATE; ValueError (con rollback) si no alcanza.
+
+    Los productos con stock NULL no se controlan. Las filas se bloquean en orden de ID para que dos
+    compras con los mismos productos no se bloqueen mutuamente; quien llama debe confirmar enseguida,
+    porque el bloqueo de un producto muy demandado dura hasta el commit.
+    """
+    cp, p = models.CarritoProducto, models.Producto
+    cantidad = select(cp.cantidad).where(
+        cp.fk_id_carrito_compra == carrito_id, cp.fk_id_producto == p.pk_id_producto
+    ).scalar_subquery()
+    bloqueados = select(p.pk_id_producto).where(
+        p.pk_id_producto.in_(select(cp.fk_id_producto).where(cp.fk_id_carrito_compra == carrito_id)),
+        p.stock.isnot(None),
+    ).order_by(p.pk_id_producto).with_for_update()
+    filas = db.execute(
+        update(p).where(p.pk_id_producto.in_(bloqueados)).values(stock=p.stock - cantidad)
+        .returning(p.pk_id_producto, p.stock),
+        execution_options={'synchronize_session': False},
+    ).all()
+    faltantes = sorted(pk for pk, stock in filas if stock < 0)
+    if faltantes:
+        db.rollback()
+        raise ValueError(f"Stock insuficiente para productos: {', '.join(map(str, faltantes))}")
+
+def liberar_stock(db: Session, carrito_ids) -> None:
+    """Devolver al stock las cantidades de los carritos, lista de IDs o subconsulta (sin commit)"""
+    cp, p = models.CarritoProducto, models.Producto
+    cantidad = select(func.sum(cp.cantidad)).where(
+        cp.fk_id_carrito_compra.in_(carrito_ids), cp.fk_id_producto == p.pk_id_producto
+    ).scalar_subquery()
+    db.execute(
+        update(p).where(
+            p.pk_id_producto.in_(select(cp.fk_id_producto).where(cp.fk_id_carrito_compra.in_(carrito_ids))),
+            p.stock.isnot(None),
+        ).values(stock=p.stock + cantidad),
+        execution_options={'synchronize_session': False},
+    )
+
 def crear_pedido(db: Session, data: schemas.PedidoCreate):
+    """Crear pedido reservando el stock del carrito; la reserva se libera si el pedido no se paga a tiempo"""
     carrito = db.get(models.CarritoCompra, data.fk_id_carrito_compra)
     if not carrito:
         raise ValueError('Carrito no existe')
     envio = db.get(models.Envio, data.fk_id_envio)
     if not envio:
         raise ValueError('Envio no existe')
+    if carrito.estado == 'abandonado':
+        raise ValueError('El carrito ya no está abierto')
+    _cerrar_carrito(db, carrito.pk_id_carrito_compra, carrito.fk_id_cliente)
     pedido = models.Pedido(fk_id_carrito_compra=data.fk_id_carrito_compra, fk_id_envio=data.fk_id_envio)
     db.add(pedido)
+    db.flush()
+    _reservar_stock(db, data.fk_id_carrito_compra)
     db.commit()
     db.refresh(pedido)
     return pedido
 
+def cancelar_pedido(db: Session, pedido_id: int, id_cliente: Optional[int] = None) -> None:
+    """Eliminar un pedido aún sin venta y devolver su stock; con `id_cliente`, solo si es suyo"""
+    pedido = db.get(models.Pedido, pedido_id)
+    if not pedido or (id_cliente is not None and pedido.carrito.fk_id_cliente != id_cliente):
+        raise LookupError('Pedido no encontrado')
+    pagado = db.execute(select(models.Venta.pk_id_venta).where(models.Venta.fk_id_pedido == pedido_id)).first()
+    if pagado:
+        raise ValueError('El pedido ya tiene una venta')
+    liberar_stock(db, [pedido.fk_id_carrito_compra])
+    _abandonar_carritos(db, [pedido.fk_id_carrito_compra])
+    db.delete(pedido)
+    db.commit()
+
+def liberar_pedidos_vencidos(db: Session, minutos: int) -> int:
+    """Cancelar en bloque los pedidos sin venta más antiguos que `minutos`, devolviendo su stock"""
+    limite = db.execute(select(func.now())).scalar_one() - timedelta(minutes=minutos)
+    vencidos = db.execute(
+        select(models.Pedido.pk_id_pedido, models.Pedido.fk_id_carrito_compra).where(
+            models.Pedido.fecha_pedido < limite,
+            ~select(models.Venta.pk_id_venta).where(models.Venta.fk_id_pedido == models.Pedido.pk_id_pedido).exists(),
+        ).with_for_update(skip_locked=True)
+    ).all()
+    if not vencidos:
+        return 0
+    liberar_stock(db, [carrito for _, carrito in vencidos])
+    _abandonar_carritos(db, [carrito for _, carrito in vencidos])
+    db.execute(
+        delete(models.Pedido).where(models.Pedido.pk_id_pedido.in_([pk for pk, _ in vencidos])),
+        execution_options={'synchronize_session': False},
+    )
+    db.commit()
+    return len(vencidos)
+
+def _insertar_devolviendo(db: Session, modelo, **valores):
+    """INSERT ... RETURNING de la entidad completa (incluye defaults SQL como func.now()) sin SELECT extra"""
+    if db.get_bind().dialect.insert_returning:
+        return db.scalars(insert(modelo).values(**valores).returning(modelo)).one()
+    registro = modelo(**valores)
+    db.add(registro)
+    db.flush()
+    db.refresh(registro)
+    return registro
+
+def checkout(db: Session, id_cliente: int, data: schemas.CheckoutCreate) -> dict:
+    """Cerrar el carrito actual del cliente en una transacción: pedido, venta con total calculado en SQL y carrito nuevo.
+
+    El carrito queda bloqueado (FOR UPDATE) desde la lectura del total hasta el commit, de modo que no
+    puede modificarse ni cerrarse dos veces entre el pedido y el pago.
+    """
+    cp = models.CarritoProducto
+    carrito = db.execute(
+        select(models.CarritoCompra).where(
+            models.CarritoCompra.fk_id_cliente == id_cliente, models.CarritoCompra.estado == 'abierto'
+        ).with_for_update()
+    ).scalar_one_or_none()
+    if not carrito:
+        raise ValueError('Carrito no existe')
+    carrito_id = carrito.pk_id_carrito_compra
+
+    # Costo de envío, subtotal y cantidad de items en una sola consulta
+    subtotal = select(func.coalesce(func.sum(models.Producto.precio * cp.cantidad), 0)).select_from(cp).join(
+        models.Producto, models.Producto.pk_id_producto == cp.fk_id_producto
+    ).where(cp.fk_id_carrito_compra == carrito_id).scalar_subquery()
+    items = select(func.coalesce(func.sum(cp.cantidad), 0)).where(cp.fk_id_carrito_compra == carrito_id).scalar_subquery()
+    fila = db.execute(
+        select(models.Envio.costo_envio, subtotal, items).where(models.Envio.pk_id_envio == data.fk_id_envio)
+    ).first()
+    if fila is None:
+        db.rollback()
+        raise ValueError('Envio no existe')
+    costo_envio, subtotal, total_items = fila
+    if not total_items:
+        db.rollback()
+        raise ValueError('El carrito está vacío')
+    subtotal, costo_envio = _a_moneda(subtotal), _a_moneda(costo_envio)
+    total = subtotal + costo_envio
+
+    pedido = _insertar_devolviendo(db, models.Pedido, fk_id_carrito_compra=carrito_id, fk_id_envio=data.fk_id_envio)
+    venta = _insertar_devolviendo(
+        db, models.Venta, fk_id_pedido=pedido.pk_id_pedido, metodo_pago=data.metodo_pago, total=total
+    )
+    tareas.encolar(db, 'analitica.acumular_venta', venta_id=venta.pk_id_venta)
+    nuevo = _cerrar_carrito(db, carrito_id, id_cliente)
+    # Al final de la transacción: el bloqueo de los productos dura solo hasta el commit
+    _reservar_stock(db, carrito_id)
+    db.commit()
+    return {
+        'pedido': pedido, 'venta': venta, 'carrito_nuevo': nuevo, 'total_items': int(total_items),
+        'subtotal': subtotal, 'costo_envio': costo_envio, 'total': total,
+    }
+
 def listar_pedidos(db: Session):
-    return db.execute(select(models.Pedido)).scalars().all()
+    return db.execute(select(*columnas(models.Pedido, schemas.PedidoList))).all()
+
+def _con_detalle(q):
+    """Carga todo lo que usa PedidoDetalle: 4 consultas en total, sin importar cuántos pedidos"""
+    return q.options(
+        joinedload(models.Pedido.envio),
+        selectinload(models.Pedido.venta),
+        selectinload(models.Pedido.carrito).selectinload(models.CarritoCompra.productos).joinedload(
+            models.CarritoProducto.producto
+        ),
+    )
+
+def obtener_pedido_detalle(db: Session, pedido_id: int) -> Optional[models.Pedido]:
+    q = select(models.Pedido).where(models.Pedido.pk_id_pedido == pedido_id)
+    return db.execute(_con_detalle(q)).scalar_one_or_none()
+
+def listar_pedidos_cliente(db: Session, cliente_id: int, limit: int, cursor: Optional[int] = None):
+    """Pedidos de un cliente con detalle, del más reciente al más antiguo (keyset sobre pk_id_pedido). Retorna (pedidos, next_cursor)"""
+    q = select(models.Pedido).join(models.Pedido.carrito).where(
+        models.CarritoCompra.fk_id_cliente == cliente_id
+    ).order_by(models.Pedido.pk_id_pedido.desc())
+    if cursor is not None:
+        q = q.where(models.Pedido.pk_id_pedido < cursor)
+    pedidos = db.execute(_con_detalle(q.limit(limit + 1))).scalars().all()
+    next_cursor = None
+    if len(pedidos) > limit:
+        pedidos = pedidos[:limit]
+        next_cursor = pedidos[-1].pk_id_pedido
+    return pedidos, next_cursor
 
 # VENTA
 
 def registrar_venta(db: Session, data: schemas.VentaCreate):
-    pedido = db.get(models.Pedido, data.fk_id_pedido)
+    """Registrar la venta de un pedido; LookupError si el pedido no existe.
+
+    El pedido queda bloqueado (FOR UPDATE) hasta el commit: `liberar_pedidos_vencidos` lo salta
+    mientras tanto, y si lo borró antes la venta se rechaza en lugar de violar la clave foránea.
+    """
+    pedido = db.execute(
+        select(models.Pedido.pk_id_pedido).where(models.Pedido.pk_id_pedido == data.fk_id_pedido).with_for_update()
+    ).first()
     if not pedido:
-        raise ValueError('Pedido no existe')
+        db.rollback()
+        raise LookupError('Pedido no existe')
     venta = models.Venta(**data.dict())
     db.add(venta)
+    db.flush()
+    tareas.encolar(db, 'analitica.acumular_venta', venta_id=venta.pk_id_venta)
     db.commit()
     db.refresh(venta)
     return venta
 
 def listar_ventas(db: Session):
-    return db.execute(select(models.Venta)).scalars().all()
+    return db.execute(select(*columnas(models.Venta, schemas.VentaList))).all()
 
-def calcular_total_pedido(db: Session, pedido_id: int):
-    pedido = db.get(models.Pedido, pedido_id)
-    if not pedido:
+def _filtrar_rango(q, columna_id, columna_fecha, desde, hasta, id_desde, id_hasta):
+    """Filtros comunes de exportación: fechas inclusivas [desde, hasta] e IDs inclusivos"""
+    if desde is not None:
+        q = q.where(columna_fecha >= desde)
+    if hasta is not None:
+        q = q.where(columna_fecha < hasta + timedelta(days=1))
+    if id_desde is not None:
+        q = q.where(columna_id >= id_desde)
+    if id_hasta is not None:
+        q = q.where(columna_id <= id_hasta)
+    return q.order_by(columna_id)
+
+def consulta_exportar_ventas(desde: Optional[date] = None, hasta: Optional[date] = None,
+                             id_desde: Optional[int] = None, id_hasta: Optional[int] = None):
+    """SELECT de columnas (sin entidades ORM) para exportar ventas en streaming"""
+    v = models.Venta
+    q = select(v.pk_id_venta, v.fk_id_pedido, v.metodo_pago, v.total, v.fecha_venta)
+    return _filtrar_rango(q, v.pk_id_venta, v.fecha_venta, desde, hasta, id_desde, id_hasta)
+
+def consulta_exportar_pedidos(desde: Optional[date] = None, hasta: Optional[date] = None,
+                              id_desde: Optional[int] = None, id_hasta: Optional[int] = None):
+    """SELECT de columnas (sin entidades ORM) para exportar pedidos en streaming"""
+    p = models.Pedido
+    q = select(p.pk_id_pedido, p.fk_id_carrito_compra, p.fk_id_envio, p.fecha_pedido)
+    return _filtrar_rango(q, p.pk_id_pedido, p.fecha_pedido, desde, hasta, id_desde, id_hasta)
+
+def calcular_totales_pedidos(db: Session, pedido_ids: list[int]) -> dict[int, Decimal]:
+    """Total (subtotal del carrito + costo de envío) de varios pedidos en una sola consulta"""
+    q = select(
+        models.Pedido.pk_id_pedido,
+        models.Envio.costo_envio,
+        func.coalesce(func.sum(models.Producto.precio * models.CarritoProducto.cantidad), 0),
+    ).join(
+        models.Envio, models.Envio.pk_id_envio == models.Pedido.fk_id_envio
+    ).outerjoin(
+        models.CarritoProducto,
+        models.CarritoProducto.fk_id_carrito_compra == models.Pedido.fk_id_carrito_compra
+    ).outerjoin(
+        models.Producto, models.Producto.pk_id_producto == models.CarritoProducto.fk_id_producto
+    ).where(
+        models.Pedido.pk_id_pedido.in_(pedido_ids)
+    ).group_by(models.Pedido.pk_id_pedido, models.Envio.costo_envio)
+    return {
+        pid: _a_moneda(Decimal(str(subtotal)) + Decimal(str(costo_envio)))
+        for pid, costo_envio, subtotal in db.execute(q)
+    }
+
+def calcular_total_pedido(db: Session, pedido_id: int) -> Decimal:
+    totales = calcular_totales_pedidos(db, [pedido_id])
+    if pedido_id not in totales:
         raise ValueError('Pedido no existe')
-    carrito = db.get(models.CarritoCompra, pedido.fk_id_carrito_compra)
-    envio = db.get(models.Envio, pedido.fk_id_envio)
-    if not carrito or not envio:
-        raise ValueError('Datos faltantes para calcular total')
-    q = select(models.CarritoProducto).where(models.CarritoProducto.fk_id_carrito_compra == carrito.pk_id_carrito_compra)
-    items = db.execute(q).scalars().all()
-    subtotal = 0.0
-    for it in items:
-        prod = db.get(models.Producto, it.fk_id_producto)
-        if prod:
-            subtotal += float(prod.precio) * it.cantidad
-    total = subtotal + float(envio.costo_envio)
-    return round(total, 2)
+    return totales[pedido_id]
@@ -1,16 +1,245 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from .config import DATABASE_URL
+import logging
+import math
+import time
+from typing import Any, Callable, TypeVar, Union
+from fastapi import Request, Response
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from .config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DB_ASYNC,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    READ_DATABASE_URL, ASYNC_READ_DATABASE_URL, DB_LECTURA_PRIMARIA_SEGUNDOS, DB_REPLICA_REINTENTO_SEGUNDOS,
+    DB_REPLICA_CONNECT_TIMEOUT,
+)
+from .metricas import Histograma
+
+logger = logging.getLogger("uvicorn.error")
 
 class Base(DeclarativeBase):
     pass
 
-engine = create_engine(DATABASE_URL, echo=False, future=True)
+# Espera para obtener una conexión del pool (incluye abrir una nueva si hay cupo)
+espera_checkout = Histograma()
+checkout_timeouts = 0
+
+class _EsperaCheckout:
+    """Mide cuánto espera cada checkout y cuántos agotan pool_timeout"""
+
+    def _do_get(self):
+        global checkout_timeouts
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            checkout_timeouts += 1
+            raise
+        finally:
+            espera_checkout.observar(time.perf_counter() - inicio)
+
+class QueuePoolInstrumentado(_EsperaCheckout, QueuePool):
+    pass
+
+class AsyncQueuePoolInstrumentado(_EsperaCheckout, AsyncAdaptedQueuePool):
+    pass
+
+def _opciones_pool(url: str, poolclass=QueuePoolInstrumentado) -> dict:
+    parsed = make_url(url)
+    # SQLite en memoria usa un pool de un solo hilo sin parámetros de tamaño
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        return {}
+    return {
+        'poolclass': poolclass,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+engine = create_engine(DATABASE_URL, echo=False, future=True, **_opciones_pool(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 
+# Motor async: solo se crea con DB_ASYNC=true para no exigir asyncpg/aiosqlite en modo sync
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, echo=False, **_opciones_pool(ASYNC_DATABASE_URL, AsyncQueuePoolInstrumentado)
+    )
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+def _connect_args_replica(url: str) -> dict:
+    """Timeout de conexión corto: si la réplica no responde hay que pasar pronto a la primaria"""
+    driver = make_url(url).get_driver_name()
+    if driver == 'asyncpg':
+        return {'timeout': DB_REPLICA_CONNECT_TIMEOUT}
+    if driver in ('psycopg2', 'psycopg'):
+        return {'connect_timeout': DB_REPLICA_CONNECT_TIMEOUT}
+    return {}
+
+# Réplica de solo lectura: un motor aparte (con el backend de DB_ASYNC) y su propio pool
+read_engine = None
+ReadSessionLocal = None
+async_read_engine = None
+AsyncReadSessionLocal = None
+if READ_DATABASE_URL and DB_ASYNC:
+    async_read_engine = create_async_engine(
+        ASYNC_READ_DATABASE_URL, echo=False, connect_args=_connect_args_replica(ASYNC_READ_DATABASE_URL),
+        **_opciones_pool(ASYNC_READ_DATABASE_URL, AsyncAdaptedQueuePool),
+    )
+    AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+elif READ_DATABASE_URL:
+    read_engine = create_engine(
+        READ_DATABASE_URL, echo=False, future=True, connect_args=_connect_args_replica(READ_DATABASE_URL),
+        **_opciones_pool(READ_DATABASE_URL, QueuePool),
+    )
+    ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, expire_on_commit=False)
+
+def estado_pool() -> dict:
+    """Ocupación actual del pool de este proceso y tiempos de espera de checkout"""
+    pool = async_engine.sync_engine.pool if async_engine is not None else engine.pool
+    if not isinstance(pool, QueuePool):
+        return {'pool': type(pool).__name__}
+    return {
+        'pool': type(pool).__name__,
+        'config': {
+            'pool_size': pool.size(),
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE,
+            'pool_pre_ping': DB_POOL_PRE_PING,
+        },
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'checkout_timeouts': checkout_timeouts,
+        'checkout_wait_seconds': espera_checkout.como_dict(),
+    }
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Enrutamiento de lecturas a la réplica
+
+COOKIE_ESCRITURA = 'escritura_reciente'
+lecturas = {'replica': 0, 'primaria': 0, 'fallos_replica': 0}
+_replica_caida_hasta = 0.0
+
+def hay_replica() -> bool:
+    return READ_DATABASE_URL is not None
+
+def marcar_escritura(response: Response) -> None:
+    """Cookie con el fin de la ventana en la que las lecturas de este cliente van a la primaria (read-your-writes)"""
+    response.set_cookie(
+        COOKIE_ESCRITURA, f'{time.time() + DB_LECTURA_PRIMARIA_SEGUNDOS:.0f}',
+        max_age=math.ceil(DB_LECTURA_PRIMARIA_SEGUNDOS), httponly=True, samesite='lax',
+    )
+
+def _leer_de_replica(request: Request) -> bool:
+    if time.monotonic() < _replica_caida_hasta:
+        return False
+    hasta = request.cookies.get(COOKIE_ESCRITURA)
+    try:
+        return hasta is None or float(hasta) <= time.time()
+    except ValueError:
+        return True
+
+def _replica_fallo(error: Exception) -> None:
+    global _replica_caida_hasta
+    _replica_caida_hasta = time.monotonic() + DB_REPLICA_REINTENTO_SEGUNDOS
+    lecturas['fallos_replica'] += 1
+    logger.warning(
+        "Réplica de lectura no disponible (%s: %s); se usa la primaria durante %.0f s",
+        type(error).__name__, error, DB_REPLICA_REINTENTO_SEGUNDOS,
+    )
+
+def get_read_db(request: Request):
+    """Sesión de solo lectura: la réplica si hay, salvo justo después de una escritura del cliente o si no responde"""
+    db = None
+    if ReadSessionLocal is not None and _leer_de_replica(request):
+        db = ReadSessionLocal()
+        try:
+            db.connection()  # conectar ya: si falla, la petición todavía puede ir a la primaria
+        except (exc.DBAPIError, exc.TimeoutError) as e:
+            db.close()
+            db = None
+            _replica_fallo(e)
+    if db is None:
+        lecturas['primaria'] += 1
+        db = SessionLocal()
+    else:
+        lecturas['replica'] += 1
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    """Como get_read_db, con AsyncSession"""
+    db = None
+    if AsyncReadSessionLocal is not None and _leer_de_replica(request):
+        db = AsyncReadSessionLocal()
+        try:
+            await db.connection()
+        except (exc.DBAPIError, exc.TimeoutError) as e:
+            await db.close()
+            db = None
+            _replica_fallo(e)
+    if db is None:
+        lecturas['primaria'] += 1
+        db = AsyncSessionLocal()
+    else:
+        lecturas['replica'] += 1
+    try:
+        yield db
+    finally:
+        await db.close()
+
+def estado_replica() -> dict:
+    return {
+        'configurada': hay_replica(),
+        'disponible': time.monotonic() >= _replica_caida_hasta,
+        'lecturas': dict(lecturas),
+        'lectura_primaria_tras_escritura_segundos': DB_LECTURA_PRIMARIA_SEGUNDOS,
+    }
+
+# Sesión que reciben los controladores; DB_ASYNC elige el backend
+Sesion = Union[Session, AsyncSession]
+get_sesion = get_async_db if DB_ASYNC else get_db
+# Para rutas que solo leen: puede ir a la réplica
+get_sesion_lectura = get_async_read_db if DB_ASYNC else get_read_db
+
+T = TypeVar('T')
+
+async def ejecutar(db: Sesion, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Ejecuta una función de app.crud (que recibe una Session) sin bloquear el event loop.
+
+    Con AsyncSession corre vía run_sync: el SQL viaja por el driver async en el propio loop.
+    Con Session sync corre en el threadpool de Starlette, como los handlers `def` de antes.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+async def con_sesion(fn: Callable[..., T], *args: Any) -> T:
+    """Correr fn(db, *args) en una sesión propia, fuera de una petición (tareas de fondo, arranque)"""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args)
+
+    def _sync():
+        with SessionLocal() as db:
+            return fn(db, *args)
+    return await run_in_threadpool(_sync)
@@ -0,0 +1,109 @@
+"""Exportación en streaming (CSV / NDJSON) con memoria constante.
+
+Las filas se leen con un cursor de servidor (`yield_per`) en lotes de EXPORT_LOTE_FILAS
+y cada lote se codifica y envía antes de leer el siguiente. La sesión la abre el propio
+stream: la del request (`get_sesion`) ya está cerrada cuando se envía el cuerpo.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional, Sequence
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from app import database
+from app.config import EXPORT_LOTE_FILAS
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+def _valor_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+class _Codificador:
+    """Convierte lotes de filas en bytes del formato pedido"""
+
+    def __init__(self, columnas: Sequence[str], formato: str):
+        self.columnas = list(columnas)
+        self.formato = formato
+
+    def cabecera(self) -> bytes:
+        if self.formato == 'csv':
+            return self._csv([self.columnas])
+        return b''
+
+    def lote(self, filas) -> bytes:
+        if self.formato == 'csv':
+            return self._csv(filas)
+        return ''.join(
+            json.dumps(dict(zip(self.columnas, map(_valor_json, fila))), ensure_ascii=False) + '\n'
+            for fila in filas
+        ).encode('utf-8')
+
+    @staticmethod
+    def _csv(filas) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(filas)
+        return buffer.getvalue().encode('utf-8')
+
+class _Salida:
+    """Paso final de cada chunk: identidad o gzip incremental"""
+
+    def __init__(self, comprimir: bool):
+        self._gzip = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if comprimir else None
+
+    def chunk(self, datos: bytes) -> bytes:
+        return self._gzip.compress(datos) if self._gzip else datos
+
+    def fin(self) -> bytes:
+        return self._gzip.flush() if self._gzip else b''
+
+def _stream_sync(stmt: Select, codificador: _Codificador, salida: _Salida):
+    with database.SessionLocal() as db:
+        yield salida.chunk(codificador.cabecera())
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_LOTE_FILAS))
+        for filas in result.partitions():
+            datos = salida.chunk(codificador.lote(filas))
+            if datos:
+                yield datos
+        yield salida.fin()
+
+async def _stream_async(stmt: Select, codificador: _Codificador, salida: _Salida):
+    async with database.AsyncSessionLocal() as db:
+        yield salida.chunk(codificador.cabecera())
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_LOTE_FILAS))
+        async for filas in result.partitions():
+            datos = salida.chunk(codificador.lote(filas))
+            if datos:
+                yield datos
+        yield salida.fin()
+
+def respuesta_exportacion(
+    stmt: Select, nombre: str, formato: str, accept_encoding: Optional[str] = None
+) -> StreamingResponse:
+    """StreamingResponse con el resultado de stmt; comprime con gzip si el cliente lo acepta"""
+    codificador = _Codificador([c.name for c in stmt.selected_columns], formato)
+    comprimir = 'gzip' in (accept_encoding or '').lower()
+    salida = _Salida(comprimir)
+    if database.AsyncSessionLocal is not None:
+        cuerpo = _stream_async(stmt, codificador, salida)
+    else:
+        cuerpo = _stream_sync(stmt, codificador, salida)
+    headers = {
+        'Content-Disposition': f'attachment; filename="{nombre}.{formato}"',
+        'Vary': 'Accept-Encoding',
+    }
+    if comprimir:
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(cuerpo, media_type=FORMATOS[formato], headers=headers)
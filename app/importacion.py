@@ -0,0 +1,197 @@
+"""Importación masiva del catálogo de productos desde CSV o NDJSON.
+
+El archivo se lee en streaming y se procesa en lotes de IMPORT_LOTE_FILAS. Cada fila se
+valida contra `ProductoImportacion`; las válidas del lote se escriben con un INSERT … ON
+CONFLICT (sku) DO UPDATE en modo executemany, y luego se crean las categorías y los vínculos
+producto-categoría que falten. Cada lote es una transacción: una fila inválida se reporta con
+su línea y no detiene la carga, y reimportar el mismo archivo actualiza en lugar de duplicar.
+
+CSV: cabecera con `sku,nombre,precio,marca,descripcion,stock,categorias` (categorías separadas
+por "|"); las celdas vacías cuentan como ausentes. NDJSON: un objeto por línea con los mismos
+campos (`categorias` como lista). Un `stock` ausente conserva el del producto existente.
+"""
+
+import csv
+import io
+import json
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import busqueda, models, schemas
+from app.cache import invalidar_respuestas
+from app.config import IMPORT_LOTE_FILAS, IMPORT_MAX_ERRORES
+
+FORMATOS = ('csv', 'ndjson')
+
+P, C, PC = models.Producto, models.Categoria, models.ProductoCategoria
+# (línea, campos) por fila leída; un str en lugar de los campos es el error de lectura
+Fila = tuple[int, Union[dict, str]]
+# Filas válidas de un lote por sku: (línea, fila)
+Validas = dict[str, tuple[int, schemas.ProductoImportacion]]
+
+def detectar_formato(nombre: Optional[str], content_type: Optional[str] = None) -> Optional[str]:
+    """Formato según la extensión del archivo o, si no la tiene, su content-type"""
+    nombre = (nombre or '').lower()
+    if nombre.endswith('.csv'):
+        return 'csv'
+    if nombre.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    tipo = (content_type or '').split(';')[0].strip().lower()
+    return {'text/csv': 'csv', 'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson'}.get(tipo)
+
+def leer_filas(archivo: BinaryIO, formato: str) -> Iterator[Fila]:
+    """Recorre el archivo (UTF-8, con o sin BOM) sin cargarlo entero en memoria"""
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    linea = 0
+    try:
+        if formato == 'csv':
+            lector = csv.DictReader(texto)
+            for registro in lector:
+                linea = lector.line_num
+                if None in registro:
+                    yield linea, 'Más columnas que la cabecera'
+                    continue
+                yield linea, {k: v for k, v in registro.items() if v not in (None, '')}
+        else:
+            for linea, contenido in enumerate(texto, 1):
+                if not contenido.strip():
+                    continue
+                try:
+                    datos = json.loads(contenido)
+                except ValueError as e:
+                    yield linea, f'JSON inválido: {e}'
+                    continue
+                yield linea, datos if isinstance(datos, dict) else 'Se esperaba un objeto JSON'
+    except UnicodeDecodeError:
+        yield linea + 1, 'El archivo no es UTF-8 válido; se detuvo la lectura'
+    finally:
+        texto.detach()  # el archivo lo cierra quien lo abrió
+
+def lotes(filas: Iterable[Fila], tamano: int = IMPORT_LOTE_FILAS) -> Iterator[list[Fila]]:
+    filas = iter(filas)
+    while lote := list(islice(filas, tamano)):
+        yield lote
+
+def _mensaje(error: ValidationError) -> str:
+    return '; '.join(
+        f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e['loc'] else e['msg'] for e in error.errors()
+    )
+
+def _agregar_error(resultado: schemas.ResultadoImportacion, linea: int, error: str) -> None:
+    resultado.con_error += 1
+    if len(resultado.errores) < IMPORT_MAX_ERRORES:
+        resultado.errores.append(schemas.ErrorImportacion(linea=linea, error=error))
+
+def _upsert_productos(db: Session, valores: list[dict]) -> None:
+    insertar = {'postgresql': pg_insert, 'sqlite': sqlite_insert}.get(db.get_bind().dialect.name)
+    if insertar is None:
+        # Sin ON CONFLICT en el motor: actualizar los existentes y luego insertar el resto
+        existentes = set(db.execute(select(P.sku).where(P.sku.in_([v['sku'] for v in valores]))).scalars())
+        for v in valores:
+            if v['sku'] in existentes:
+                cambios = {k: x for k, x in v.items() if k != 'sku' and not (k == 'stock' and x is None)}
+                db.execute(update(P).where(P.sku == v['sku']).values(**cambios))
+        nuevos = [v for v in valores if v['sku'] not in existentes]
+        if nuevos:
+            db.execute(insert(P), nuevos)
+        return
+    stmt = insertar(P)
+    stmt = stmt.on_conflict_do_update(index_elements=[P.sku], set_={
+        'precio': stmt.excluded.precio,
+        'nombre': stmt.excluded.nombre,
+        'marca': stmt.excluded.marca,
+        'descripcion': stmt.excluded.descripcion,
+        # El stock es operativo (reservas de pedidos): solo se pisa si el archivo lo trae
+        'stock': func.coalesce(stmt.excluded.stock, P.stock),
+    })
+    db.execute(stmt, valores)
+
+def _vincular_categorias(db: Session, filas: list[schemas.ProductoImportacion], ids: dict[str, int]) -> int:
+    """Crear las categorías que falten (por descripción) y los vínculos nuevos; retorna categorías creadas"""
+    nombres = {c for f in filas for c in f.categorias}
+    if not nombres:
+        return 0
+
+    def buscar(descripciones):
+        # Si hay descripciones repetidas en la tabla se usa la más antigua
+        return dict(db.execute(
+            select(C.descripcion, func.min(C.pk_id_categoria)).where(C.descripcion.in_(descripciones))
+            .group_by(C.descripcion)
+        ).all())
+
+    categorias = buscar(nombres)
+    faltantes = sorted(nombres - categorias.keys())
+    if faltantes:
+        db.execute(insert(C), [{'descripcion': d} for d in faltantes])
+        categorias.update(buscar(faltantes))
+
+    pares = {(ids[f.sku], categorias[c]) for f in filas for c in f.categorias}
+    existentes = set(db.execute(
+        select(PC.fk_id_producto, PC.fk_id_categoria).where(PC.fk_id_producto.in_({p for p, _ in pares}))
+    ).all())
+    nuevos = [{'fk_id_producto': p, 'fk_id_categoria': c} for p, c in sorted(pares - existentes)]
+    if nuevos:
+        db.execute(insert(PC), nuevos)
+    return len(faltantes)
+
+def validar_lote(lote: list[Fila], resultado: schemas.ResultadoImportacion) -> Validas:
+    """Validar las filas del lote (sin base de datos), acumulando los errores en `resultado`"""
+    resultado.filas += len(lote)
+    validas: Validas = {}
+    for linea, datos in lote:
+        if isinstance(datos, str):
+            _agregar_error(resultado, linea, datos)
+            continue
+        try:
+            fila = schemas.ProductoImportacion.model_validate(datos)
+        except ValidationError as e:
+            _agregar_error(resultado, linea, _mensaje(e))
+            continue
+        if fila.sku in validas:
+            # Un sku repetido en el lote: gana la última aparición
+            _agregar_error(resultado, validas[fila.sku][0], f'sku {fila.sku} repetido más adelante; se ignora')
+        validas[fila.sku] = (linea, fila)
+    return validas
+
+def preparar_lote(lotes: Iterator[list[Fila]], resultado: schemas.ResultadoImportacion) -> Optional[Validas]:
+    """Leer y validar el siguiente lote del archivo; None al terminar.
+
+    Es trabajo de CPU sin base de datos: la API lo corre en el threadpool para no bloquear el loop.
+    """
+    lote = next(lotes, None)
+    return None if lote is None else validar_lote(lote, resultado)
+
+def escribir_lote(db: Session, validas: Validas, resultado: schemas.ResultadoImportacion) -> None:
+    """Escribir las filas válidas de un lote en su propia transacción, acumulando en `resultado`"""
+    if not validas:
+        return
+
+    filas = [fila for _, fila in validas.values()]
+    skus = list(validas)
+    try:
+        existentes = set(db.execute(select(P.sku).where(P.sku.in_(skus))).scalars())
+        _upsert_productos(db, [f.model_dump(exclude={'categorias'}) for f in filas])
+        ids = dict(db.execute(select(P.sku, P.pk_id_producto).where(P.sku.in_(skus))).all())
+        creadas = _vincular_categorias(db, filas, ids)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        for linea, _ in validas.values():
+            _agregar_error(resultado, linea, f'Lote rechazado por la base de datos: {type(e).__name__}')
+        return
+    resultado.insertados += len(skus) - len(existentes)
+    resultado.actualizados += len(existentes)
+    resultado.categorias_creadas += creadas
+    invalidar_respuestas('productos')
+    busqueda.indice_productos.invalidar()
+
+def importar_lote(db: Session, lote: list[Fila], resultado: schemas.ResultadoImportacion) -> None:
+    """Validar y escribir un lote en su propia transacción, acumulando en `resultado`"""
+    escribir_lote(db, validar_lote(lote, resultado), resultado)
@@ -0,0 +1,140 @@
+"""Limpieza de datos por conjuntos y en lotes.
+
+Los clientes a borrar se eligen con una condición SQL y se recorren por pk en lotes de
+MANTENIMIENTO_LOTE. Por lote se ejecuta un DELETE … WHERE … IN (subconsulta) por tabla, de
+las hojas a la raíz (venta → pedido → carrito_producto → carrito_compra → cliente), y un
+commit: los bloqueos duran lo que un lote y una interrupción deja lo ya borrado confirmado.
+El borrado explícito funciona igual con o sin ON DELETE CASCADE (migración v10, PostgreSQL).
+
+Antes de borrar, los pedidos sin venta devuelven su stock reservado; si se borraron ventas, los
+acumulados de analítica se recalculan al final.
+
+`barrer_carritos` aplica la misma idea a los carritos: los abiertos sin actividad pasan a
+abandonados (el cliente recibe uno nuevo vacío) y se borran las líneas de los abandonados.
+`barrido_carritos` lo corre periódicamente en cada worker (ver main.py).
+"""
+
+import time
+from datetime import timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import analitica, crud, models, tareas
+from app.config import CARRITO_ABANDONO_HORAS, CARRITO_BARRIDO_MINUTOS, MANTENIMIENTO_LOTE
+
+CL, CC, CP = models.Cliente, models.CarritoCompra, models.CarritoProducto
+PE, V = models.Pedido, models.Venta
+
+# Orden de borrado: primero las tablas que referencian a las demás
+TABLAS = {'venta': V, 'pedido': PE, 'carrito_producto': CP, 'carrito_compra': CC, 'cliente': CL}
+
+def sin_hash():
+    """Clientes cuya contraseña no es un hash bcrypt ($2a$, $2b$, $2y$)"""
+    return ~CL.contrasena.like('$2%')
+
+def correo_como(patron: str):
+    """Clientes cuyo correo coincide con un patrón LIKE (p. ej. 'bench%@example.com')"""
+    return CL.correo.like(patron)
+
+def _condiciones(clientes) -> dict:
+    """Condición WHERE por tabla para las filas de los clientes dados (lista de IDs o subconsulta)"""
+    carritos = select(CC.pk_id_carrito_compra).where(CC.fk_id_cliente.in_(clientes))
+    pedidos = select(PE.pk_id_pedido).where(PE.fk_id_carrito_compra.in_(carritos))
+    return {
+        'venta': V.fk_id_pedido.in_(pedidos),
+        'pedido': PE.fk_id_carrito_compra.in_(carritos),
+        'carrito_producto': CP.fk_id_carrito_compra.in_(carritos),
+        'carrito_compra': CC.fk_id_cliente.in_(clientes),
+        'cliente': CL.pk_id_cliente.in_(clientes),
+    }
+
+def contar(db: Session, condicion) -> dict[str, int]:
+    """Simulación: filas por tabla que borraría `borrar_clientes` con la misma condición"""
+    condiciones = _condiciones(select(CL.pk_id_cliente).where(condicion))
+    return {
+        tabla: db.execute(select(func.count()).select_from(modelo).where(condiciones[tabla])).scalar_one()
+        for tabla, modelo in TABLAS.items()
+    }
+
+def _borrar_lote(db: Session, ids: list[int]) -> dict[str, int]:
+    condiciones = _condiciones(ids)
+    # Pedidos aún sin venta: su carrito tiene stock reservado que hay que devolver
+    crud.liberar_stock(db, select(PE.fk_id_carrito_compra).where(
+        condiciones['pedido'], ~select(V.pk_id_venta).where(V.fk_id_pedido == PE.pk_id_pedido).exists(),
+    ))
+    borradas = {
+        tabla: db.execute(
+            delete(modelo).where(condiciones[tabla]), execution_options={'synchronize_session': False}
+        ).rowcount
+        for tabla, modelo in TABLAS.items()
+    }
+    db.commit()
+    return borradas
+
+def borrar_clientes(
+    db: Session,
+    condicion,
+    lote: int = MANTENIMIENTO_LOTE,
+    progreso: Optional[Callable[[int, dict[str, int], float], None]] = None,
+) -> dict[str, int]:
+    """Borrar los clientes que cumplen `condicion` con todo lo suyo, un lote por transacción.
+
+    `progreso(lotes, totales, segundos)` se llama después de cada lote. Retorna filas borradas por tabla.
+    """
+    totales = dict.fromkeys(TABLAS, 0)
+    inicio, lotes, ultimo = time.perf_counter(), 0, 0
+    while True:
+        ids = db.execute(
+            select(CL.pk_id_cliente).where(condicion, CL.pk_id_cliente > ultimo)
+            .order_by(CL.pk_id_cliente).limit(lote)
+        ).scalars().all()
+        if not ids:
+            break
+        ultimo = ids[-1]
+        for tabla, n in _borrar_lote(db, ids).items():
+            totales[tabla] += n
+        lotes += 1
+        if progreso:
+            progreso(lotes, totales, time.perf_counter() - inicio)
+    if totales['venta']:
+        analitica.reconstruir(db)
+        db.commit()
+    return totales
+
+def barrer_carritos(db: Session, horas: int = CARRITO_ABANDONO_HORAS, lote: int = MANTENIMIENTO_LOTE) -> dict[str, int]:
+    """Abandonar los carritos abiertos con líneas y sin cambios en `horas`, y borrar las líneas de los abandonados.
+
+    Cada cliente afectado recibe un carrito abierto vacío. Los carritos se toman en lotes con
+    FOR UPDATE SKIP LOCKED: uno que se está modificando o cerrando en ese momento se salta, y
+    varios workers pueden barrer a la vez. Retorna carritos abandonados y líneas borradas.
+    """
+    limite = db.execute(select(func.now())).scalar_one() - timedelta(hours=horas)
+    con_lineas = select(CP.pk_id_carrito_producto).where(CP.fk_id_carrito_compra == CC.pk_id_carrito_compra).exists()
+    candidatos = select(CC.pk_id_carrito_compra, CC.fk_id_cliente, CC.estado).where(
+        or_(and_(CC.estado == 'abierto', CC.actualizado_en < limite), CC.estado == 'abandonado'), con_lineas,
+    ).order_by(CC.pk_id_carrito_compra).limit(lote).with_for_update(skip_locked=True)
+    totales = {'abandonados': 0, 'lineas_borradas': 0}
+    while True:
+        filas = db.execute(candidatos).all()
+        if not filas:
+            break
+        abiertos = [(pk, cliente) for pk, cliente, estado in filas if estado == 'abierto']
+        if abiertos:
+            db.execute(
+                update(CC).where(CC.pk_id_carrito_compra.in_([pk for pk, _ in abiertos])).values(estado='abandonado'),
+                execution_options={'synchronize_session': False},
+            )
+            db.execute(insert(CC), [{'fk_id_cliente': cliente} for _, cliente in abiertos])
+        totales['lineas_borradas'] += db.execute(
+            delete(CP).where(CP.fk_id_carrito_compra.in_([pk for pk, _, _ in filas])),
+            execution_options={'synchronize_session': False},
+        ).rowcount
+        db.commit()
+        totales['abandonados'] += len(abiertos)
+        if len(filas) < lote:
+            break
+    return totales
+
+barrido_carritos = tareas.TareaPeriodica('barrido de carritos', barrer_carritos, CARRITO_BARRIDO_MINUTOS * 60)
@@ -0,0 +1,144 @@
+"""Métricas en proceso: histogramas, latencia/consultas por ruta y exposición para Prometheus"""
+
+import math
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Límites superiores en segundos, al estilo de los buckets por defecto de Prometheus
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histograma:
+    """Histograma de buckets fijos, seguro entre hilos"""
+
+    def __init__(self, buckets: Iterable[float] = BUCKETS_LATENCIA):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._conteos = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float) -> None:
+        with self._lock:
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    self._conteos[i] += 1
+                    break
+            self.count += 1
+            self.sum += valor
+
+    def como_dict(self) -> dict:
+        """Conteos acumulados por límite superior ('+Inf' para el último)"""
+        with self._lock:
+            acumulado, buckets = 0, {}
+            for limite, n in zip(self.buckets, self._conteos):
+                acumulado += n
+                buckets['+Inf' if math.isinf(limite) else str(limite)] = acumulado
+            return {'buckets': buckets, 'count': self.count, 'sum': round(self.sum, 6)}
+
+# Métricas por petición HTTP
+
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class ConsultasRequest:
+    """Acumulador de SQL de la petición en curso (compartido por referencia vía ContextVar)"""
+    __slots__ = ('cantidad', 'segundos')
+
+    def __init__(self):
+        self.cantidad = 0
+        self.segundos = 0.0
+
+consultas_actuales: ContextVar[Optional[ConsultasRequest]] = ContextVar('consultas_actuales', default=None)
+
+class RegistroMetricas:
+    """Histogramas por (método, ruta) y exposición en formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._latencia: dict[tuple[str, str], Histograma] = {}
+        self._consultas: dict[tuple[str, str], Histograma] = {}
+        self._tiempo_db: dict[tuple[str, str], float] = defaultdict(float)
+        self._requests: dict[tuple[str, str, int], int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def registrar(self, metodo: str, ruta: str, status: int, segundos: float, consultas: ConsultasRequest) -> None:
+        clave = (metodo, ruta)
+        with self._lock:
+            latencia = self._latencia.get(clave) or self._latencia.setdefault(clave, Histograma())
+            por_request = self._consultas.get(clave) or self._consultas.setdefault(clave, Histograma(BUCKETS_CONSULTAS))
+            self._tiempo_db[clave] += consultas.segundos
+            self._requests[(metodo, ruta, status)] += 1
+        latencia.observar(segundos)
+        por_request.observar(consultas.cantidad)
+
+    def exponer(self, extras: Iterable[str] = ()) -> str:
+        lineas = []
+        with self._lock:
+            latencia = dict(self._latencia)
+            consultas = dict(self._consultas)
+            tiempo_db = dict(self._tiempo_db)
+            requests = dict(self._requests)
+
+        lineas += ['# HELP http_requests_total Peticiones atendidas.', '# TYPE http_requests_total counter']
+        for (metodo, ruta, status), n in sorted(requests.items()):
+            lineas.append(f'http_requests_total{_etiquetas(method=metodo, route=ruta, status=status)} {n}')
+        _histogramas(lineas, 'http_request_duration_seconds', 'Latencia por ruta (hasta enviar cabeceras).', latencia)
+        _histogramas(lineas, 'db_queries_per_request', 'Sentencias SQL por petición.', consultas)
+        lineas += ['# HELP db_time_seconds_total Tiempo acumulado en la base por ruta.', '# TYPE db_time_seconds_total counter']
+        for (metodo, ruta), segundos in sorted(tiempo_db.items()):
+            lineas.append(f'db_time_seconds_total{_etiquetas(method=metodo, route=ruta)} {segundos:.6f}')
+        lineas += list(extras)
+        return '\n'.join(lineas) + '\n'
+
+def _etiquetas(**valores) -> str:
+    pares = ','.join(f'{k}="{str(v).replace(chr(34), chr(92) + chr(34))}"' for k, v in valores.items())
+    return '{' + pares + '}'
+
+def _histogramas(lineas: list, nombre: str, ayuda: str, por_clave: dict) -> None:
+    lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+    for (metodo, ruta), histograma in sorted(por_clave.items()):
+        datos = histograma.como_dict()
+        for limite, acumulado in datos['buckets'].items():
+            lineas.append(f'{nombre}_bucket{_etiquetas(method=metodo, route=ruta, le=limite)} {acumulado}')
+        lineas.append(f'{nombre}_sum{_etiquetas(method=metodo, route=ruta)} {datos["sum"]}')
+        lineas.append(f'{nombre}_count{_etiquetas(method=metodo, route=ruta)} {datos["count"]}')
+
+def gauge(nombre: str, ayuda: str, valor) -> list[str]:
+    return [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} gauge', f'{nombre} {valor}']
+
+def serie(nombre: str, tipo: str, ayuda: str, muestras: Iterable[tuple[dict, float]]) -> list[str]:
+    """Métrica con etiquetas: muestras como (etiquetas, valor)"""
+    return [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}'] + [
+        f'{nombre}{_etiquetas(**etiquetas)} {valor}' for etiquetas, valor in muestras
+    ]
+
+registro = RegistroMetricas()
+
+def instrumentar_engine(engine: Engine) -> None:
+    """Cuenta sentencias y tiempo de base de la petición en curso (engine sync o async.sync_engine)"""
+
+    def _registrar(conn) -> None:
+        # Una sola sentencia en curso por conexión: basta con un inicio, que se descarta al terminar
+        inicio = conn.info.pop('inicio_consulta', None)
+        actual = consultas_actuales.get()
+        if inicio is not None and actual is not None:
+            actual.cantidad += 1
+            actual.segundos += time.perf_counter() - inicio
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info['inicio_consulta'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        _registrar(conn)
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(contexto):
+        # La sentencia que falla también cuenta (y no deja su inicio para la siguiente)
+        if contexto.connection is not None:
+            _registrar(contexto.connection)
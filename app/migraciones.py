@@ -0,0 +1,263 @@
+"""Migraciones versionadas del esquema.
+
+Cada migración es idempotente (comprueba lo que ya existe antes de crear) y al
+aplicarse queda registrada en la tabla `schema_version`. Se ejecutan con
+`python migrar.py`; la aplicación ya no crea tablas al importarse.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, func, inspect, insert, select, text,
+)
+from sqlalchemy.engine import Connection, Engine
+
+from app.database import Base
+from app import models
+
+_meta = MetaData()
+
+schema_version = Table(
+    'schema_version', _meta,
+    Column('version', Integer, primary_key=True),
+    Column('descripcion', String(200), nullable=False),
+    Column('aplicada_en', DateTime, nullable=False, server_default=func.now()),
+)
+
+@dataclass(frozen=True)
+class Migracion:
+    version: int
+    descripcion: str
+    aplicar: Callable[[Connection], None]
+
+# Utilidades
+
+def _crear_tablas(conn: Connection, *modelos) -> None:
+    Base.metadata.create_all(conn, tables=[m.__table__ for m in modelos], checkfirst=True)
+
+def _crear_indices(conn: Connection, modelo, *nombres: str) -> None:
+    indices = {idx.name: idx for idx in modelo.__table__.indexes}
+    for nombre in nombres:
+        indices[nombre].create(conn, checkfirst=True)
+
+def _agregar_columna(conn: Connection, modelo, nombre: str, ddl_tipo: str) -> None:
+    """ALTER TABLE ... ADD COLUMN si la columna no existe todavía"""
+    tabla = modelo.__tablename__
+    existentes = {c['name'] for c in inspect(conn).get_columns(tabla)}
+    if nombre not in existentes:
+        conn.execute(text(f'ALTER TABLE {tabla} ADD COLUMN {nombre} {ddl_tipo}'))
+
+# Migraciones
+
+def _v1_esquema_inicial(conn: Connection) -> None:
+    _crear_tablas(
+        conn,
+        models.Cliente, models.Producto, models.CarritoCompra, models.Envio, models.Pedido,
+        models.Venta, models.CarritoProducto, models.Categoria, models.ProductoCategoria,
+    )
+    # Bases creadas con schema.sql antiguo no tenían la columna de administrador
+    _agregar_columna(conn, models.Cliente, 'es_administrador', 'BOOLEAN NOT NULL DEFAULT FALSE')
+
+def _v2_indices_busqueda(conn: Connection) -> None:
+    duplicados = conn.execute(text(
+        'SELECT correo FROM cliente GROUP BY correo HAVING COUNT(*) > 1'
+    )).scalars().all()
+    if duplicados:
+        raise RuntimeError(
+            f"No se puede crear el índice único de correo; hay correos duplicados: {', '.join(duplicados[:10])}"
+        )
+    _crear_indices(conn, models.Cliente, 'ix_cliente_correo')
+    _crear_indices(conn, models.CarritoCompra, 'ix_carrito_compra_cliente_reciente')
+    _crear_indices(conn, models.Pedido, 'ix_pedido_fk_id_carrito_compra', 'ix_pedido_fk_id_envio')
+    _crear_indices(conn, models.Venta, 'ix_venta_fk_id_pedido')
+    _crear_indices(conn, models.CarritoProducto, 'ix_carrito_producto_fk_id_producto')
+    _crear_indices(
+        conn, models.ProductoCategoria,
+        'ix_producto_categoria_fk_id_producto', 'ix_producto_categoria_fk_id_categoria',
+    )
+
+def _v3_unico_carrito_producto(conn: Connection) -> None:
+    # ON CONFLICT necesita la restricción única; las bases creadas con schema.sql no la tenían
+    insp = inspect(conn)
+    columnas = ['fk_id_carrito_compra', 'fk_id_producto']
+    existentes = [u['column_names'] for u in insp.get_unique_constraints('carrito_producto')]
+    existentes += [i['column_names'] for i in insp.get_indexes('carrito_producto') if i['unique']]
+    if any(sorted(cols) == columnas for cols in existentes):
+        return
+    # Fusionar líneas duplicadas en la de menor ID antes de crear el índice único
+    conn.execute(text(
+        'UPDATE carrito_producto SET cantidad = ('
+        ' SELECT SUM(c2.cantidad) FROM carrito_producto c2'
+        ' WHERE c2.fk_id_carrito_compra = carrito_producto.fk_id_carrito_compra'
+        ' AND c2.fk_id_producto = carrito_producto.fk_id_producto)'
+        ' WHERE pk_id_carrito_producto IN ('
+        ' SELECT MIN(pk_id_carrito_producto) FROM carrito_producto'
+        ' GROUP BY fk_id_carrito_compra, fk_id_producto HAVING COUNT(*) > 1)'
+    ))
+    conn.execute(text(
+        'DELETE FROM carrito_producto WHERE pk_id_carrito_producto NOT IN ('
+        ' SELECT MIN(pk_id_carrito_producto) FROM carrito_producto'
+        ' GROUP BY fk_id_carrito_compra, fk_id_producto)'
+    ))
+    conn.execute(text(
+        'CREATE UNIQUE INDEX uq_carrito_producto_unico ON carrito_producto (fk_id_carrito_compra, fk_id_producto)'
+    ))
+
+def _v4_fechas_pedido_venta(conn: Connection) -> None:
+    # Nulas en filas históricas; las nuevas reciben now() desde el ORM
+    _agregar_columna(conn, models.Pedido, 'fecha_pedido', 'TIMESTAMP')
+    _agregar_columna(conn, models.Venta, 'fecha_venta', 'TIMESTAMP')
+    _crear_indices(conn, models.Pedido, 'ix_pedido_fecha_pedido')
+    _crear_indices(conn, models.Venta, 'ix_venta_fecha_venta')
+
+def _v5_busqueda_productos(conn: Connection) -> None:
+    # Solo PostgreSQL; en otros motores la búsqueda usa el índice invertido en memoria
+    if conn.dialect.name != 'postgresql':
+        return
+    _crear_indices(conn, models.Producto, 'ix_producto_busqueda')
+
+def _v6_analitica_ventas(conn: Connection) -> None:
+    _crear_tablas(
+        conn, models.VentaDiaria, models.VentaPorProducto, models.VentaPorCategoria, models.VentaPorEnvio,
+    )
+    # Cargar los acumulados con el historial existente; desde aquí se mantienen por venta.
+    # SQL fijo (no app.analitica) para que la migración dé lo mismo aunque la aplicación cambie
+    for tabla in ('analitica_venta_diaria', 'analitica_venta_producto', 'analitica_venta_categoria', 'analitica_venta_envio'):
+        conn.execute(text(f'DELETE FROM {tabla}'))
+    conn.execute(text(
+        'INSERT INTO analitica_venta_diaria (dia, ventas, unidades, ingresos)'
+        ' SELECT dia, COUNT(*), SUM(unidades), SUM(total) FROM ('
+        ' SELECT DATE(v.fecha_venta) AS dia, v.total, ('
+        ' SELECT COALESCE(SUM(cp.cantidad), 0) FROM carrito_producto cp'
+        ' WHERE cp.fk_id_carrito_compra = p.fk_id_carrito_compra) AS unidades'
+        ' FROM venta v JOIN pedido p ON p.pk_id_pedido = v.fk_id_pedido'
+        ' WHERE v.fecha_venta IS NOT NULL) por_venta'
+        ' GROUP BY dia'
+    ))
+    lineas_vendidas = (
+        ' FROM venta v JOIN pedido p ON p.pk_id_pedido = v.fk_id_pedido'
+        ' JOIN carrito_producto cp ON cp.fk_id_carrito_compra = p.fk_id_carrito_compra'
+        ' JOIN producto pr ON pr.pk_id_producto = cp.fk_id_producto'
+    )
+    conn.execute(text(
+        'INSERT INTO analitica_venta_producto (fk_id_producto, ventas, unidades, ingresos)'
+        ' SELECT cp.fk_id_producto, COUNT(DISTINCT v.pk_id_venta), SUM(cp.cantidad), SUM(pr.precio * cp.cantidad)'
+        + lineas_vendidas + ' GROUP BY cp.fk_id_producto'
+    ))
+    conn.execute(text(
+        'INSERT INTO analitica_venta_categoria (fk_id_categoria, ventas, unidades, ingresos)'
+        ' SELECT pc.fk_id_categoria, COUNT(DISTINCT v.pk_id_venta), SUM(cp.cantidad), SUM(pr.precio * cp.cantidad)'
+        + lineas_vendidas + ' JOIN producto_categoria pc ON pc.fk_id_producto = cp.fk_id_producto'
+        ' GROUP BY pc.fk_id_categoria'
+    ))
+    conn.execute(text(
+        'INSERT INTO analitica_venta_envio (fk_id_envio, ventas, ingresos)'
+        ' SELECT p.fk_id_envio, COUNT(*), SUM(v.total)'
+        ' FROM venta v JOIN pedido p ON p.pk_id_pedido = v.fk_id_pedido'
+        ' GROUP BY p.fk_id_envio'
+    ))
+
+def _v7_cola_tareas(conn: Connection) -> None:
+    _crear_tablas(conn, models.Tarea)
+
+def _v8_stock_producto(conn: Connection) -> None:
+    # Nula en los productos existentes: siguen vendiéndose sin control hasta que se les fije stock
+    _agregar_columna(conn, models.Producto, 'stock', 'INTEGER')
+
+def _v9_sku_producto(conn: Connection) -> None:
+    # Nulo en los productos existentes; la importación masiva lo usa como clave natural
+    _agregar_columna(conn, models.Producto, 'sku', 'VARCHAR(50)')
+    _crear_indices(conn, models.Producto, 'uq_producto_sku')
+
+# Claves foráneas que borran en cascada: cliente → carrito → (líneas, pedido → venta)
+_CASCADAS = (
+    (models.CarritoCompra, 'fk_id_cliente'),
+    (models.CarritoProducto, 'fk_id_carrito_compra'),
+    (models.Pedido, 'fk_id_carrito_compra'),
+    (models.Venta, 'fk_id_pedido'),
+)
+
+def _v10_borrado_en_cascada(conn: Connection) -> None:
+    # SQLite no permite cambiar una clave foránea sin recrear la tabla; app/mantenimiento.py
+    # borra igual de las hojas a la raíz, así que ahí no hace falta
+    if conn.dialect.name != 'postgresql':
+        return
+    inspector = inspect(conn)
+    for modelo, columna in _CASCADAS:
+        tabla = modelo.__tablename__
+        destino = next(iter(modelo.__table__.c[columna].foreign_keys)).column
+        for fk in inspector.get_foreign_keys(tabla):
+            if fk['constrained_columns'] != [columna]:
+                continue
+            if (fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE':
+                continue
+            nombre = fk['name']
+            conn.execute(text(
+                f'ALTER TABLE {tabla} DROP CONSTRAINT {nombre}, ADD CONSTRAINT {nombre} FOREIGN KEY ({columna})'
+                f' REFERENCES {destino.table.name} ({destino.name}) ON DELETE CASCADE'
+            ))
+
+def _v11_estado_carrito(conn: Connection) -> None:
+    _agregar_columna(conn, models.CarritoCompra, 'estado', "VARCHAR(12) NOT NULL DEFAULT 'abierto'")
+    _agregar_columna(conn, models.CarritoCompra, 'actualizado_en', 'TIMESTAMP')
+    # Hasta ahora el carrito activo era el de mayor ID del cliente: los que tienen pedido quedan
+    # cerrados, los demás sin pedido quedan abandonados, y quien no tenga uno abierto recibe uno
+    conn.execute(text(
+        "UPDATE carrito_compra SET estado = 'pedido' WHERE EXISTS ("
+        " SELECT 1 FROM pedido WHERE pedido.fk_id_carrito_compra = carrito_compra.pk_id_carrito_compra)"
+    ))
+    conn.execute(text(
+        "UPDATE carrito_compra SET estado = 'abandonado' WHERE estado = 'abierto'"
+        " AND pk_id_carrito_compra < ("
+        " SELECT MAX(c2.pk_id_carrito_compra) FROM carrito_compra c2 WHERE c2.fk_id_cliente = carrito_compra.fk_id_cliente)"
+    ))
+    conn.execute(text('UPDATE carrito_compra SET actualizado_en = CURRENT_TIMESTAMP WHERE actualizado_en IS NULL'))
+    conn.execute(text(
+        "INSERT INTO carrito_compra (fk_id_cliente, estado, actualizado_en)"
+        " SELECT pk_id_cliente, 'abierto', CURRENT_TIMESTAMP FROM cliente WHERE NOT EXISTS ("
+        " SELECT 1 FROM carrito_compra c WHERE c.fk_id_cliente = cliente.pk_id_cliente AND c.estado = 'abierto')"
+    ))
+    _crear_indices(conn, models.CarritoCompra, 'uq_carrito_abierto_cliente')
+
+MIGRACIONES: list[Migracion] = [
+    Migracion(1, 'Esquema inicial', _v1_esquema_inicial),
+    Migracion(2, 'Índices en correo, carrito por cliente y claves foráneas', _v2_indices_busqueda),
+    Migracion(3, 'Restricción única carrito-producto para el upsert', _v3_unico_carrito_producto),
+    Migracion(4, 'Fecha de creación en pedido y venta', _v4_fechas_pedido_venta),
+    Migracion(5, 'Índice GIN de texto completo en producto (PostgreSQL)', _v5_busqueda_productos),
+    Migracion(6, 'Tablas de acumulados de ventas para analítica', _v6_analitica_ventas),
+    Migracion(7, 'Tabla de tareas en segundo plano (outbox)', _v7_cola_tareas),
+    Migracion(8, 'Columna de stock en producto', _v8_stock_producto),
+    Migracion(9, 'SKU único en producto para la importación masiva', _v9_sku_producto),
+    Migracion(10, 'Borrado en cascada de carritos, pedidos y ventas (PostgreSQL)', _v10_borrado_en_cascada),
+    Migracion(11, 'Estado del carrito y un solo carrito abierto por cliente', _v11_estado_carrito),
+]
+
+# Ejecución
+
+def version_actual(conn: Connection) -> int:
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(func.coalesce(func.max(schema_version.c.version), 0))).scalar_one()
+
+def pendientes(engine: Engine) -> list[Migracion]:
+    with engine.connect() as conn:
+        actual = version_actual(conn)
+    return [m for m in MIGRACIONES if m.version > actual]
+
+def migrar(engine: Engine, hasta: Optional[int] = None) -> list[Migracion]:
+    """Aplica en orden las migraciones pendientes, cada una en su propia transacción"""
+    with engine.begin() as conn:
+        schema_version.create(conn, checkfirst=True)
+    aplicadas = []
+    for migracion in pendientes(engine):
+        if hasta is not None and migracion.version > hasta:
+            break
+        with engine.begin() as conn:
+            migracion.aplicar(conn)
+            conn.execute(insert(schema_version).values(
+                version=migracion.version, descripcion=migracion.descripcion
+            ))
+        aplicadas.append(migracion)
+    return aplicadas
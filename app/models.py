@@ -1,6 +1,10 @@
-from sqlalchemy import Column, Integer, String, Date, Numeric, ForeignKey, UniqueConstraint, Boolean
+import re
+
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Numeric, ForeignKey, UniqueConstraint, Boolean, Index, func, text
+from sqlalchemy.dialects import postgresql  # noqa: F401  registra to_tsvector/ts_rank tipados
 from sqlalchemy.orm import relationship
 from .database import Base
+from .config import BUSQUEDA_TS_CONFIG
 
 class Cliente(Base):
     __tablename__ = 'cliente'
@@ -12,11 +16,11 @@ class Cliente(Base):
     segundo_apellido = Column(String(30))
     fecha_nac = Column(Date, nullable=False)
     cedula = Column(String(15), nullable=False)
-    correo = Column(String(50), nullable=False)
+    correo = Column(String(50), nullable=False, unique=True, index=True)
     contrasena = Column('contraseña', String(100), nullable=False)
     es_administrador = Column(Boolean, nullable=False, default=False)
 
-    carrito = relationship('CarritoCompra', back_populates='cliente', uselist=False)
+    carrito = relationship('CarritoCompra', back_populates='cliente', uselist=False, passive_deletes=True)
 
 class Producto(Base):
     __tablename__ = 'producto'
@@ -26,18 +30,53 @@ class Producto(Base):
     nombre = Column(String(100), nullable=False)
     marca = Column(String(50))
     descripcion = Column(String(300))
+    stock = Column(Integer)  # unidades disponibles; NULL = sin control de inventario
+    sku = Column(String(50))  # código del proveedor; clave natural de la importación masiva
 
     categorias = relationship('ProductoCategoria', back_populates='producto')
 
+# Único entre los productos que lo tienen (varios NULL permitidos); lo usa el ON CONFLICT de app/importacion.py
+Index('uq_producto_sku', Producto.sku, unique=True)
+
+# Va como literal en el SQL: solo se acepta un nombre simple de configuración
+if not re.fullmatch(r'[a-z_]+', BUSQUEDA_TS_CONFIG):
+    raise ValueError(f'BUSQUEDA_TS_CONFIG inválida: {BUSQUEDA_TS_CONFIG!r} (solo letras minúsculas y _)')
+
+def ts_config():
+    # Literal (no parámetro) para que el planificador reconozca la expresión del índice
+    return text(f"'{BUSQUEDA_TS_CONFIG}'::regconfig")
+
+def vector_busqueda_producto():
+    """tsvector ponderado: nombre (A) > marca (B) > descripción (C). Las consultas deben usar esta misma expresión para aprovechar el índice"""
+    cfg, vacio = ts_config(), text("''")
+    return (
+        func.setweight(func.to_tsvector(cfg, func.coalesce(Producto.nombre, vacio)), text("'A'"))
+        .op('||')(func.setweight(func.to_tsvector(cfg, func.coalesce(Producto.marca, vacio)), text("'B'")))
+        .op('||')(func.setweight(func.to_tsvector(cfg, func.coalesce(Producto.descripcion, vacio)), text("'C'")))
+    )
+
+# Búsqueda de texto completo (solo PostgreSQL; ver app/busqueda.py)
+Index('ix_producto_busqueda', vector_busqueda_producto(), postgresql_using='gin').ddl_if(dialect='postgresql')
+
 class CarritoCompra(Base):
     __tablename__ = 'carrito_compra'
 
     pk_id_carrito_compra = Column(Integer, primary_key=True, index=True)
-    fk_id_cliente = Column(Integer, ForeignKey('cliente.pk_id_cliente'), nullable=False)
+    fk_id_cliente = Column(Integer, ForeignKey('cliente.pk_id_cliente', ondelete='CASCADE'), nullable=False)
+    estado = Column(String(12), nullable=False, default='abierto', server_default='abierto')  # abierto, pedido, abandonado
+    actualizado_en = Column(DateTime, default=func.now())  # último cambio en sus líneas (barrido de abandonados)
 
     cliente = relationship('Cliente', back_populates='carrito')
-    productos = relationship('CarritoProducto', back_populates='carrito', cascade='all, delete-orphan')
-    pedidos = relationship('Pedido', back_populates='carrito')
+    productos = relationship('CarritoProducto', back_populates='carrito', cascade='all, delete-orphan', passive_deletes=True)
+    pedidos = relationship('Pedido', back_populates='carrito', passive_deletes=True)
+
+# Historial de carritos por cliente (obtener_carritos_cliente)
+Index('ix_carrito_compra_cliente_reciente', CarritoCompra.fk_id_cliente, CarritoCompra.pk_id_carrito_compra.desc())
+# Un solo carrito abierto por cliente; también es el índice de obtener_carrito_cliente
+Index(
+    'uq_carrito_abierto_cliente', CarritoCompra.fk_id_cliente, unique=True,
+    postgresql_where=CarritoCompra.estado == 'abierto', sqlite_where=CarritoCompra.estado == 'abierto',
+)
 
 class Envio(Base):
     __tablename__ = 'envio'
@@ -52,20 +91,24 @@ class Pedido(Base):
     __tablename__ = 'pedido'
 
     pk_id_pedido = Column(Integer, primary_key=True, index=True)
-    fk_id_carrito_compra = Column(Integer, ForeignKey('carrito_compra.pk_id_carrito_compra'), nullable=False)
-    fk_id_envio = Column(Integer, ForeignKey('envio.pk_id_envio'), nullable=False)
+    fk_id_carrito_compra = Column(
+        Integer, ForeignKey('carrito_compra.pk_id_carrito_compra', ondelete='CASCADE'), nullable=False, index=True
+    )
+    fk_id_envio = Column(Integer, ForeignKey('envio.pk_id_envio'), nullable=False, index=True)
+    fecha_pedido = Column(DateTime, default=func.now(), index=True)
 
     carrito = relationship('CarritoCompra', back_populates='pedidos')
     envio = relationship('Envio', back_populates='pedidos')
-    venta = relationship('Venta', back_populates='pedido', uselist=False)
+    venta = relationship('Venta', back_populates='pedido', uselist=False, passive_deletes=True)
 
 class Venta(Base):
     __tablename__ = 'venta'
 
     pk_id_venta = Column(Integer, primary_key=True, index=True)
-    fk_id_pedido = Column(Integer, ForeignKey('pedido.pk_id_pedido'), nullable=False)
+    fk_id_pedido = Column(Integer, ForeignKey('pedido.pk_id_pedido', ondelete='CASCADE'), nullable=False, index=True)
     metodo_pago = Column(String(30), nullable=False)
     total = Column(Numeric(10,2), nullable=False)
+    fecha_venta = Column(DateTime, default=func.now(), index=True)
 
     pedido = relationship('Pedido', back_populates='venta')
 
@@ -73,8 +116,10 @@ class CarritoProducto(Base):
     __tablename__ = 'carrito_producto'
 
     pk_id_carrito_producto = Column(Integer, primary_key=True, index=True)
-    fk_id_carrito_compra = Column(Integer, ForeignKey('carrito_compra.pk_id_carrito_compra'), nullable=False)
-    fk_id_producto = Column(Integer, ForeignKey('producto.pk_id_producto'), nullable=False)
+    fk_id_carrito_compra = Column(
+        Integer, ForeignKey('carrito_compra.pk_id_carrito_compra', ondelete='CASCADE'), nullable=False
+    )
+    fk_id_producto = Column(Integer, ForeignKey('producto.pk_id_producto'), nullable=False, index=True)
     cantidad = Column(Integer, nullable=False)
 
     carrito = relationship('CarritoCompra', back_populates='productos')
@@ -95,8 +140,60 @@ class ProductoCategoria(Base):
     __tablename__ = 'producto_categoria'
 
     pk_id_producto_categoria = Column(Integer, primary_key=True, index=True)
-    fk_id_producto = Column(Integer, ForeignKey('producto.pk_id_producto'), nullable=False)
-    fk_id_categoria = Column(Integer, ForeignKey('categoria.pk_id_categoria'), nullable=False)
+    fk_id_producto = Column(Integer, ForeignKey('producto.pk_id_producto'), nullable=False, index=True)
+    fk_id_categoria = Column(Integer, ForeignKey('categoria.pk_id_categoria'), nullable=False, index=True)
 
     producto = relationship('Producto', back_populates='categorias')
     categoria = relationship('Categoria', back_populates='productos')
+
+# Analítica: acumulados de ventas mantenidos incrementalmente (ver app/analitica.py).
+# Sin claves foráneas a propósito: son tablas derivadas que se pueden reconstruir.
+
+class VentaDiaria(Base):
+    __tablename__ = 'analitica_venta_diaria'
+
+    dia = Column(Date, primary_key=True)
+    ventas = Column(Integer, nullable=False, default=0)
+    unidades = Column(Integer, nullable=False, default=0)
+    ingresos = Column(Numeric(14,2), nullable=False, default=0)
+
+class VentaPorProducto(Base):
+    __tablename__ = 'analitica_venta_producto'
+
+    fk_id_producto = Column(Integer, primary_key=True)
+    ventas = Column(Integer, nullable=False, default=0)
+    unidades = Column(Integer, nullable=False, default=0)
+    ingresos = Column(Numeric(14,2), nullable=False, default=0, index=True)
+
+class VentaPorCategoria(Base):
+    __tablename__ = 'analitica_venta_categoria'
+
+    fk_id_categoria = Column(Integer, primary_key=True)
+    ventas = Column(Integer, nullable=False, default=0)
+    unidades = Column(Integer, nullable=False, default=0)
+    ingresos = Column(Numeric(14,2), nullable=False, default=0)
+
+class VentaPorEnvio(Base):
+    __tablename__ = 'analitica_venta_envio'
+
+    fk_id_envio = Column(Integer, primary_key=True)
+    ventas = Column(Integer, nullable=False, default=0)
+    ingresos = Column(Numeric(14,2), nullable=False, default=0)
+
+# Cola de tareas en segundo plano (outbox; ver app/tareas.py)
+
+class Tarea(Base):
+    __tablename__ = 'tarea'
+
+    pk_id_tarea = Column(Integer, primary_key=True)
+    tipo = Column(String(50), nullable=False)
+    carga = Column(Text, nullable=False)  # JSON con los argumentos del manejador
+    estado = Column(String(12), nullable=False, default='pendiente')  # pendiente, en_curso, hecha, fallida
+    intentos = Column(Integer, nullable=False, default=0)
+    disponible_en = Column(DateTime, nullable=False)  # próximo intento o fin del arriendo si está en curso
+    creada_en = Column(DateTime, nullable=False)
+    ultimo_error = Column(String(500))
+
+    __table_args__ = (
+        Index('ix_tarea_estado_disponible', 'estado', 'disponible_en'),
+    )
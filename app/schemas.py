@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field
-from datetime import date
-from typing import Optional, List
+from pydantic import AliasPath, BaseModel, EmailStr, Field, field_validator, model_validator
+from datetime import date, datetime
+from typing import Annotated, Optional, List, Literal
 
 class ClienteCreate(BaseModel):
     primer_nombre: str
@@ -34,6 +34,38 @@ class ProductoCreate(BaseModel):
     nombre: str
     marca: Optional[str] = None
     descripcion: Optional[str] = None
+    stock: Optional[int] = Field(default=None, ge=0)  # None: sin control de inventario
+
+class ProductoImportacion(ProductoCreate):
+    """Fila de la importación masiva; `sku` identifica al producto entre importaciones"""
+    sku: str = Field(min_length=1, max_length=50)
+    precio: float = Field(ge=0, lt=1_000_000)
+    nombre: str = Field(min_length=1, max_length=100)
+    marca: Optional[str] = Field(default=None, max_length=50)
+    descripcion: Optional[str] = Field(default=None, max_length=300)
+    categorias: List[Annotated[str, Field(min_length=1, max_length=100)]] = []  # descripciones
+
+    @field_validator('categorias', mode='before')
+    @classmethod
+    def _separar_categorias(cls, valor):
+        # En CSV llegan en una sola celda separadas por "|"
+        if valor is None:
+            return []
+        if isinstance(valor, str):
+            return [c.strip() for c in valor.split('|') if c.strip()]
+        return valor
+
+class ErrorImportacion(BaseModel):
+    linea: int
+    error: str
+
+class ResultadoImportacion(BaseModel):
+    filas: int = 0
+    insertados: int = 0
+    actualizados: int = 0
+    categorias_creadas: int = 0
+    con_error: int = 0
+    errores: List[ErrorImportacion] = []  # las primeras IMPORT_MAX_ERRORES
 
 class ProductoOut(BaseModel):
     pk_id_producto: int
@@ -45,9 +77,43 @@ class ProductoOut(BaseModel):
     class Config:
         from_attributes = True
 
+class ProductoStock(BaseModel):
+    pk_id_producto: int
+    stock: Optional[int]
+
+    class Config:
+        from_attributes = True
+
+class StockAjuste(BaseModel):
+    """Fijar `stock` (null deja de controlarlo) o sumar `ajuste` (negativo descuenta) de forma atómica"""
+    stock: Optional[int] = Field(default=None, ge=0)
+    ajuste: Optional[int] = None
+
+    @model_validator(mode='after')
+    def _uno_solo(self):
+        if len(self.model_fields_set & {'stock', 'ajuste'}) != 1:
+            raise ValueError("Indique solo uno de 'stock' o 'ajuste'")
+        if 'ajuste' in self.model_fields_set and self.ajuste is None:
+            raise ValueError("'ajuste' no puede ser null")
+        return self
+
+class ProductoPagina(BaseModel):
+    items: List[ProductoOut]
+    next_cursor: Optional[int] = None
+    limit: int
+
+class ProductoBusqueda(ProductoOut):
+    rank: float
+
+class ProductoBusquedaPagina(BaseModel):
+    items: List[ProductoBusqueda]
+    next_offset: Optional[int] = None
+    limit: int
+
 class CarritoOut(BaseModel):
     pk_id_carrito_compra: int
     fk_id_cliente: int
+    estado: str
     class Config:
         from_attributes = True
 
@@ -75,6 +141,24 @@ class CarritoResumen(BaseModel):
     class Config:
         from_attributes = True
 
+class CarritoOperacion(BaseModel):
+    op: Literal['add', 'set', 'remove']
+    fk_id_producto: int
+    cantidad: Optional[int] = Field(default=None, gt=0)
+
+    @model_validator(mode='after')
+    def _cantidad_requerida(self):
+        if self.op != 'remove' and self.cantidad is None:
+            raise ValueError(f"La operación '{self.op}' requiere cantidad")
+        return self
+
+class CarritoOperaciones(BaseModel):
+    operaciones: List[CarritoOperacion] = Field(min_length=1)
+
+class CarritoActualizado(BaseModel):
+    items: List[CarritoProductoOut]
+    resumen: CarritoResumen
+
 class EnvioCreate(BaseModel):
     tipo_envio: str
     costo_envio: float
@@ -91,10 +175,15 @@ class PedidoCreate(BaseModel):
     fk_id_carrito_compra: int
     fk_id_envio: int
 
+class PedidoTotal(BaseModel):
+    pedido_id: int
+    total: float
+
 class PedidoOut(BaseModel):
     pk_id_pedido: int
     fk_id_carrito_compra: int
     fk_id_envio: int
+    fecha_pedido: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -104,6 +193,7 @@ class VentaOut(BaseModel):
     fk_id_pedido: int
     metodo_pago: str
     total: float
+    fecha_venta: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -143,6 +233,64 @@ class VentaOut(BaseModel):
     fk_id_pedido: int
     metodo_pago: str
     total: float
+    fecha_venta: Optional[datetime] = None
 
     class Config:
         from_attributes = True
+
+class PedidoDetalle(PedidoOut):
+    """Pedido con envío, venta (si ya se pagó) y las líneas de su carrito con el producto"""
+    envio: EnvioOut
+    venta: Optional[VentaOut] = None
+    items: List[CarritoProductoOut] = Field(validation_alias=AliasPath('carrito', 'productos'))
+
+class PedidoDetallePagina(BaseModel):
+    items: List[PedidoDetalle]
+    next_cursor: Optional[int] = None
+    limit: int
+
+# Checkout
+
+class CheckoutCreate(BaseModel):
+    fk_id_envio: int
+    metodo_pago: str = Field('Pendiente', min_length=1, max_length=30)
+
+class CheckoutOut(BaseModel):
+    pedido: PedidoOut
+    venta: VentaOut
+    carrito_nuevo: CarritoOut
+    total_items: int
+    subtotal: float
+    costo_envio: float
+    total: float
+
+# Analítica (solo admin)
+
+class VentasDia(BaseModel):
+    dia: date
+    ventas: int
+    unidades: int
+    ingresos: float
+    class Config:
+        from_attributes = True
+
+class VentasProducto(BaseModel):
+    fk_id_producto: int
+    nombre: Optional[str] = None
+    marca: Optional[str] = None
+    ventas: int
+    unidades: int
+    ingresos: float
+
+class VentasCategoria(BaseModel):
+    fk_id_categoria: int
+    descripcion: Optional[str] = None
+    ventas: int
+    unidades: int
+    ingresos: float
+
+class VentasEnvio(BaseModel):
+    fk_id_envio: int
+    tipo_envio: Optional[str] = None
+    ventas: int
+    ingresos: float
@@ -0,0 +1,63 @@
+"""Serialización rápida de listados: filas de columnas → JSON con orjson, sin modelos Pydantic.
+
+Los listados seleccionan solo las columnas de su esquema de salida (`columnas`) y el
+controlador devuelve `RespuestaJSON(filas_a_json(filas))`. Al devolver una Response, FastAPI
+no valida cada fila contra el `response_model` (que se mantiene para la documentación): los
+datos vienen de la base y ya cumplen el esquema. La salida es la misma que la de Pydantic
+(Numeric → número, fechas ISO 8601).
+"""
+
+from decimal import Decimal
+from typing import Any, Iterable, Optional
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+def _por_defecto(valor: Any):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f'Tipo no serializable: {type(valor).__name__}')
+
+def columnas(modelo, esquema: type[BaseModel]) -> list:
+    """Columnas del modelo ORM que corresponden a los campos del esquema, en su orden"""
+    tabla = modelo.__table__.c
+    return [getattr(modelo, campo) for campo in esquema.model_fields if campo in tabla]
+
+def a_json(datos: Any) -> bytes:
+    return orjson.dumps(datos, default=_por_defecto)
+
+def filas_a_dicts(filas: Iterable, anidar: Optional[tuple[str, int]] = None) -> list[dict]:
+    """Filas (Row de SQLAlchemy) como diccionarios con los nombres de sus columnas.
+
+    `anidar=(clave, desde)` agrupa las columnas a partir de la posición `desde` en un objeto
+    bajo `clave` (null si todas son nulas, como en un outer join sin coincidencia).
+    """
+    filas = list(filas)
+    if not filas:
+        return []
+    claves = filas[0]._fields
+    if anidar is None:
+        datos = [dict(zip(claves, fila)) for fila in filas]
+    else:
+        clave, desde = anidar
+        propias, anidadas = claves[:desde], claves[desde:]
+        datos = []
+        for fila in filas:
+            objeto = dict(zip(propias, fila[:desde]))
+            valores = fila[desde:]
+            objeto[clave] = dict(zip(anidadas, valores)) if any(v is not None for v in valores) else None
+            datos.append(objeto)
+    return datos
+
+def filas_a_json(filas: Iterable, anidar: Optional[tuple[str, int]] = None) -> bytes:
+    return a_json(filas_a_dicts(filas, anidar))
+
+class RespuestaJSON(Response):
+    """JSON con orjson; acepta bytes ya serializados (filas_a_json) o datos serializables"""
+    media_type = 'application/json'
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return a_json(content)
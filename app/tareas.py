@@ -0,0 +1,302 @@
+"""Cola de tareas en segundo plano respaldada por la tabla `tarea` (patrón outbox).
+
+`encolar` agrega la tarea en la transacción de quien llama: se guarda solo si la operación
+principal se confirma y no se pierde si el proceso se reinicia. El procesador de cada worker
+reclama lotes con un arriendo (`TAREAS_ARRIENDO_SEGUNDOS`), de modo que varios procesos no
+ejecutan la misma tarea y una tarea abandonada por un proceso caído vuelve a intentarse.
+
+Cada manejador corre en su propia sesión y la tarea se marca como hecha en esa misma
+transacción: si el manejador falla no queda nada a medias, y se reintenta con backoff
+exponencial hasta `TAREAS_MAX_INTENTOS`. Marcarla exige seguir teniendo el arriendo (estado
+`en_curso` con el mismo número de intento): si venció y otro proceso la reclamó, la
+transacción se revierte y los efectos del manejador se descartan.
+
+Las tareas hechas se borran pasadas `TAREAS_RETENCION_HORAS` (`purga_tareas`), de modo que la
+tabla no crece con el historial de ventas.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from app import analitica, models
+from app.config import (
+    MANTENIMIENTO_LOTE, TAREAS_ARRIENDO_SEGUNDOS, TAREAS_BACKOFF_MAX_SEGUNDOS, TAREAS_BACKOFF_SEGUNDOS,
+    TAREAS_CONCURRENCIA, TAREAS_INTERVALO_SEGUNDOS, TAREAS_LOTE, TAREAS_MAX_INTENTOS, TAREAS_PURGA_MINUTOS,
+    TAREAS_RETENCION_HORAS,
+)
+from app.database import con_sesion
+from app.metricas import Histograma
+
+logger = logging.getLogger("uvicorn.error")
+
+T = models.Tarea
+_manejadores: dict[str, Callable[..., None]] = {}
+
+def registrar(tipo: str, fn: Callable[..., None]) -> None:
+    """Registrar el manejador de un tipo de tarea: fn(db, **carga), sin commit"""
+    _manejadores[tipo] = fn
+
+def encolar(db: Session, tipo: str, **carga) -> None:
+    """Agregar una tarea en la transacción actual (se confirma o descarta junto con ella)"""
+    if tipo not in _manejadores:
+        raise ValueError(f'Tarea desconocida: {tipo}')
+    ahora = datetime.utcnow()
+    db.add(models.Tarea(
+        tipo=tipo, carga=json.dumps(carga), estado='pendiente', intentos=0, disponible_en=ahora, creada_en=ahora,
+    ))
+    db.info['tareas_encoladas'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _despertar_tras_commit(sesion: Session) -> None:
+    if sesion.info.pop('tareas_encoladas', False):
+        procesador_tareas.despertar()
+
+# Operaciones sobre la tabla (reciben una Session, como app.crud)
+
+def reclamar(db: Session, limite: int) -> list[tuple]:
+    """Tomar hasta `limite` tareas vencidas (pendientes o con el arriendo expirado) y arrendarlas"""
+    ahora = datetime.utcnow()
+    vencidas = (T.estado.in_(('pendiente', 'en_curso')), T.disponible_en <= ahora)
+    candidatas = select(T.pk_id_tarea).where(*vencidas).order_by(T.disponible_en).limit(limite).with_for_update(
+        skip_locked=True
+    )
+    # La condición se repite en el UPDATE: si otro proceso ganó la fila, aquí no se actualiza
+    stmt = update(T).where(T.pk_id_tarea.in_(candidatas), *vencidas).values(
+        estado='en_curso', intentos=T.intentos + 1, disponible_en=ahora + timedelta(seconds=TAREAS_ARRIENDO_SEGUNDOS),
+    ).returning(T.pk_id_tarea, T.tipo, T.carga, T.intentos)
+    filas = [tuple(f) for f in db.execute(stmt, execution_options={'synchronize_session': False})]
+    db.commit()
+    return filas
+
+def _arrendada(pk_id_tarea: int, intentos: int) -> tuple:
+    """La tarea sigue arrendada por quien la reclamó en el intento `intentos`"""
+    return T.pk_id_tarea == pk_id_tarea, T.estado == 'en_curso', T.intentos == intentos
+
+def ejecutar_tarea(db: Session, pk_id_tarea: int, tipo: str, carga: str, intentos: int) -> bool:
+    """Correr el manejador y marcar la tarea como hecha; False (y nada confirmado) si se perdió el arriendo"""
+    _manejadores[tipo](db, **json.loads(carga))
+    marcada = db.execute(
+        update(T).where(*_arrendada(pk_id_tarea, intentos)).values(estado='hecha', ultimo_error=None),
+        execution_options={'synchronize_session': False},
+    ).rowcount
+    if not marcada:
+        db.rollback()
+        return False
+    db.commit()
+    return True
+
+def registrar_fallo(db: Session, pk_id_tarea: int, intentos: int, error: str) -> Optional[bool]:
+    """Reprogramar con backoff exponencial (con jitter) o marcar como fallida; True si se reintentará.
+
+    None si se perdió el arriendo: el estado lo lleva el intento más reciente.
+    """
+    ahora = datetime.utcnow()
+    reintentar = intentos < TAREAS_MAX_INTENTOS
+    espera = min(TAREAS_BACKOFF_MAX_SEGUNDOS, TAREAS_BACKOFF_SEGUNDOS * 2 ** (intentos - 1)) * random.uniform(0.5, 1)
+    marcada = db.execute(
+        update(T).where(*_arrendada(pk_id_tarea, intentos)).values(
+            estado='pendiente' if reintentar else 'fallida',
+            disponible_en=ahora + timedelta(seconds=espera) if reintentar else ahora,
+            ultimo_error=error[:500],
+        ),
+        execution_options={'synchronize_session': False},
+    ).rowcount
+    if not marcada:
+        db.rollback()
+        return None
+    db.commit()
+    return reintentar
+
+# Estados que cuenta `profundidad`: las hechas se purgan y se ven en los contadores del procesador
+ESTADOS_COLA = ('pendiente', 'en_curso', 'fallida')
+
+def profundidad(db: Session) -> dict[str, int]:
+    """Cantidad de tareas por estado, sin las hechas (usa el índice sobre estado)"""
+    filas = db.execute(select(T.estado, func.count()).where(T.estado.in_(ESTADOS_COLA)).group_by(T.estado)).all()
+    return {estado: 0 for estado in ESTADOS_COLA} | dict(filas)
+
+def purgar_hechas(db: Session, horas: float = TAREAS_RETENCION_HORAS, lote: int = MANTENIMIENTO_LOTE) -> dict[str, int]:
+    """Borrar en lotes las tareas hechas hace más de `horas` (cada lote en su propia transacción)"""
+    # En una tarea hecha, disponible_en es el fin del arriendo con que se ejecutó
+    limite = datetime.utcnow() - timedelta(hours=horas)
+    viejas = select(T.pk_id_tarea).where(T.estado == 'hecha', T.disponible_en < limite).limit(lote)
+    borradas = 0
+    while True:
+        n = db.execute(
+            delete(T).where(T.pk_id_tarea.in_(viejas)), execution_options={'synchronize_session': False}
+        ).rowcount
+        db.commit()
+        borradas += n
+        if n < lote:
+            return {'borradas': borradas}
+
+class ProcesadorTareas:
+    """Bucle asyncio que reclama tareas y las ejecuta con a lo sumo `concurrencia` en curso"""
+
+    def __init__(self, concurrencia: int, lote: int, intervalo: float):
+        self.concurrencia = concurrencia
+        self.lote = lote
+        self.intervalo = intervalo
+        self.ejecutadas = 0
+        self.reintentos = 0
+        self.fallidas = 0
+        self.arriendos_perdidos = 0
+        self.duracion: dict[str, Histograma] = {}
+        self._en_curso: set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._evento: Optional[asyncio.Event] = None
+        self._bucle_tarea: Optional[asyncio.Task] = None
+        self._detener = False
+        self._lock = threading.Lock()
+
+    @property
+    def activo(self) -> bool:
+        return self._bucle_tarea is not None and not self._bucle_tarea.done()
+
+    def iniciar(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._evento = asyncio.Event()
+        self._detener = False
+        self._bucle_tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self, espera: float = 10) -> None:
+        """Dejar de reclamar y esperar las tareas en curso; las que no terminen se reintentan al vencer su arriendo"""
+        if not self.activo:
+            return
+        self._detener = True
+        self._evento.set()
+        await self._bucle_tarea
+        if self._en_curso:
+            await asyncio.wait(self._en_curso, timeout=espera)
+        self._loop = None
+
+    def despertar(self) -> None:
+        """Revisar la cola ya (seguro desde cualquier hilo)"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._evento.set)
+
+    async def _bucle(self) -> None:
+        while not self._detener:
+            self._evento.clear()
+            libres = self.concurrencia - len(self._en_curso)
+            if libres > 0:
+                try:
+                    filas = await con_sesion(reclamar, min(libres, self.lote))
+                except Exception:
+                    logger.exception("No se pudieron reclamar tareas")
+                    filas = []
+                for fila in filas:
+                    tarea = asyncio.create_task(self._correr(*fila))
+                    self._en_curso.add(tarea)
+                    tarea.add_done_callback(self._en_curso.discard)
+                if filas and len(filas) == libres:
+                    continue  # probablemente quedan más; se espera a que se libere un lugar
+            try:
+                await asyncio.wait_for(self._evento.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _correr(self, pk_id_tarea: int, tipo: str, carga: str, intentos: int) -> None:
+        inicio = time.perf_counter()
+        try:
+            hecha = await con_sesion(ejecutar_tarea, pk_id_tarea, tipo, carga, intentos)
+            with self._lock:
+                if hecha:
+                    self.ejecutadas += 1
+                else:
+                    self.arriendos_perdidos += 1
+            if not hecha:
+                logger.warning("Tarea %s (%s): arriendo perdido en el intento %d; se descartan sus efectos",
+                               pk_id_tarea, tipo, intentos)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            try:
+                reintentar = await con_sesion(registrar_fallo, pk_id_tarea, intentos, error)
+            except Exception:
+                logger.exception("No se pudo registrar el fallo de la tarea %s", pk_id_tarea)
+                reintentar = True  # el arriendo vence y se reintenta
+            if reintentar is None:
+                with self._lock:
+                    self.arriendos_perdidos += 1
+                logger.warning("Tarea %s (%s) falló en el intento %d con el arriendo ya perdido: %s",
+                               pk_id_tarea, tipo, intentos, error)
+                return
+            with self._lock:
+                if reintentar:
+                    self.reintentos += 1
+                else:
+                    self.fallidas += 1
+            logger.warning(
+                "Tarea %s (%s) falló en el intento %d%s: %s",
+                pk_id_tarea, tipo, intentos, '' if reintentar else ', sin más reintentos', error,
+            )
+        finally:
+            with self._lock:
+                histograma = self.duracion.get(tipo) or self.duracion.setdefault(tipo, Histograma())
+            histograma.observar(time.perf_counter() - inicio)
+            self._evento.set()  # hay un lugar libre
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                'activo': self.activo,
+                'concurrencia': self.concurrencia,
+                'en_curso': len(self._en_curso),
+                'ejecutadas': self.ejecutadas,
+                'reintentos': self.reintentos,
+                'fallidas': self.fallidas,
+                'arriendos_perdidos': self.arriendos_perdidos,
+                'duracion_segundos': {tipo: h.como_dict() for tipo, h in self.duracion.items()},
+            }
+
+procesador_tareas = ProcesadorTareas(TAREAS_CONCURRENCIA, TAREAS_LOTE, TAREAS_INTERVALO_SEGUNDOS)
+
+class TareaPeriodica:
+    """Corre fn(db) cada `intervalo` segundos (con jitter, para no coincidir entre workers) en su propia sesión"""
+
+    def __init__(self, nombre: str, fn: Callable, intervalo: float):
+        self.nombre = nombre
+        self.fn = fn
+        self.intervalo = intervalo
+        self._tarea: Optional[asyncio.Task] = None
+
+    def iniciar(self) -> None:
+        if self.intervalo > 0:
+            self._tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self) -> None:
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+
+    async def _bucle(self) -> None:
+        while True:
+            await asyncio.sleep(self.intervalo * random.uniform(0.9, 1.1))
+            try:
+                resultado = await con_sesion(self.fn)
+            except Exception:
+                logger.exception("Falló la tarea periódica %s", self.nombre)
+                continue
+            if resultado and any(resultado.values()):
+                logger.info("%s: %s", self.nombre, resultado)
+
+purga_tareas = TareaPeriodica('purga de tareas', purgar_hechas, TAREAS_PURGA_MINUTOS * 60)
+
+# Manejadores
+
+registrar('analitica.acumular_venta', analitica.acumular_venta)
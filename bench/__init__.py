@@ -0,0 +1,4 @@
+"""Suite de benchmark de la API: siembra volúmenes reproducibles y mide escenarios de compra.
+
+Uso: `python -m bench --help`. No forma parte de la aplicación ni de las pruebas.
+"""
@@ -0,0 +1,134 @@
+"""Escenarios de compra y medición por endpoint"""
+
+import asyncio
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import httpx
+
+from bench.sembrar import CONTRASENA, correo_cliente
+
+TERMINOS_BUSQUEDA = ('camiseta', 'zapatillas roja', 'nike', 'chaqueta negra', 'adidas azul', 'bolso')
+
+@dataclass
+class Medicion:
+    segundos: float
+    consultas: int
+    status: int
+
+@dataclass
+class Medidor:
+    """Acumula las mediciones de cada petición bajo el nombre de su endpoint"""
+    por_endpoint: dict = field(default_factory=lambda: defaultdict(list))
+
+    async def pedir(self, cliente: httpx.AsyncClient, endpoint: str, metodo: str, url: str, **kwargs) -> httpx.Response:
+        inicio = time.perf_counter()
+        r = await cliente.request(metodo, url, **kwargs)
+        segundos = time.perf_counter() - inicio
+        # X-DB-Queries lo agrega el middleware de métricas de la aplicación
+        consultas = int(r.headers.get('x-db-queries', -1))
+        self.por_endpoint[endpoint].append(Medicion(segundos, consultas, r.status_code))
+        return r
+
+class ErrorEscenario(Exception):
+    pass
+
+def _exigir(r: httpx.Response, paso: str) -> dict:
+    if r.status_code >= 400:
+        raise ErrorEscenario(f'{paso}: {r.status_code} {r.text[:200]}')
+    return r.json()
+
+async def usuario_virtual(cliente: httpx.AsyncClient, medidor: Medidor, id_cliente: int, iteraciones: int,
+                          rng: random.Random, max_producto: int) -> None:
+    """Login, y por iteración: navegar el catálogo, agregar al carrito, ver resumen y comprar"""
+    m = medidor
+    token = _exigir(await m.pedir(
+        cliente, 'POST /auth/login', 'POST', '/auth/login',
+        json={'correo': correo_cliente(id_cliente), 'contrasena': CONTRASENA},
+    ), 'login')['access_token']
+    auth = {'Authorization': f'Bearer {token}'}
+    carrito_id = _exigir(await m.pedir(cliente, 'GET /carrito/me', 'GET', '/carrito/me', headers=auth), 'carrito')[
+        'pk_id_carrito_compra'
+    ]
+
+    for _ in range(iteraciones):
+        # Navegar: dos páginas del catálogo y una búsqueda
+        pagina = _exigir(await m.pedir(cliente, 'GET /productos', 'GET', '/productos', params={'limit': 20}), 'catálogo')
+        if pagina.get('next_cursor'):
+            await m.pedir(cliente, 'GET /productos', 'GET', '/productos',
+                          params={'limit': 20, 'cursor': pagina['next_cursor']})
+        await m.pedir(cliente, 'GET /productos/search', 'GET', '/productos/search',
+                      params={'q': rng.choice(TERMINOS_BUSQUEDA), 'limit': 20})
+
+        # Agregar al carrito
+        for producto in rng.sample(range(1, max_producto + 1), min(3, max_producto)):
+            _exigir(await m.pedir(
+                cliente, 'POST /carrito/{carrito_id}/productos', 'POST', f'/carrito/{carrito_id}/productos',
+                json={'fk_id_producto': producto, 'cantidad': rng.randint(1, 3)},
+            ), 'agregar')
+
+        _exigir(await m.pedir(
+            cliente, 'GET /carrito/{carrito_id}/resumen', 'GET', f'/carrito/{carrito_id}/resumen'
+        ), 'resumen')
+
+        # Comprar: pedido, venta y carrito nuevo en una transacción
+        carrito_id = _exigir(await m.pedir(
+            cliente, 'POST /checkout', 'POST', '/checkout', headers=auth,
+            json={'fk_id_envio': 1, 'metodo_pago': 'tarjeta'},
+        ), 'checkout')['carrito_nuevo']['pk_id_carrito_compra']
+
+async def ejecutar_carga(cliente: httpx.AsyncClient, usuarios: int, concurrencia: int, iteraciones: int,
+                         clientes_sembrados: int, max_producto: int, semilla: int) -> tuple[Medidor, float, list[str]]:
+    """Corre `usuarios` usuarios virtuales con a lo sumo `concurrencia` simultáneos; retorna mediciones y duración"""
+    medidor, errores = Medidor(), []
+    cola: asyncio.Queue[int] = asyncio.Queue()
+    for u in range(usuarios):
+        cola.put_nowait(u)
+
+    async def trabajador():
+        while not cola.empty():
+            u = cola.get_nowait()
+            rng = random.Random(semilla * 1_000_003 + u)
+            try:
+                await usuario_virtual(cliente, medidor, u % clientes_sembrados + 1, iteraciones, rng, max_producto)
+            except (ErrorEscenario, httpx.HTTPError) as e:
+                errores.append(f'usuario {u}: {e}')
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    return medidor, time.perf_counter() - inicio, errores
+
+def _percentil(ordenados: list[float], p: float) -> float:
+    """Percentil por rango más cercano"""
+    if not ordenados:
+        return 0.0
+    k = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[k]
+
+def _estadisticas(mediciones: list[Medicion], duracion: float) -> dict:
+    tiempos = sorted(m.segundos * 1000 for m in mediciones)
+    consultas = [m.consultas for m in mediciones if m.consultas >= 0]
+    return {
+        'peticiones': len(mediciones),
+        'errores': sum(1 for m in mediciones if m.status >= 400),
+        'rps': round(len(mediciones) / duracion, 2) if duracion else 0.0,
+        'media_ms': round(sum(tiempos) / len(tiempos), 3) if tiempos else 0.0,
+        'p50_ms': round(_percentil(tiempos, 50), 3),
+        'p95_ms': round(_percentil(tiempos, 95), 3),
+        'p99_ms': round(_percentil(tiempos, 99), 3),
+        'max_ms': round(tiempos[-1], 3) if tiempos else 0.0,
+        'consultas_media': round(sum(consultas) / len(consultas), 2) if consultas else None,
+        'consultas_max': max(consultas) if consultas else None,
+    }
+
+def resumir(medidor: Medidor, duracion: float) -> dict:
+    todas = [m for lista in medidor.por_endpoint.values() for m in lista]
+    return {
+        'duracion_s': round(duracion, 3),
+        'total': _estadisticas(todas, duracion),
+        'endpoints': {
+            nombre: _estadisticas(lista, duracion) for nombre, lista in sorted(medidor.por_endpoint.items())
+        },
+    }
@@ -0,0 +1,121 @@
+"""Siembra determinista de datos para el benchmark (inserciones masivas por tabla)"""
+
+import datetime
+import random
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import insert, text
+from sqlalchemy.engine import Engine
+
+from app import analitica, models
+from app.auth import get_password_hash
+from app.database import Base
+from app.migraciones import migrar, schema_version
+
+# Todos los clientes sembrados comparten contraseña (un único hash bcrypt)
+CONTRASENA = 'bench-secreta'
+LOTE = 1000
+
+MARCAS = ('Nike', 'Adidas', 'Puma', 'Reebok', 'Umbro', 'Fila', 'Asics', 'Joma')
+ARTICULOS = ('Camiseta', 'Zapatillas', 'Pantalón', 'Chaqueta', 'Gorra', 'Medias', 'Bolso', 'Sudadera')
+COLORES = ('roja', 'azul', 'negra', 'blanca', 'verde', 'gris')
+
+@dataclass(frozen=True)
+class Volumenes:
+    clientes: int = 200
+    productos: int = 2000
+    pedidos: int = 1000
+    lineas_por_carrito: int = 3
+    semilla: int = 42
+
+def correo_cliente(i: int) -> str:
+    return f'bench{i}@example.com'
+
+def reiniciar(engine: Engine) -> None:
+    """Borra todas las tablas de la aplicación y vuelve a aplicar las migraciones"""
+    Base.metadata.drop_all(engine)
+    schema_version.drop(engine, checkfirst=True)
+    migrar(engine)
+
+def _insertar(conn, modelo, filas: list[dict]) -> None:
+    for i in range(0, len(filas), LOTE):
+        conn.execute(insert(modelo.__table__), filas[i:i + LOTE])
+
+def _ajustar_secuencias(conn, *modelos) -> None:
+    # Los IDs se insertan explícitos; en PostgreSQL hay que adelantar las secuencias
+    if conn.dialect.name != 'postgresql':
+        return
+    for modelo in modelos:
+        tabla = modelo.__tablename__
+        pk = modelo.__table__.primary_key.columns.values()[0].name
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{tabla}', '{pk}'), COALESCE(MAX({pk}), 1)) FROM {tabla}"
+        ))
+
+def sembrar(engine: Engine, vol: Volumenes) -> dict:
+    """Inserta los volúmenes pedidos en una base recién migrada y retorna lo sembrado"""
+    rng = random.Random(vol.semilla)
+    contrasena_hash = get_password_hash(CONTRASENA)
+
+    clientes = [{
+        'pk_id_cliente': i,
+        'primer_nombre': f'Cliente{i}',
+        'primer_apellido': rng.choice(('Pérez', 'Gómez', 'Rodríguez', 'López', 'Díaz')),
+        'fecha_nac': datetime.date(1970, 1, 1) + datetime.timedelta(days=rng.randrange(15000)),
+        'cedula': str(10_000_000 + i),
+        'correo': correo_cliente(i),
+        'contraseña': contrasena_hash,
+        'es_administrador': False,
+    } for i in range(1, vol.clientes + 1)]
+
+    productos = []
+    for i in range(1, vol.productos + 1):
+        marca, articulo, color = rng.choice(MARCAS), rng.choice(ARTICULOS), rng.choice(COLORES)
+        productos.append({
+            'pk_id_producto': i,
+            'precio': round(rng.uniform(5, 300), 2),
+            'nombre': f'{articulo} {color} {i}',
+            'marca': marca,
+            'descripcion': f'{articulo} {marca} de color {color}',
+        })
+
+    # Carritos históricos (uno por pedido) y, al final, un carrito abierto por cliente
+    carritos, lineas, pedidos, ventas = [], [], [], []
+    id_linea = 0
+    for i in range(1, vol.pedidos + 1):
+        cliente = rng.randint(1, vol.clientes)
+        carritos.append({'pk_id_carrito_compra': i, 'fk_id_cliente': cliente, 'estado': 'pedido'})
+        total = 0.0
+        for producto in rng.sample(range(1, vol.productos + 1), min(vol.lineas_por_carrito, vol.productos)):
+            cantidad = rng.randint(1, 3)
+            id_linea += 1
+            lineas.append({
+                'pk_id_carrito_producto': id_linea, 'fk_id_carrito_compra': i,
+                'fk_id_producto': producto, 'cantidad': cantidad,
+            })
+            total += productos[producto - 1]['precio'] * cantidad
+        fecha = datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=rng.randrange(525600))
+        pedidos.append({'pk_id_pedido': i, 'fk_id_carrito_compra': i, 'fk_id_envio': 1, 'fecha_pedido': fecha})
+        ventas.append({
+            'pk_id_venta': i, 'fk_id_pedido': i, 'metodo_pago': rng.choice(('tarjeta', 'efectivo')),
+            'total': round(total, 2), 'fecha_venta': fecha,
+        })
+    carritos += [
+        {'pk_id_carrito_compra': vol.pedidos + c, 'fk_id_cliente': c, 'estado': 'abierto'} for c in range(1, vol.clientes + 1)
+    ]
+
+    with engine.begin() as conn:
+        _insertar(conn, models.Envio, [{'pk_id_envio': 1, 'tipo_envio': 'normal', 'costo_envio': 5}])
+        _insertar(conn, models.Cliente, clientes)
+        _insertar(conn, models.Producto, productos)
+        _insertar(conn, models.CarritoCompra, carritos)
+        _insertar(conn, models.CarritoProducto, lineas)
+        _insertar(conn, models.Pedido, pedidos)
+        _insertar(conn, models.Venta, ventas)
+        _ajustar_secuencias(
+            conn, models.Envio, models.Cliente, models.Producto, models.CarritoCompra,
+            models.CarritoProducto, models.Pedido, models.Venta,
+        )
+        # Los acumulados de analítica reflejan el historial sembrado, como tras la migración v6
+        analitica.reconstruir(conn)
+    return {**asdict(vol), 'carritos': len(carritos), 'carrito_productos': len(lineas), 'ventas': len(ventas)}
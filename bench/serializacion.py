@@ -0,0 +1,188 @@
+"""Costo por fila de los listados: ORM + Pydantic (antes) contra columnas + orjson (ahora).
+
+Por cada listado mide, sin HTTP de por medio, la consulta y la serialización completas:
+
+- antes: instancias ORM validadas contra el `response_model` con from_attributes y
+  serializadas como lo hace FastAPI (jsonable_encoder + json.dumps)
+- ahora: la función de app.crud que selecciona solo las columnas y `filas_a_json`
+
+y verifica que ambos caminos produzcan el mismo JSON.
+
+    python -m bench.serializacion --productos 20000 --repeticiones 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+def _argumentos():
+    from bench.__main__ import DB_POR_DEFECTO
+    parser = argparse.ArgumentParser(description='Costo por fila de la serialización de listados')
+    parser.add_argument('--db', default=os.getenv('BENCH_DATABASE_URL', DB_POR_DEFECTO))
+    parser.add_argument('--clientes', type=int, default=2000)
+    parser.add_argument('--productos', type=int, default=10000)
+    parser.add_argument('--pedidos', type=int, default=5000)
+    parser.add_argument('--lineas-carrito', type=int, default=500, help='Líneas del carrito medido')
+    parser.add_argument('--repeticiones', type=int, default=5, help='Se reporta la mediana')
+    parser.add_argument('--sin-sembrar', action='store_true', help='Reutilizar la base tal como está')
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto stdout)')
+    return parser.parse_args()
+
+def _casos(carrito_id: int, limite_productos: int) -> dict:
+    """Por listado: (antes(db) -> bytes, ahora(db) -> bytes)"""
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from app import crud, models, schemas
+    from app.serializacion import a_json, filas_a_dicts, filas_a_json
+
+    def como_fastapi(esquema, objetos) -> bytes:
+        validados = TypeAdapter(list[esquema]).validate_python(objetos, from_attributes=True)
+        return json.dumps(
+            jsonable_encoder(validados), ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')
+        ).encode('utf-8')
+
+    def orm(db, modelo):
+        return db.execute(select(modelo)).scalars().all()
+
+    def productos_antes(db):
+        items = db.execute(
+            select(models.Producto).order_by(models.Producto.pk_id_producto).limit(limite_productos + 1)
+        ).scalars().all()
+        next_cursor = items[limite_productos - 1].pk_id_producto if len(items) > limite_productos else None
+        pagina = schemas.ProductoPagina(items=items[:limite_productos], next_cursor=next_cursor, limit=limite_productos)
+        return pagina.model_dump_json().encode('utf-8')
+
+    def productos_ahora(db):
+        items, next_cursor = crud.listar_productos(db, limite_productos)
+        return a_json({'items': filas_a_dicts(items), 'next_cursor': next_cursor, 'limit': limite_productos})
+
+    def carrito_antes(db):
+        q = select(models.CarritoProducto).where(
+            models.CarritoProducto.fk_id_carrito_compra == carrito_id
+        ).options(selectinload(models.CarritoProducto.producto))
+        return como_fastapi(schemas.CarritoProductoOut, db.execute(q).scalars().all())
+
+    def carrito_ahora(db):
+        filas = crud.filas_carrito_productos(db, carrito_id)
+        return filas_a_json(filas, anidar=('producto', len(crud.COLUMNAS_LINEA_CARRITO)))
+
+    return {
+        'GET /clientes': (
+            lambda db: como_fastapi(schemas.ClienteOut, orm(db, models.Cliente)),
+            lambda db: filas_a_json(crud.listar_clientes(db)),
+        ),
+        'GET /productos': (productos_antes, productos_ahora),
+        'GET /pedidos': (
+            lambda db: como_fastapi(schemas.PedidoList, orm(db, models.Pedido)),
+            lambda db: filas_a_json(crud.listar_pedidos(db)),
+        ),
+        'GET /ventas': (
+            lambda db: como_fastapi(schemas.VentaList, orm(db, models.Venta)),
+            lambda db: filas_a_json(crud.listar_ventas(db)),
+        ),
+        'GET /carrito/{carrito_id}/productos': (carrito_antes, carrito_ahora),
+    }
+
+def _medir(fn, repeticiones: int) -> tuple[float, bytes]:
+    """Mediana de `repeticiones` corridas, cada una en una sesión nueva (sin identity map caliente).
+
+    La primera corrida es de calentamiento (compilación de sentencias, esquemas) y no se cuenta.
+    """
+    from app.database import SessionLocal
+    tiempos, cuerpo = [], b''
+    for _ in range(repeticiones + 1):
+        with SessionLocal() as db:
+            inicio = time.perf_counter()
+            cuerpo = fn(db)
+            tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos[1:]), cuerpo
+
+def _filas(cuerpo: bytes) -> int:
+    datos = json.loads(cuerpo)
+    return len(datos['items']) if isinstance(datos, dict) else len(datos)
+
+def _carrito_grande(engine, lineas: int) -> int:
+    """Carrito del cliente 1 con `lineas` productos distintos (reutiliza uno existente si ya está)"""
+    from sqlalchemy import func, insert, select
+    from app import models
+    cp = models.CarritoProducto
+    with engine.begin() as conn:
+        existente = conn.execute(
+            select(cp.fk_id_carrito_compra).group_by(cp.fk_id_carrito_compra)
+            .having(func.count() >= lineas).limit(1)
+        ).scalar()
+        if existente is not None:
+            return existente
+        # Abandonado: el cliente ya tiene su carrito abierto (uq_carrito_abierto_cliente)
+        carrito_id = conn.execute(
+            insert(models.CarritoCompra).values(fk_id_cliente=1, estado='abandonado')
+            .returning(models.CarritoCompra.pk_id_carrito_compra)
+        ).scalar_one()
+        productos = conn.execute(
+            select(models.Producto.pk_id_producto).order_by(models.Producto.pk_id_producto).limit(lineas)
+        ).scalars().all()
+        conn.execute(insert(cp), [
+            {'fk_id_carrito_compra': carrito_id, 'fk_id_producto': p, 'cantidad': 1} for p in productos
+        ])
+        return carrito_id
+
+def main():
+    args = _argumentos()
+    os.environ['DATABASE_URL'] = args.db
+    sys.path.insert(0, str(RAIZ))
+
+    from sqlalchemy import func, select
+    from app import models
+    from app.database import engine
+    from bench.sembrar import Volumenes, reiniciar, sembrar
+
+    if not args.sin_sembrar:
+        reiniciar(engine)
+        sembrar(engine, Volumenes(args.clientes, args.productos, args.pedidos))
+    carrito_id = _carrito_grande(engine, args.lineas_carrito)
+    with engine.connect() as conn:
+        limite_productos = conn.execute(select(func.count()).select_from(models.Producto)).scalar_one()
+
+    resultados, distintos = {}, []
+    for nombre, (antes, ahora) in _casos(carrito_id, limite_productos).items():
+        t_antes, cuerpo_antes = _medir(antes, args.repeticiones)
+        t_ahora, cuerpo_ahora = _medir(ahora, args.repeticiones)
+        if json.loads(cuerpo_antes) != json.loads(cuerpo_ahora):
+            distintos.append(nombre)
+        filas = max(_filas(cuerpo_ahora), 1)
+        resultados[nombre] = {
+            'filas': filas,
+            'antes_us_por_fila': round(t_antes / filas * 1e6, 2),
+            'ahora_us_por_fila': round(t_ahora / filas * 1e6, 2),
+            'antes_ms': round(t_antes * 1000, 2),
+            'ahora_ms': round(t_ahora * 1000, 2),
+            'aceleracion': round(t_antes / t_ahora, 2) if t_ahora else None,
+        }
+
+    texto = json.dumps({
+        'meta': {'database': args.db.split('@')[-1], 'repeticiones': args.repeticiones},
+        'listados': resultados,
+        'salida_identica': not distintos,
+    }, indent=2, ensure_ascii=False)
+    if args.salida:
+        Path(args.salida).write_text(texto + '\n', encoding='utf-8')
+    else:
+        print(texto)
+    for nombre, r in resultados.items():
+        print(f"  {nombre:40} filas={r['filas']:<6} antes={r['antes_us_por_fila']:>7.2f}µs/fila "
+              f"ahora={r['ahora_us_por_fila']:>7.2f}µs/fila x{r['aceleracion']}", file=sys.stderr)
+    if distintos:
+        print(f"❌ La salida difiere en: {', '.join(distintos)}", file=sys.stderr)
+        sys.exit(1)
+    print("✅ Misma salida JSON en ambos caminos", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
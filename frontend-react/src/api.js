@@ -7,8 +7,10 @@ async function request(path, options = {}) {
   const headers = { 'Content-Type': 'application/json', ...(options.headers || {}) };
   if (authToken) headers['Authorization'] = `Bearer ${authToken}`;
   try {
+    // credentials: la cookie de escritura reciente hace que las lecturas siguientes vean lo escrito
     const resp = await fetch(API + path, {
       headers,
+      credentials: 'include',
       ...options
     });
     let data = null;
@@ -32,11 +34,18 @@ async function request(path, options = {}) {
   }
 }
 
+function toQuery(params = {}) {
+  const qs = new URLSearchParams(Object.entries(params).filter(([, v]) => v !== undefined && v !== null && v !== ''));
+  const str = qs.toString();
+  return str ? `?${str}` : '';
+}
+
 export const api = {
   clientes: {
     list: () => request('/clientes'),
     create: (payload) => request('/clientes', { method: 'POST', body: JSON.stringify(payload) }),
     getCarritos: (clienteId) => request(`/clientes/${clienteId}/carritos`),
+    getPedidos: (clienteId, params) => request(`/clientes/${clienteId}/pedidos` + toQuery(params)),
     updateAdmin: (clienteId, esAdmin) => request(`/clientes/${clienteId}/admin`, { method: 'PATCH', body: JSON.stringify({ es_administrador: esAdmin }) })
   },
   auth: {
@@ -45,7 +54,10 @@ export const api = {
     me: () => request('/auth/me')
   },
   productos: {
-    list: () => request('/productos'),
+    page: (params) => request('/productos' + toQuery(params)),
+    list: (params) => request('/productos' + toQuery(params)).then(p => p.items),
+    search: (q, params) => request('/productos/search' + toQuery({ q, ...params })),
+    export: () => request('/productos/export'),
     create: (payload) => request('/productos', { method: 'POST', body: JSON.stringify(payload) })
   },
   carrito: {
@@ -56,6 +68,7 @@ export const api = {
     resumen: (carritoId) => request(`/carrito/${carritoId}/resumen`),
     updateItem: (itemId, cantidad) => request(`/carrito/item/${itemId}`, { method: 'PATCH', body: JSON.stringify({ cantidad }) }),
     deleteItem: (itemId) => request(`/carrito/item/${itemId}`, { method: 'DELETE' }),
+    bulk: (carritoId, operaciones) => request(`/carrito/${carritoId}/items`, { method: 'PATCH', body: JSON.stringify({ operaciones }) }),
     nuevo: () => request('/carrito/nuevo', { method: 'POST' })
   },
   envios: {
@@ -65,10 +78,14 @@ export const api = {
   pedidos: {
     list: () => request('/pedidos'),
     create: (payload) => request('/pedidos', { method: 'POST', body: JSON.stringify(payload) }),
+    get: (pedidoId) => request(`/pedidos/${pedidoId}`),
     total: (pedidoId) => request(`/pedidos/${pedidoId}/total`)
   },
   ventas: {
     list: () => request('/ventas'),
     create: (payload) => request('/ventas', { method: 'POST', body: JSON.stringify(payload) })
+  },
+  checkout: {
+    create: (payload) => request('/checkout', { method: 'POST', body: JSON.stringify(payload) })
   }
 };
@@ -30,14 +30,8 @@ export function Cart(){
       }
       setCarrito(c);
       
-      // Verificar si este carrito ya tiene un pedido asociado
-      try {
-        const allPedidos = await api.pedidos.list();
-        const pedidoExistente = allPedidos.find(p => p.fk_id_carrito_compra === c.pk_id_carrito_compra);
-        setIsLocked(!!pedidoExistente);
-      } catch (e) {
-        setIsLocked(false);
-      }
+      // Solo el carrito abierto admite cambios (los demás ya tienen pedido o se abandonaron)
+      setIsLocked(c.estado !== 'abierto');
       
       // Cargar items del carrito
       const itemsData = await api.carrito.listItems(c.pk_id_carrito_compra);
@@ -20,7 +20,7 @@ export function Diagnostic() {
         console.log('Productos:', prodData);
         
         setStatus('✅ Backend conectado');
-        setProductos(prodData);
+        setProductos(prodData.items);
       } catch (err) {
         console.error('Error:', err);
         setError(err.message);
@@ -37,58 +37,17 @@ export function Orders(){
         
         setPedidos(pedidosConTotal);
       } else {
-        // Si es cliente, solo cargar sus pedidos
-        const allPedidos = await api.pedidos.list();
-        
-        // Obtener todos los carritos del usuario (no solo el actual)
-        const todosCarritos = await api.clientes.getCarritos(user.pk_id_cliente);
-        const carritoIds = todosCarritos.map(c => c.pk_id_carrito_compra);
-        
-        // Filtrar pedidos del usuario (por sus carritos)
-        const misPedidos = allPedidos.filter(p => carritoIds.includes(p.fk_id_carrito_compra));
-        
-        // Cargar el total CONGELADO de la venta (si existe) para cada pedido
-        const ventasData = await api.ventas.list();
-        const pedidosConTotal = misPedidos.map(pedido => {
-          const venta = ventasData.find(v => v.fk_id_pedido === pedido.pk_id_pedido);
-          return {
-            ...pedido,
-            total: venta ? venta.total : 0,
-            metodo_pago: venta ? venta.metodo_pago : 'N/A'
-          };
-        });
-        
-        setPedidos(pedidosConTotal);
+        // Si es cliente, su historial ya trae envío, venta y productos de cada pedido
+        const pagina = await api.clientes.getPedidos(user.pk_id_cliente, { limit: 100 });
+        setPedidos(pagina.items.map(pedido => ({
+          ...pedido,
+          total: pedido.venta ? pedido.venta.total : 0,
+          metodo_pago: pedido.venta ? pedido.venta.metodo_pago : 'N/A'
+        })));
       }
     } catch (e) {
       console.error('Error loadOrders:', e);
-      // Si es 403 (forbidden), significa que no es admin intentando acceder endpoint admin
-      if (e.message.includes('403') || e.message.includes('Acceso denegado')) {
-        console.log('No eres administrador, intentando cargar tus pedidos...');
-        // Intentar cargar como cliente
-        try {
-          const allPedidos = await api.pedidos.list();
-          const todosCarritos = await api.clientes.getCarritos(user.pk_id_cliente);
-          const carritoIds = todosCarritos.map(c => c.pk_id_carrito_compra);
-          const misPedidos = allPedidos.filter(p => carritoIds.includes(p.fk_id_carrito_compra));
-          
-          const ventasData = await api.ventas.list();
-          const pedidosConTotal = misPedidos.map(pedido => {
-            const venta = ventasData.find(v => v.fk_id_pedido === pedido.pk_id_pedido);
-            return {
-              ...pedido,
-              total: venta ? venta.total : 0,
-              metodo_pago: venta ? venta.metodo_pago : 'N/A'
-            };
-          });
-          
-          setPedidos(pedidosConTotal);
-        } catch (e2) {
-          if (!e2.message.includes('401') && !e2.message.includes('Unauthorized')) {
-            addToast('Error cargando pedidos: ' + e2.message, 'error');
-          }
-        }
-      } else if (!e.message.includes('401') && !e.message.includes('Unauthorized')) {
+      if (!e.message.includes('401') && !e.message.includes('Unauthorized')) {
         addToast('Error cargando pedidos: ' + e.message, 'error');
       }
     } finally {
@@ -117,27 +76,6 @@ export function Orders(){
     
     setCreatingOrder(true);
     try {
-      // Obtener el carrito
-      const carrito = await api.carrito.me();
-      
-      // Verificar que el carrito tenga items
-      const items = await api.carrito.listItems(carrito.pk_id_carrito_compra);
-      if (items.length === 0) {
-        addToast('El carrito está vacío', 'error');
-        setCreatingOrder(false);
-        return;
-      }
-      
-      // Verificar si ya existe un pedido con este carrito
-      const allPedidos = await api.pedidos.list();
-      const pedidoExistente = allPedidos.find(p => p.fk_id_carrito_compra === carrito.pk_id_carrito_compra);
-      
-      if (pedidoExistente) {
-          addToast('Ya tienes un pedido activo. El carrito actual está reservado para ese pedido.', 'error');
-        setCreatingOrder(false);
-        return;
-      }
-      
       // Validar que hay envío seleccionado
       if (!selectedEnvio) {
         addToast('Debes seleccionar un tipo de envío', 'error');
@@ -145,23 +83,16 @@ export function Orders(){
         return;
       }
       
-      // Crear el pedido con envío seleccionado
-      const nuevoPedido = await api.pedidos.create({
-        fk_id_carrito_compra: carrito.pk_id_carrito_compra,
-        fk_id_envio: selectedEnvio
+      // Pedido, venta (total calculado en el servidor) y carrito nuevo en una sola transacción;
+      // el servidor rechaza el carrito vacío o ya asociado a un pedido
+      const resultado = await api.checkout.create({
+        fk_id_envio: selectedEnvio,
+        metodo_pago: 'Pendiente'
       });
       
-        // Calcular el total del pedido (esto "congela" el valor)
-        const totalData = await api.pedidos.total(nuevoPedido.pk_id_pedido);
-      
-        // Crear la venta automáticamente para registrar el total
-        await api.ventas.create({
-          fk_id_pedido: nuevoPedido.pk_id_pedido,
-          metodo_pago: 'Pendiente',
-          total: totalData.total
-        });
-      
-        addToast('¡Pedido creado exitosamente! Total: $' + totalData.total.toFixed(2), 'success');
+      addToast('¡Pedido creado exitosamente! Total: $' + resultado.total.toFixed(2), 'success');
+      // El carrito anterior quedó cerrado: notificar a otros componentes
+      window.dispatchEvent(new CustomEvent('newCartRequested'));
       
       // Recargar pedidos
       loadOrders();
@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { api } from '../api';
 import { useAuth } from '../context/AuthContext';
 import { Card } from './ui/Card';
@@ -11,17 +11,33 @@ export function ProductCatalog(){
   const [productos,setProductos]=useState([]);
   const [loading,setLoading]=useState(false);
   const [search,setSearch]=useState('');
+  // Siguiente página: next_cursor del listado o next_offset de la búsqueda (null = no hay más)
+  const [siguiente,setSiguiente]=useState(null);
+  const ultimaCarga = useRef(0);
   const [carrito,setCarrito]=useState(null);
     const [isLocked,setIsLocked]=useState(false);
   const [adding,setAdding]=useState(false);
   const toasts = useToasts();
   const { user } = useAuth();
 
-  const load=async()=>{
+  // Sin texto pagina el catálogo por cursor; con texto usa la búsqueda del servidor
+  const load=async(desde=null)=>{
+    const q = search.trim();
+    const carga = ++ultimaCarga.current;
     setLoading(true);
-    try { const data = await api.productos.list(); setProductos(data); } catch(e){ toasts.push('Error cargando productos',{type:'error'}); } finally { setLoading(false); }
+    try {
+      const data = q
+        ? await api.productos.search(q, { offset: desde ?? undefined })
+        : await api.productos.page({ cursor: desde ?? undefined });
+      if (carga !== ultimaCarga.current) return; // llegó tarde: el texto ya cambió
+      setProductos(prev => desde === null ? data.items : [...prev, ...data.items]);
+      setSiguiente(q ? data.next_offset : data.next_cursor);
+    } catch(e){ toasts.push('Error cargando productos',{type:'error'}); } finally { setLoading(false); }
   };
-  useEffect(()=>{ load(); },[]);
+  useEffect(()=>{
+    const t = setTimeout(()=>load(), search ? 300 : 0);
+    return ()=>clearTimeout(t);
+  },[search]);
 
   useEffect(()=> {
     const fetchCart = async () => {
@@ -39,15 +55,8 @@ export function ProductCatalog(){
         }
         setCarrito(c);
         
-        // Verificar si el carrito ya tiene un pedido asociado
-        try {
-          const allPedidos = await api.pedidos.list();
-          const pedidoExistente = allPedidos.find(p => p.fk_id_carrito_compra === c.pk_id_carrito_compra);
-          setIsLocked(!!pedidoExistente);
-        } catch (e) {
-          // Si falla la carga de pedidos, simplemente no bloqueamos el carrito
-          setIsLocked(false);
-        }
+        // Solo el carrito abierto admite cambios (los demás ya tienen pedido o se abandonaron)
+        setIsLocked(c.estado !== 'abierto');
       } catch(err){
         console.error('Error fetchCart:', err);
         setCarrito(null);
@@ -86,14 +95,12 @@ export function ProductCatalog(){
     } catch(e){ toasts.push('Error añadiendo',{type:'error'}); } finally { setAdding(false); }
   };
 
-  const filtered = productos.filter(p => p.nombre.toLowerCase().includes(search.toLowerCase()) || (p.marca||'').toLowerCase().includes(search.toLowerCase()));
-
   return (
     <Card title="Catálogo" actions={<input placeholder="Buscar" value={search} onChange={e=>setSearch(e.target.value)} aria-label="Buscar productos" />}>      
       {loading && <div className="loading-row"><Spinner size={26}/> <span>Cargando catálogo...</span></div>}
-      {!loading && productos.length===0 && <SkeletonList rows={6} />}
+      {!loading && productos.length===0 && (search ? <p className="meta">Sin resultados</p> : <SkeletonList rows={6} />)}
       <div className="catalog-grid">
-        {filtered.map(p => (
+        {productos.map(p => (
           <div key={p.pk_id_producto} className="product-card">
             <div className="product-card__body">
               <h4 className="product-card__title">{p.nombre}</h4>
@@ -106,6 +113,9 @@ export function ProductCatalog(){
           </div>
         ))}
       </div>
+      {siguiente !== null && siguiente !== undefined && (
+        <Button onClick={()=>load(siguiente)} disabled={loading}>Cargar más</Button>
+      )}
     </Card>
   );
 }
@@ -16,7 +16,7 @@ export function Products(){
 
   const load=async()=>{
     setLoading(true); setError(null);
-    try { const data = await api.productos.list(); setProductos(data); } catch(e){ setError(e.message); } finally { setLoading(false); }
+    try { const data = await api.productos.export(); setProductos(data); } catch(e){ setError(e.message); } finally { setLoading(false); }
   };
   useEffect(()=>{ load(); },[]);
 
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Importa o actualiza productos en lote desde un CSV o NDJSON (ver app/importacion.py)"""
+
+import argparse
+import sys
+
+from app import importacion, schemas
+from app.database import SessionLocal
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('archivo', help='Ruta del archivo, o - para leer de la entrada estándar')
+    parser.add_argument('--formato', choices=importacion.FORMATOS, help='Por defecto según la extensión')
+    args = parser.parse_args()
+
+    formato = args.formato or importacion.detectar_formato(args.archivo)
+    if formato is None:
+        parser.error('no se reconoce el formato por la extensión: use --formato csv|ndjson')
+
+    entrada = sys.stdin.buffer if args.archivo == '-' else open(args.archivo, 'rb')
+    resultado = schemas.ResultadoImportacion()
+    try:
+        with SessionLocal() as db:
+            for lote in importacion.lotes(importacion.leer_filas(entrada, formato)):
+                importacion.importar_lote(db, lote, resultado)
+                print(f"  {resultado.filas} filas procesadas...", file=sys.stderr)
+    finally:
+        if entrada is not sys.stdin.buffer:
+            entrada.close()
+
+    print(f"✅ {resultado.filas} filas: {resultado.insertados} insertados, {resultado.actualizados} actualizados, "
+          f"{resultado.categorias_creadas} categorías nuevas")
+    if resultado.con_error:
+        print(f"⚠️ {resultado.con_error} filas con error:")
+        for e in resultado.errores:
+            print(f"  línea {e.linea}: {e.error}")
+        if resultado.con_error > len(resultado.errores):
+            print(f"  ... y {resultado.con_error - len(resultado.errores)} más")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
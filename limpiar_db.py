@@ -1,55 +1,47 @@
+#!/usr/bin/env python3
+"""Borra clientes con sus carritos, pedidos y ventas, en lotes (ver app/mantenimiento.py).
+
+Por defecto elige los clientes con contraseña sin hashear; con --correo, los que coincidan
+con un patrón LIKE. Con --simular solo cuenta lo que se borraría.
 """
-Script para limpiar clientes con contraseñas sin hashear
-"""
+
+import argparse
+
+from app import mantenimiento
+from app.config import MANTENIMIENTO_LOTE
 from app.database import SessionLocal
-from app import models
-
-def limpiar_clientes():
-    db = SessionLocal()
-    try:
-        # Eliminar todos los clientes (para empezar limpio)
-        clientes = db.query(models.Cliente).all()
-        print(f"Encontrados {len(clientes)} clientes")
-        
-        for cliente in clientes:
-            # Si la contraseña no comienza con $2b$ (hash bcrypt), eliminar
-            if not cliente.contrasena.startswith('$2b$'):
-                print(f"Eliminando cliente con contraseña sin hashear: {cliente.correo}")
-                
-                # Obtener el carrito del cliente
-                carrito = db.query(models.CarritoCompra).filter(
-                    models.CarritoCompra.fk_id_cliente == cliente.pk_id_cliente
-                ).first()
-                
-                if carrito:
-                    # Eliminar pedidos asociados al carrito
-                    pedidos = db.query(models.Pedido).filter(
-                        models.Pedido.fk_id_carrito_compra == carrito.pk_id_carrito_compra
-                    ).all()
-                    for pedido in pedidos:
-                        # Eliminar ventas asociadas al pedido
-                        ventas = db.query(models.Venta).filter(
-                            models.Venta.fk_id_pedido == pedido.pk_id_pedido
-                        ).all()
-                        for venta in ventas:
-                            db.delete(venta)
-                        db.delete(pedido)
-                    
-                    # Eliminar productos del carrito
-                    db.query(models.CarritoProducto).filter(
-                        models.CarritoProducto.fk_id_carrito_compra == carrito.pk_id_carrito_compra
-                    ).delete()
-                    
-                    # Eliminar carrito
-                    db.delete(carrito)
-                
-                # Finalmente eliminar cliente
-                db.delete(cliente)
-        
-        db.commit()
-        print("✅ Limpieza completada")
-    finally:
-        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--correo', help="Patrón LIKE del correo, p. ej. 'bench%%@example.com'")
+    parser.add_argument('--simular', action='store_true', help='Solo contar las filas afectadas por tabla')
+    parser.add_argument('--lote', type=int, default=MANTENIMIENTO_LOTE, help='Clientes por transacción')
+    args = parser.parse_args()
+
+    condicion = mantenimiento.correo_como(args.correo) if args.correo else mantenimiento.sin_hash()
+    criterio = f"correo LIKE '{args.correo}'" if args.correo else 'contraseña sin hashear'
+
+    with SessionLocal() as db:
+        if args.simular:
+            conteo = mantenimiento.contar(db, condicion)
+            print(f"Simulación ({criterio}), no se borra nada:")
+            for tabla, n in conteo.items():
+                print(f"  {tabla:18} {n}")
+            return
+
+        def progreso(lotes, totales, segundos):
+            print(f"  lote {lotes}: {totales['cliente']} clientes, {totales['pedido']} pedidos, "
+                  f"{totales['venta']} ventas borrados ({segundos:.1f}s)")
+
+        print(f"Borrando clientes con {criterio} en lotes de {args.lote}...")
+        totales = mantenimiento.borrar_clientes(db, condicion, args.lote, progreso)
+
+    if not totales['cliente']:
+        print("✅ No hay clientes que borrar")
+        return
+    print("✅ Limpieza completada")
+    for tabla, n in totales.items():
+        print(f"  {tabla:18} {n}")
 
 if __name__ == "__main__":
-    limpiar_clientes()
+    main()
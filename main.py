@@ -1,20 +1,41 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 import logging
+import time
 from sqlalchemy import text
-from app.database import Base, engine, SessionLocal
-from app.controllers import clientes, productos, carritos, envios, pedidos, ventas, auth
+from app.config import SLOW_REQUEST_MS, TAREAS_HABILITADAS
+from app.database import SessionLocal, engine, async_engine, async_read_engine, read_engine
+from app import database, metricas
+from app.arranque import precalentamiento
+from app.mantenimiento import barrido_carritos
+from app.tareas import procesador_tareas, purga_tareas
+from app.controllers import clientes, productos, carritos, envios, pedidos, ventas, auth, checkout, analitica
 
 logger = logging.getLogger("uvicorn.error")
 
-# Intento de creación de tablas (opcional). Si falla la conexión, se registra advertencia y la app sigue para permitir diagnóstico.
-try:
-    Base.metadata.create_all(bind=engine)
-except Exception as e:
-    logger.warning(f"No se pudieron crear las tablas al inicio: {e}")
+# El esquema ya no se crea al importar: se aplica con `python migrar.py` (app/migraciones.py).
 
-app = FastAPI(title='API Tienda Virtual')
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    # Pool y consultas calientes en segundo plano; GET /ready responde 200 al terminar (app/arranque.py)
+    precalentamiento.iniciar()
+    # Procesador de la cola de tareas (app/tareas.py), uno por worker
+    if TAREAS_HABILITADAS:
+        procesador_tareas.iniciar()
+    # Barrido de carritos abandonados (CARRITO_BARRIDO_MINUTOS=0 lo desactiva)
+    barrido_carritos.iniciar()
+    # Borrado de tareas hechas viejas (TAREAS_PURGA_MINUTOS=0 lo desactiva)
+    purga_tareas.iniciar()
+    yield
+    await precalentamiento.detener()
+    await barrido_carritos.detener()
+    await purga_tareas.detener()
+    await procesador_tareas.detener()
+
+app = FastAPI(title='API Tienda Virtual', lifespan=ciclo_de_vida)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -30,10 +51,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Instrumentación: cada sentencia SQL se atribuye a la petición en curso
+metricas.instrumentar_engine(engine)
+if async_engine is not None:
+    metricas.instrumentar_engine(async_engine.sync_engine)
+if read_engine is not None:
+    metricas.instrumentar_engine(read_engine)
+if async_read_engine is not None:
+    metricas.instrumentar_engine(async_read_engine.sync_engine)
+
+# Escrituras exitosas: las lecturas siguientes del mismo cliente van a la primaria (app/database.py)
+if database.hay_replica():
+    @app.middleware('http')
+    async def lectura_tras_escritura(request: Request, call_next):
+        response = await call_next(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            database.marcar_escritura(response)
+        return response
+
+@app.middleware('http')
+async def medir_peticion(request: Request, call_next):
+    """Latencia, número de consultas y tiempo de base por ruta; avisa de las peticiones lentas."""
+    consultas = metricas.ConsultasRequest()
+    token = metricas.consultas_actuales.set(consultas)
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        segundos = time.perf_counter() - inicio
+        metricas.consultas_actuales.reset(token)
+        # Plantilla de la ruta (no la URL) para acotar las series; lo que no resuelve se agrupa
+        ruta = getattr(request.scope.get('route'), 'path', '<sin_ruta>')
+        metricas.registro.registrar(request.method, ruta, status, segundos, consultas)
+        if SLOW_REQUEST_MS and segundos * 1000 > SLOW_REQUEST_MS:
+            logger.warning(
+                "Petición lenta: %s %s -> %s en %.1f ms (%d consultas, %.1f ms en base)",
+                request.method, ruta, status, segundos * 1000, consultas.cantidad, consultas.segundos * 1000,
+            )
+    response.headers['Server-Timing'] = f'db;dur={consultas.segundos * 1000:.1f}, total;dur={segundos * 1000:.1f}'
+    response.headers['X-DB-Queries'] = str(consultas.cantidad)
+    return response
+
 @app.get('/health')
 def health():
     return {'status': 'ok'}
 
+@app.get('/ready')
+def ready():
+    """Disponibilidad: 503 hasta que el worker terminó de precalentar el pool y las consultas calientes."""
+    estado = precalentamiento.estadisticas()
+    return JSONResponse({'status': 'ready' if estado['listo'] else 'warming', **estado},
+                        status_code=200 if estado['listo'] else 503)
+
 @app.get('/diagnostic/db')
 def diagnostic_db():
     """Verifica conexión básica a la base de datos y retorna el URL usado (sin contraseña)."""
@@ -59,6 +130,80 @@ def diagnostic_db():
     except Exception as e:
         return {'database_url': display_url, 'connection': 'error', 'detail': str(e)}
 
+@app.get('/diagnostic/pool')
+def diagnostic_pool():
+    """Conexiones en uso, libres y de overflow del pool de este worker, más el histograma de espera de checkout."""
+    from app.database import estado_pool
+    return estado_pool()
+
+@app.get('/diagnostic/replica')
+def diagnostic_replica():
+    """Réplica de lectura: si está configurada y disponible, y cuántas lecturas fueron a cada base en este worker."""
+    return database.estado_replica()
+
+@app.get('/diagnostic/hashing')
+def diagnostic_hashing():
+    """Ocupación del pool de bcrypt (pendientes, rechazos por saturación, costo configurado)."""
+    from app.auth import pool_hashing
+    return pool_hashing.estadisticas()
+
+@app.get('/diagnostic/cache')
+def diagnostic_cache():
+    """Estadísticas de las cachés en proceso (aciertos, fallos, tamaño)."""
+    from app.cache import usuarios_cache, respuestas_cache
+    return {'usuarios': usuarios_cache.estadisticas(), 'respuestas': respuestas_cache.estadisticas()}
+
+@app.get('/diagnostic/tareas')
+def diagnostic_tareas():
+    """Tareas en segundo plano: pendientes, en curso y fallidas en la tabla y contadores del procesador de este worker."""
+    from app.tareas import profundidad
+    with SessionLocal() as db:
+        cola = profundidad(db)
+    return {'cola': cola, 'procesador': procesador_tareas.estadisticas()}
+
+@app.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Métricas en formato de texto de Prometheus (por worker)."""
+    from app.database import estado_pool
+    pool = estado_pool()
+    extras = []
+    if 'checked_out' in pool:
+        extras += metricas.gauge('db_pool_checked_out', 'Conexiones prestadas del pool.', pool['checked_out'])
+        extras += metricas.gauge('db_pool_idle', 'Conexiones libres en el pool.', pool['idle'])
+        extras += metricas.gauge('db_pool_overflow', 'Conexiones de overflow abiertas.', pool['overflow'])
+    from app.tareas import profundidad
+    with SessionLocal() as db:
+        cola = profundidad(db)
+    extras += metricas.serie('tareas_cola', 'gauge', 'Tareas sin terminar o fallidas en la tabla tarea, por estado.', [
+        ({'estado': estado}, cantidad) for estado, cantidad in cola.items()
+    ])
+    if database.hay_replica():
+        extras += metricas.serie('db_lecturas_total', 'counter', 'Sesiones de solo lectura por base usada.', [
+            ({'destino': destino}, database.lecturas[destino]) for destino in ('replica', 'primaria')
+        ])
+    arranque = precalentamiento.estadisticas()
+    extras += metricas.gauge('app_listo', 'El worker terminó el precalentamiento (1) o no (0).', int(arranque['listo']))
+    if arranque['listo']:
+        extras += metricas.gauge(
+            'app_arranque_segundos', 'Desde la importación de la app hasta estar listo.',
+            arranque['tiempos']['arranque_segundos'],
+        )
+        extras += metricas.gauge(
+            'app_precalentamiento_segundos', 'Duración del precalentamiento (pool y consultas).',
+            arranque['tiempos']['precalentamiento_segundos'],
+        )
+    tareas = procesador_tareas.estadisticas()
+    extras += metricas.gauge('tareas_en_curso', 'Tareas ejecutándose en este worker.', tareas['en_curso'])
+    extras += metricas.serie('tareas_procesadas_total', 'counter', 'Tareas terminadas en este worker por resultado.', [
+        ({'resultado': 'ok'}, tareas['ejecutadas']),
+        ({'resultado': 'reintento'}, tareas['reintentos']),
+        ({'resultado': 'fallida'}, tareas['fallidas']),
+        ({'resultado': 'arriendo_perdido'}, tareas['arriendos_perdidos']),
+    ])
+    return PlainTextResponse(
+        metricas.registro.exponer(extras), media_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
 # Registro de routers (Controladores)
 app.include_router(clientes.router)
 app.include_router(productos.router)
@@ -67,6 +212,8 @@ app.include_router(envios.router)
 app.include_router(pedidos.router)
 app.include_router(ventas.router)
 app.include_router(auth.router)
+app.include_router(checkout.router)
+app.include_router(analitica.router)
 
 # Frontend estático (comentado - frontend se sirve desde Vite)
 # app.mount('/frontend', StaticFiles(directory='frontend', html=True), name='frontend')
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Aplica las migraciones pendientes del esquema (ver app/migraciones.py)"""
+
+import argparse
+
+from app.database import engine
+from app.migraciones import MIGRACIONES, migrar, pendientes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--estado', action='store_true', help='Solo mostrar migraciones pendientes')
+    parser.add_argument('--hasta', type=int, default=None, help='Aplicar hasta esta versión (inclusive)')
+    args = parser.parse_args()
+
+    faltantes = pendientes(engine)
+    if args.estado:
+        print(f"Versión más reciente: {MIGRACIONES[-1].version}")
+        if not faltantes:
+            print("✅ Esquema al día")
+        for m in faltantes:
+            print(f"  pendiente v{m.version}: {m.descripcion}")
+        return
+
+    if not faltantes:
+        print("✅ Esquema al día, nada que aplicar")
+        return
+    for m in migrar(engine, hasta=args.hasta):
+        print(f"✅ v{m.version}: {m.descripcion}")
+
+if __name__ == "__main__":
+    main()
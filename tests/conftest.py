@@ -0,0 +1,52 @@
+"""Aplicación contra una base SQLite temporal con el esquema de migrar.py.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+# La URL se lee al importar app.config: hay que fijarla antes de importar la aplicación
+_DB = Path(tempfile.mkdtemp()) / 'tienda.db'
+os.environ['DATABASE_URL'] = f'sqlite:///{_DB}'
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from app import auth, models  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.migraciones import migrar  # noqa: E402
+
+migrar(engine)
+
+@pytest.fixture(scope='session')
+def client():
+    return TestClient(main.app)
+
+@pytest.fixture
+def db():
+    with SessionLocal() as sesion:
+        yield sesion
+
+@pytest.fixture
+def crear_cliente(client, db):
+    """Registra un cliente con su carrito abierto y retorna (id, cabeceras con su token)"""
+    def crear(correo: str, admin: bool = False) -> tuple[int, dict]:
+        cliente = models.Cliente(
+            primer_nombre='n', primer_apellido='a', fecha_nac=date(2000, 1, 1), cedula=correo,
+            correo=correo, contrasena=auth.get_password_hash('secret1'), es_administrador=admin,
+        )
+        db.add(cliente)
+        db.flush()
+        db.add(models.CarritoCompra(fk_id_cliente=cliente.pk_id_cliente))
+        db.commit()
+        token = client.post('/auth/login', json={'correo': correo, 'contrasena': 'secret1'}).json()['access_token']
+        return cliente.pk_id_cliente, {'Authorization': f'Bearer {token}'}
+    return crear
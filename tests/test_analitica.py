@@ -0,0 +1,43 @@
+from app import models, tareas
+
+RUTAS = ('/analitica/ventas/diarias', '/analitica/ventas/productos?limit=200', '/analitica/ventas/categorias', '/analitica/ventas/envios')
+
+def _procesar_tareas(db) -> None:
+    """Lo que hace el procesador de tareas de un worker, sin esperar al bucle"""
+    while filas := tareas.reclamar(db, 100):
+        for fila in filas:
+            try:
+                tareas.ejecutar_tarea(db, *fila)
+            except Exception as e:
+                db.rollback()
+                tareas.registrar_fallo(db, fila[0], fila[3], str(e))
+
+def _acumulados(client, cabeceras) -> dict:
+    return {ruta: sorted(map(str, client.get(ruta, headers=cabeceras).json())) for ruta in RUTAS}
+
+def test_acumulados_de_las_tareas_coinciden_con_reconstruir(client, db, crear_cliente):
+    _, admin = crear_cliente('analitica@x.com', admin=True)
+    _procesar_tareas(db)
+    assert client.post('/analitica/reconstruir', headers=admin).status_code == 204
+
+    categoria = models.Categoria(descripcion='analitica')
+    envio = models.Envio(tipo_envio='analitica', costo_envio=2)
+    a, b = models.Producto(nombre='a', precio=3), models.Producto(nombre='b', precio=5)
+    db.add_all([categoria, envio, a, b])
+    db.flush()
+    db.add_all([models.ProductoCategoria(fk_id_producto=p.pk_id_producto, fk_id_categoria=categoria.pk_id_categoria) for p in (a, b)])
+    db.commit()
+    for correo, lineas in (('analitica-1@x.com', ((a, 2), (b, 1))), ('analitica-2@x.com', ((a, 1),))):
+        _, cabeceras = crear_cliente(correo)
+        carrito = client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra']
+        for producto, cantidad in lineas:
+            client.post(f'/carrito/{carrito}/productos', json={'fk_id_producto': producto.pk_id_producto, 'cantidad': cantidad})
+        assert client.post('/checkout', json={'fk_id_envio': envio.pk_id_envio}, headers=cabeceras).status_code == 201
+
+    _procesar_tareas(db)
+    incrementales = _acumulados(client, admin)
+    por_envio = {f['fk_id_envio']: f for f in client.get('/analitica/ventas/envios', headers=admin).json()}
+    assert (por_envio[envio.pk_id_envio]['ventas'], por_envio[envio.pk_id_envio]['ingresos']) == (2, 18.0)
+
+    assert client.post('/analitica/reconstruir', headers=admin).status_code == 204
+    assert _acumulados(client, admin) == incrementales
@@ -0,0 +1,15 @@
+from sqlalchemy import update
+
+from app import models
+
+def test_admin_degradado_en_otro_worker_pierde_el_acceso(client, db, crear_cliente):
+    cliente_id, admin = crear_cliente('degradado@x.com', admin=True)
+    assert client.get('/pedidos', headers=admin).status_code == 200
+    assert client.get('/auth/me', headers=admin).status_code == 200  # identidad en la caché de tokens
+
+    # Cambio hecho por otro proceso: la caché de este no se invalida
+    db.execute(update(models.Cliente).where(models.Cliente.pk_id_cliente == cliente_id).values(es_administrador=False))
+    db.commit()
+
+    assert client.get('/pedidos', headers=admin).status_code == 403
+    assert client.get(f'/clientes/{cliente_id + 1000}/pedidos', headers=admin).status_code == 403
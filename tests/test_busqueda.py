@@ -0,0 +1,50 @@
+from sqlalchemy import update
+
+from app import busqueda, crud, models
+
+def _crear(db, **campos) -> int:
+    producto = models.Producto(precio=1, **campos)
+    db.add(producto)
+    db.commit()
+    return producto.pk_id_producto
+
+def test_buscar_ordena_por_relevancia_y_pagina(client, crear_cliente):
+    _, admin = crear_cliente('busca@x.com', admin=True)
+    ids = {
+        nombre: client.post('/productos', headers=admin, json=campos).json()['pk_id_producto']
+        for nombre, campos in {
+            'nombre': {'nombre': 'Zapatilla runner', 'precio': 10},
+            'marca': {'nombre': 'Gorra', 'marca': 'Runner', 'precio': 5},
+            'descripcion': {'nombre': 'Medias', 'descripcion': 'ideales para runner', 'precio': 2},
+        }.items()
+    }
+    r = client.get('/productos/search', params={'q': 'runner', 'limit': 2})
+    assert r.status_code == 200
+    pagina = r.json()
+    assert [p['pk_id_producto'] for p in pagina['items']] == [ids['nombre'], ids['marca']]
+    assert pagina['items'][0]['rank'] > pagina['items'][1]['rank']
+    siguiente = client.get('/productos/search', params={'q': 'runner', 'limit': 2, 'offset': pagina['next_offset']})
+    assert [p['pk_id_producto'] for p in siguiente.json()['items']] == [ids['descripcion']]
+    assert siguiente.json()['next_offset'] is None
+
+    assert client.get('/productos/search', params={'q': 'Zapatílla RUNNER'}).json()['items'][0]['pk_id_producto'] == ids['nombre']
+    assert client.get('/productos/search', params={'q': 'runner inexistente'}).json()['items'] == []
+    assert client.get('/productos/search', params={'q': 'r'}).status_code == 422
+
+def test_indice_ve_altas_de_otro_worker(db):
+    crud.buscar_productos(db, 'precalentado', 10)  # índice ya construido
+    # Alta hecha por otro proceso: no pasa por indice_productos.actualizar
+    pk = _crear(db, nombre='Termo precalentado')
+    resultados, _ = crud.buscar_productos(db, 'precalentado', 10)
+    assert [p.pk_id_producto for p, _ in resultados] == [pk]
+
+def test_indice_ve_ediciones_de_otro_worker_al_vencer_el_ttl(db, monkeypatch):
+    pk = _crear(db, nombre='Botella vieja')
+    crud.buscar_productos(db, 'botella', 10)
+    db.execute(update(models.Producto).where(models.Producto.pk_id_producto == pk).values(nombre='Botella nueva'))
+    db.commit()
+    assert crud.buscar_productos(db, 'nueva', 10)[0] == []  # mismo conteo y mayor ID: sigue vigente
+
+    monkeypatch.setattr(busqueda.indice_productos, 'ttl', 0.001)
+    monkeypatch.setattr(busqueda.indice_productos, '_construido_en', 0.0)
+    assert [p.pk_id_producto for p, _ in crud.buscar_productos(db, 'nueva', 10)[0]] == [pk]
@@ -0,0 +1,30 @@
+def test_etag_304_e_invalidacion_al_escribir(client, crear_cliente):
+    _, admin = crear_cliente('cache@x.com', admin=True)
+    primera = client.get('/envios')
+    etag = primera.headers['etag']
+    assert primera.status_code == 200 and etag.startswith('"')
+
+    r = client.get('/envios', headers={'If-None-Match': etag})
+    assert (r.status_code, r.content, r.headers['etag']) == (304, b'', etag)
+    assert client.get('/envios', headers={'If-None-Match': f'W/{etag}'}).status_code == 304
+    assert client.get('/envios', headers={'If-None-Match': '"otro"'}).status_code == 200
+
+    nuevo = client.post('/envios', headers=admin, json={'tipo_envio': 'cache', 'costo_envio': 1}).json()
+    r = client.get('/envios', headers={'If-None-Match': etag})
+    assert r.status_code == 200 and r.headers['etag'] != etag
+    assert nuevo['pk_id_envio'] in [e['pk_id_envio'] for e in r.json()]
+
+def test_catalogo_por_parametros_e_invalidado_al_crear_producto(client, crear_cliente):
+    _, admin = crear_cliente('cache-productos@x.com', admin=True)
+    for nombre in ('cache 1', 'cache 2'):
+        client.post('/productos', headers=admin, json={'nombre': nombre, 'precio': 1, 'marca': 'Cacheada'})
+    uno = client.get('/productos', params={'marca': 'Cacheada', 'limit': 1})
+    dos = client.get('/productos', params={'marca': 'Cacheada', 'limit': 2})
+    assert uno.headers['etag'] != dos.headers['etag']
+    assert client.get('/productos', params={'marca': 'Cacheada', 'limit': 1}).headers['etag'] == uno.headers['etag']
+
+    # Con un tercer producto la página de 2 ya no es la última: la entrada cacheada debe descartarse
+    assert dos.json()['next_cursor'] is None
+    client.post('/productos', headers=admin, json={'nombre': 'cache 3', 'precio': 1, 'marca': 'Cacheada'})
+    r = client.get('/productos', params={'marca': 'Cacheada', 'limit': 2}, headers={'If-None-Match': dos.headers['etag']})
+    assert r.status_code == 200 and r.json()['next_cursor'] is not None
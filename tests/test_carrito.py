@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+
+from app import models
+
+def test_agregar_producto_suma_y_valida_el_carrito(client, db, crear_cliente):
+    _, cabeceras = crear_cliente('carrito@x.com')
+    producto = models.Producto(nombre='p', precio=3)
+    db.add(producto)
+    db.commit()
+    carrito = client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra']
+    linea = {'fk_id_producto': producto.pk_id_producto, 'cantidad': 2}
+
+    assert client.post(f'/carrito/{carrito}/productos', json=linea).json()['cantidad'] == 2
+    assert client.post(f'/carrito/{carrito}/productos', json=linea).json()['cantidad'] == 4
+
+    r = client.post(f'/carrito/{carrito}/productos', json={'fk_id_producto': 10**6, 'cantidad': 1})
+    assert (r.status_code, r.json()['detail']) == (400, 'Producto no existe')
+    r = client.post(f'/carrito/{10**6}/productos', json=linea)
+    assert (r.status_code, r.json()['detail']) == (400, 'Carrito no existe')
+
+    client.post('/carrito/nuevo', headers=cabeceras)
+    r = client.post(f'/carrito/{carrito}/productos', json=linea)
+    assert (r.status_code, r.json()['detail']) == (400, 'El carrito ya no está abierto')
+
+def test_operaciones_en_lote_se_aplican_en_orden(client, db, crear_cliente):
+    _, cabeceras = crear_cliente('lote@x.com')
+    a, b, c = (models.Producto(nombre=n, precio=p) for n, p in (('a', 2), ('b', 5), ('c', 1)))
+    db.add_all([a, b, c])
+    db.commit()
+    carrito = client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra']
+    client.post(f'/carrito/{carrito}/productos', json={'fk_id_producto': c.pk_id_producto, 'cantidad': 3})
+
+    r = client.patch(f'/carrito/{carrito}/items', json={'operaciones': [
+        {'op': 'add', 'fk_id_producto': a.pk_id_producto, 'cantidad': 1},
+        {'op': 'add', 'fk_id_producto': a.pk_id_producto, 'cantidad': 2},
+        {'op': 'set', 'fk_id_producto': b.pk_id_producto, 'cantidad': 4},
+        {'op': 'remove', 'fk_id_producto': c.pk_id_producto},
+    ]})
+    assert r.status_code == 200, r.text
+    cuerpo = r.json()
+    assert {i['fk_id_producto']: i['cantidad'] for i in cuerpo['items']} == {a.pk_id_producto: 3, b.pk_id_producto: 4}
+    assert cuerpo['resumen'] == {'carrito_id': carrito, 'total_items': 7, 'subtotal': 26.0}
+
+def test_operaciones_en_lote_con_producto_inexistente_no_cambian_nada(client, db, crear_cliente):
+    _, cabeceras = crear_cliente('lote-invalido@x.com')
+    producto = models.Producto(nombre='p', precio=1)
+    db.add(producto)
+    db.commit()
+    carrito = client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra']
+    client.post(f'/carrito/{carrito}/productos', json={'fk_id_producto': producto.pk_id_producto, 'cantidad': 1})
+
+    r = client.patch(f'/carrito/{carrito}/items', json={'operaciones': [
+        {'op': 'set', 'fk_id_producto': producto.pk_id_producto, 'cantidad': 9},
+        {'op': 'add', 'fk_id_producto': 10**6, 'cantidad': 1},
+    ]})
+    assert (r.status_code, r.json()['detail']) == (400, f'Productos no existen: {10**6}')
+    items = client.get(f'/carrito/{carrito}/productos').json()
+    assert [(i['fk_id_producto'], i['cantidad']) for i in items] == [(producto.pk_id_producto, 1)]
+    r = client.patch(f'/carrito/{carrito}/items', json={'operaciones': [{'op': 'add', 'fk_id_producto': 1}]})
+    assert r.status_code == 422
+
+def _lineas(db, carrito: int) -> int:
+    return db.scalar(select(func.count()).select_from(models.CarritoProducto).where(models.CarritoProducto.fk_id_carrito_compra == carrito))
+
+def test_barrido_abandona_solo_carritos_viejos_con_lineas(client, db, crear_cliente):
+    _, admin = crear_cliente('barrido-admin@x.com', admin=True)
+    producto = models.Producto(nombre='p', precio=1)
+    db.add(producto)
+    db.commit()
+    carritos = {}
+    for nombre in ('viejo', 'reciente', 'vacio'):
+        _, cabeceras = crear_cliente(f'barrido-{nombre}@x.com')
+        carritos[nombre] = (client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra'], cabeceras)
+    for nombre in ('viejo', 'reciente'):
+        client.post(f'/carrito/{carritos[nombre][0]}/productos', json={'fk_id_producto': producto.pk_id_producto, 'cantidad': 1})
+    db.execute(update(models.CarritoCompra).where(
+        models.CarritoCompra.pk_id_carrito_compra.in_((carritos['viejo'][0], carritos['vacio'][0]))
+    ).values(actualizado_en=datetime(2000, 1, 1)))
+    db.commit()
+
+    assert client.post('/carrito/barrer', params={'horas': 1}, headers=carritos['viejo'][1]).status_code == 403
+    r = client.post('/carrito/barrer', params={'horas': 1}, headers=admin)
+    assert r.status_code == 200 and r.json()['abandonados'] >= 1
+
+    viejo, del_viejo = carritos['viejo']
+    db.expire_all()
+    assert db.get(models.CarritoCompra, viejo).estado == 'abandonado'
+    assert _lineas(db, viejo) == 0
+    nuevo = client.get('/carrito/me', headers=del_viejo).json()['pk_id_carrito_compra']
+    assert nuevo != viejo and _lineas(db, nuevo) == 0
+    for nombre in ('reciente', 'vacio'):
+        carrito, cabeceras = carritos[nombre]
+        assert db.get(models.CarritoCompra, carrito).estado == 'abierto'
+        assert client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra'] == carrito
+    assert _lineas(db, carritos['reciente'][0]) == 1
+
+    # Un carrito abandonado que recupera líneas se vacía en el siguiente barrido, sin darle otro carrito al cliente
+    db.add(models.CarritoProducto(fk_id_carrito_compra=viejo, fk_id_producto=producto.pk_id_producto, cantidad=1))
+    db.commit()
+    client.post('/carrito/barrer', params={'horas': 1}, headers=admin)
+    assert _lineas(db, viejo) == 0
+    assert client.get('/carrito/me', headers=del_viejo).json()['pk_id_carrito_compra'] == nuevo
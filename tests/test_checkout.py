@@ -0,0 +1,60 @@
+from sqlalchemy import func, select
+
+from app import models
+
+def _preparar(client, db, crear_cliente, correo: str, stock: int, cantidad: int):
+    """Cliente con un producto de precio 4 en el carrito; retorna (cabeceras, carrito, producto, envío)"""
+    _, cabeceras = crear_cliente(correo)
+    producto = models.Producto(nombre='checkout', precio=4, stock=stock)
+    envio = models.Envio(tipo_envio='checkout', costo_envio=3)
+    db.add_all([producto, envio])
+    db.commit()
+    carrito = client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra']
+    client.post(f'/carrito/{carrito}/productos', json={'fk_id_producto': producto.pk_id_producto, 'cantidad': cantidad})
+    return cabeceras, carrito, producto, envio
+
+def _pedidos(db, carrito: int) -> int:
+    return db.scalar(select(func.count()).select_from(models.Pedido).where(models.Pedido.fk_id_carrito_compra == carrito))
+
+def test_checkout_crea_pedido_venta_y_carrito_nuevo(client, db, crear_cliente):
+    cabeceras, carrito, producto, envio = _preparar(client, db, crear_cliente, 'checkout@x.com', stock=5, cantidad=2)
+
+    r = client.post('/checkout', json={'fk_id_envio': envio.pk_id_envio, 'metodo_pago': 'Tarjeta'}, headers=cabeceras)
+    assert r.status_code == 201, r.text
+    cuerpo = r.json()
+    assert (cuerpo['total_items'], cuerpo['subtotal'], cuerpo['costo_envio'], cuerpo['total']) == (2, 8.0, 3.0, 11.0)
+    assert cuerpo['pedido']['fk_id_carrito_compra'] == carrito
+    assert (cuerpo['venta']['fk_id_pedido'], cuerpo['venta']['total']) == (cuerpo['pedido']['pk_id_pedido'], 11.0)
+    assert cuerpo['carrito_nuevo']['pk_id_carrito_compra'] != carrito
+
+    db.expire_all()
+    assert db.get(models.Producto, producto.pk_id_producto).stock == 3
+    assert db.get(models.CarritoCompra, carrito).estado == 'pedido'
+    assert client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra'] == cuerpo['carrito_nuevo']['pk_id_carrito_compra']
+
+def test_checkout_con_carrito_vacio_es_400(client, db, crear_cliente):
+    _, cabeceras = crear_cliente('checkout-vacio@x.com')
+    envio = models.Envio(tipo_envio='checkout', costo_envio=3)
+    db.add(envio)
+    db.commit()
+    carrito = client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra']
+
+    r = client.post('/checkout', json={'fk_id_envio': envio.pk_id_envio}, headers=cabeceras)
+    assert (r.status_code, r.json()['detail']) == (400, 'El carrito está vacío')
+    assert _pedidos(db, carrito) == 0
+    assert client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra'] == carrito
+
+def test_checkout_sin_stock_no_deja_escrituras_parciales(client, db, crear_cliente):
+    cabeceras, carrito, producto, envio = _preparar(client, db, crear_cliente, 'checkout-stock@x.com', stock=1, cantidad=2)
+    ventas = db.scalar(select(func.count()).select_from(models.Venta))
+
+    r = client.post('/checkout', json={'fk_id_envio': envio.pk_id_envio}, headers=cabeceras)
+    assert (r.status_code, r.json()['detail']) == (400, f'Stock insuficiente para productos: {producto.pk_id_producto}')
+
+    db.expire_all()
+    assert db.get(models.Producto, producto.pk_id_producto).stock == 1
+    assert _pedidos(db, carrito) == 0
+    assert db.scalar(select(func.count()).select_from(models.Venta)) == ventas
+    assert db.get(models.CarritoCompra, carrito).estado == 'abierto'
+    assert [i['cantidad'] for i in client.get(f'/carrito/{carrito}/productos').json()] == [2]
+    assert client.get('/carrito/me', headers=cabeceras).json()['pk_id_carrito_compra'] == carrito
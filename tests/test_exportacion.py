@@ -0,0 +1,56 @@
+import csv
+import gzip
+import io
+import json
+
+from app import models
+
+def _pedidos(db, cliente_id: int, n: int) -> list[int]:
+    envio = models.Envio(tipo_envio='export', costo_envio=2)
+    db.add(envio)
+    db.flush()
+    pedidos = []
+    for _ in range(n):
+        carrito = models.CarritoCompra(fk_id_cliente=cliente_id, estado='pedido')
+        db.add(carrito)
+        db.flush()
+        pedidos.append(models.Pedido(fk_id_carrito_compra=carrito.pk_id_carrito_compra, fk_id_envio=envio.pk_id_envio))
+    db.add_all(pedidos)
+    db.commit()
+    return [p.pk_id_pedido for p in pedidos]
+
+def test_exportar_pedidos_csv_y_ndjson_por_lotes(client, db, crear_cliente, monkeypatch):
+    monkeypatch.setattr('app.exportacion.EXPORT_LOTE_FILAS', 2)
+    cliente_id, admin = crear_cliente('exporta@x.com', admin=True)
+    ids = _pedidos(db, cliente_id, 5)
+    rango = {'id_desde': ids[0], 'id_hasta': ids[-1]}
+
+    r = client.get('/pedidos/export', headers=admin, params={'formato': 'csv', **rango})
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('text/csv')
+    assert 'pedidos.csv' in r.headers['content-disposition']
+    filas = list(csv.DictReader(io.StringIO(r.text)))
+    assert [int(f['pk_id_pedido']) for f in filas] == ids
+    assert set(filas[0]) == {'pk_id_pedido', 'fk_id_carrito_compra', 'fk_id_envio', 'fecha_pedido'}
+
+    r = client.get('/pedidos/export', headers=admin, params={'formato': 'ndjson', **rango})
+    objetos = [json.loads(linea) for linea in r.text.splitlines()]
+    assert [o['pk_id_pedido'] for o in objetos] == ids
+    assert all(o['fecha_pedido'] for o in objetos)
+
+def test_exportar_con_gzip(client, db, crear_cliente):
+    cliente_id, admin = crear_cliente('exporta-gzip@x.com', admin=True)
+    ids = _pedidos(db, cliente_id, 3)
+    params = {'formato': 'ndjson', 'id_desde': ids[0], 'id_hasta': ids[-1]}
+    with client.stream('GET', '/pedidos/export', headers={**admin, 'Accept-Encoding': 'gzip'}, params=params) as r:
+        assert r.headers['content-encoding'] == 'gzip'
+        assert r.headers['vary'] == 'Accept-Encoding'
+        crudo = b''.join(r.iter_raw())
+    lineas = gzip.decompress(crudo).decode('utf-8').splitlines()
+    assert [json.loads(linea)['pk_id_pedido'] for linea in lineas] == ids
+
+def test_exportar_solo_admin(client, crear_cliente):
+    _, cliente = crear_cliente('exporta-no-admin@x.com')
+    assert client.get('/pedidos/export').status_code == 401
+    assert client.get('/pedidos/export', headers=cliente).status_code == 403
+    assert client.get('/ventas/export', headers=cliente).status_code == 403
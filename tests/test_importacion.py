@@ -0,0 +1,21 @@
+from app import importacion, models
+
+def test_importar_ndjson_por_lotes(client, db, crear_cliente, monkeypatch):
+    monkeypatch.setattr(importacion.lotes, '__defaults__', (2,))  # lotes de 2 filas
+    _, admin = crear_cliente('importa@x.com', admin=True)
+    archivo = b'\n'.join([
+        b'{"sku": "IMP-1", "nombre": "Uno", "precio": 1, "categorias": ["Importados"]}',
+        b'{"sku": "IMP-2", "nombre": "Dos", "precio": "x"}',
+        b'no es json',
+        b'{"sku": "IMP-1", "nombre": "Uno v2", "precio": 2, "stock": 4}',
+        b'{"sku": "IMP-3", "nombre": "Tres", "precio": 3}',
+    ])
+    r = client.post('/productos/import', headers=admin, files={'archivo': ('p.ndjson', archivo)})
+    assert r.status_code == 200, r.text
+    resultado = r.json()
+    assert (resultado['filas'], resultado['con_error']) == (5, 2)
+    assert [e['linea'] for e in resultado['errores']] == [2, 3]
+    # IMP-1 se inserta en el primer lote y se actualiza en el segundo
+    assert (resultado['insertados'], resultado['actualizados']) == (2, 1)
+    producto = db.query(models.Producto).filter_by(sku='IMP-1').one()
+    assert (producto.nombre, producto.stock) == ('Uno v2', 4)
@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import metricas
+from app.database import engine
+
+def test_sentencia_fallida_no_desplaza_los_tiempos():
+    consultas = metricas.ConsultasRequest()
+    token = metricas.consultas_actuales.set(consultas)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM tabla_inexistente'))
+            assert 'inicio_consulta' not in conn.info
+            conn.execute(text('SELECT 1'))
+            assert 'inicio_consulta' not in conn.info
+    finally:
+        metricas.consultas_actuales.reset(token)
+    assert consultas.cantidad == 2
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+
+from app import models
+
+def _pedido_con_stock(client, db, headers) -> tuple[int, int]:
+    """Pedido del cliente autenticado que reserva 2 unidades; retorna (pedido, producto)"""
+    producto = models.Producto(nombre='p', precio=10, stock=5)
+    envio = models.Envio(tipo_envio='normal', costo_envio=1)
+    db.add_all([producto, envio])
+    db.commit()
+    carrito = client.get('/carrito/me', headers=headers).json()['pk_id_carrito_compra']
+    client.post(f'/carrito/{carrito}/productos', json={'fk_id_producto': producto.pk_id_producto, 'cantidad': 2})
+    r = client.post('/pedidos', json={'fk_id_carrito_compra': carrito, 'fk_id_envio': envio.pk_id_envio})
+    assert r.status_code == 200, r.text
+    return r.json()['pk_id_pedido'], producto.pk_id_producto
+
+def _stock(client, producto: int) -> int:
+    return client.get('/productos/stock', params={'ids': [producto]}).json()[0]['stock']
+
+def test_cancelar_pedido_solo_dueno_o_admin(client, db, crear_cliente):
+    _, dueno = crear_cliente('dueno@x.com')
+    _, otro = crear_cliente('otro@x.com')
+    pedido, producto = _pedido_con_stock(client, db, dueno)
+    assert _stock(client, producto) == 3
+
+    assert client.delete(f'/pedidos/{pedido}').status_code == 401
+    assert client.delete(f'/pedidos/{pedido}', headers=otro).status_code == 404
+    assert _stock(client, producto) == 3
+
+    r = client.delete(f'/pedidos/{pedido}', headers=dueno)
+    assert r.status_code == 200 and r.json() == {'deleted': True}
+    assert _stock(client, producto) == 5
+    assert client.delete(f'/pedidos/{pedido}', headers=dueno).status_code == 404
+
+def test_admin_cancela_pedido_ajeno(client, db, crear_cliente):
+    _, cliente = crear_cliente('cliente@x.com')
+    _, admin = crear_cliente('admin@x.com', admin=True)
+    pedido, producto = _pedido_con_stock(client, db, cliente)
+    assert client.delete(f'/pedidos/{pedido}', headers=admin).status_code == 200
+    assert _stock(client, producto) == 5
+
+def test_venta_de_pedido_liberado_es_404_y_la_pagada_no_se_libera(client, db, crear_cliente):
+    _, cliente = crear_cliente('venta@x.com')
+    _, admin = crear_cliente('admin-venta@x.com', admin=True)
+    liberado, producto = _pedido_con_stock(client, db, cliente)
+    pagado, _ = _pedido_con_stock(client, db, cliente)
+    assert client.post('/ventas', json={'fk_id_pedido': pagado, 'metodo_pago': 'Efectivo', 'total': 21}).status_code == 200
+    db.execute(update(models.Pedido).where(models.Pedido.pk_id_pedido.in_((liberado, pagado))).values(fecha_pedido=datetime(2000, 1, 1)))
+    db.commit()
+
+    assert client.post('/pedidos/liberar-vencidos', headers=admin).json()['cancelados'] >= 1
+    assert _stock(client, producto) == 5
+    r = client.post('/ventas', json={'fk_id_pedido': liberado, 'metodo_pago': 'Efectivo', 'total': 21})
+    assert (r.status_code, r.json()['detail']) == (404, 'Pedido no existe')
+    assert db.scalar(select(func.count()).select_from(models.Venta).where(models.Venta.fk_id_pedido == liberado)) == 0
+    assert db.get(models.Pedido, pagado) is not None
@@ -0,0 +1,20 @@
+from app import models
+
+def _productos(db, marca: str, n: int) -> list[int]:
+    productos = [models.Producto(nombre=f'{marca} {i}', marca=marca, precio=i + 1) for i in range(n)]
+    db.add_all(productos)
+    db.commit()
+    return [p.pk_id_producto for p in productos]
+
+def test_paginacion_por_cursor_recorre_todo_el_catalogo(client, db):
+    ids = _productos(db, 'Paginada', 5)
+    vistos, cursor = [], None
+    while True:
+        params = {'marca': 'Paginada', 'limit': 2} | ({'cursor': cursor} if cursor is not None else {})
+        pagina = client.get('/productos', params=params).json()
+        assert len(pagina['items']) <= 2
+        vistos += [p['pk_id_producto'] for p in pagina['items']]
+        cursor = pagina['next_cursor']
+        if cursor is None:
+            break
+    assert vistos == ids
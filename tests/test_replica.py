@@ -0,0 +1,58 @@
+import time
+
+import pytest
+from fastapi import Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from app import database
+
+def _peticion(cookie: str = None) -> Request:
+    cabeceras = [(b'cookie', f'{database.COOKIE_ESCRITURA}={cookie}'.encode())] if cookie is not None else []
+    return Request({'type': 'http', 'headers': cabeceras})
+
+def _sesion_de_lectura(cookie: str = None):
+    """La sesión que get_read_db entrega a una ruta de solo lectura"""
+    generador = database.get_read_db(_peticion(cookie))
+    db = next(generador)
+    generador.close()
+    return db
+
+@pytest.fixture
+def replica(monkeypatch, tmp_path):
+    """Una segunda base como réplica, con los contadores y el estado de caída aislados"""
+    motor = create_engine(f'sqlite:///{tmp_path}/replica.db')
+    monkeypatch.setattr(database, 'ReadSessionLocal', sessionmaker(bind=motor))
+    monkeypatch.setattr(database, 'lecturas', {'replica': 0, 'primaria': 0, 'fallos_replica': 0})
+    monkeypatch.setattr(database, '_replica_caida_hasta', 0.0)
+    yield motor
+    motor.dispose()
+
+def test_marcar_escritura_fija_la_ventana_en_la_cookie():
+    response = Response()
+    database.marcar_escritura(response)
+    cookie = response.headers['set-cookie']
+    assert cookie.startswith(f'{database.COOKIE_ESCRITURA}=') and 'HttpOnly' in cookie
+    hasta = float(cookie.split(';')[0].split('=')[1])
+    assert time.time() < hasta <= time.time() + database.DB_LECTURA_PRIMARIA_SEGUNDOS + 1
+
+def test_lecturas_van_a_la_primaria_solo_tras_una_escritura(replica):
+    assert _sesion_de_lectura().get_bind() is replica
+    assert _sesion_de_lectura(f'{time.time() - 1:.0f}').get_bind() is replica
+    assert _sesion_de_lectura('no-es-un-numero').get_bind() is replica
+    assert _sesion_de_lectura(f'{time.time() + 60:.0f}').get_bind() is database.engine
+    assert database.lecturas == {'replica': 3, 'primaria': 1, 'fallos_replica': 0}
+
+def test_replica_caida_pasa_a_la_primaria_durante_el_reintento(replica, monkeypatch, tmp_path):
+    caida = create_engine(f'sqlite:///{tmp_path}/no-existe/replica.db')
+    monkeypatch.setattr(database, 'ReadSessionLocal', sessionmaker(bind=caida))
+
+    assert _sesion_de_lectura().get_bind() is database.engine
+    assert database.lecturas['fallos_replica'] == 1
+    assert not database.estado_replica()['disponible']
+
+    # Mientras dura la espera ni siquiera se intenta la réplica, aunque ya responda
+    monkeypatch.setattr(database, 'ReadSessionLocal', sessionmaker(bind=replica))
+    assert _sesion_de_lectura().get_bind() is database.engine
+    assert database.lecturas == {'replica': 0, 'primaria': 2, 'fallos_replica': 1}
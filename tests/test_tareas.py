@@ -0,0 +1,73 @@
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from app import models, tareas
+
+T = models.Tarea
+
+def _crear_categoria(db, descripcion: str) -> None:
+    db.add(models.Categoria(descripcion=descripcion))
+
+tareas.registrar('prueba.crear_categoria', _crear_categoria)
+
+def _reclamada(db, descripcion: str) -> tuple:
+    tareas.encolar(db, 'prueba.crear_categoria', descripcion=descripcion)
+    db.commit()
+    (fila,) = [f for f in tareas.reclamar(db, 100) if descripcion in f[2]]
+    return fila
+
+def _categorias(db, descripcion: str) -> int:
+    return len(db.execute(select(models.Categoria).where(models.Categoria.descripcion == descripcion)).all())
+
+def _reclamar_de_nuevo(db, pk_id_tarea: int) -> None:
+    """Lo que hace otro proceso cuando vence el arriendo"""
+    db.execute(update(T).where(T.pk_id_tarea == pk_id_tarea).values(intentos=T.intentos + 1))
+    db.commit()
+
+def test_tarea_con_arriendo_perdido_no_confirma(db):
+    pk, tipo, carga, intentos = _reclamada(db, 'arriendo-perdido')
+    _reclamar_de_nuevo(db, pk)
+
+    assert tareas.ejecutar_tarea(db, pk, tipo, carga, intentos) is False
+    assert _categorias(db, 'arriendo-perdido') == 0
+    tarea = db.get(T, pk)
+    db.refresh(tarea)
+    assert (tarea.estado, tarea.intentos) == ('en_curso', intentos + 1)
+
+    assert tareas.ejecutar_tarea(db, pk, tipo, carga, intentos + 1) is True
+    assert _categorias(db, 'arriendo-perdido') == 1
+    db.refresh(tarea)
+    assert tarea.estado == 'hecha'
+
+def test_fallo_con_arriendo_perdido_no_pisa_el_estado(db):
+    pk, _, _, intentos = _reclamada(db, 'fallo-tardio')
+    _reclamar_de_nuevo(db, pk)
+
+    assert tareas.registrar_fallo(db, pk, intentos, 'error viejo') is None
+    tarea = db.get(T, pk)
+    db.refresh(tarea)
+    assert (tarea.estado, tarea.ultimo_error) == ('en_curso', None)
+    assert tareas.registrar_fallo(db, pk, intentos + 1, 'error') is True
+    db.refresh(tarea)
+    assert (tarea.estado, tarea.ultimo_error) == ('pendiente', 'error')
+
+def test_purga_borra_solo_las_hechas_viejas(db):
+    pk_vieja, *resto = _reclamada(db, 'purga-vieja')
+    assert tareas.ejecutar_tarea(db, pk_vieja, *resto) is True
+    pk_reciente, *resto = _reclamada(db, 'purga-reciente')
+    assert tareas.ejecutar_tarea(db, pk_reciente, *resto) is True
+    pk_pendiente = _reclamada(db, 'purga-pendiente')[0]
+    db.execute(update(T).where(T.pk_id_tarea.in_((pk_vieja, pk_pendiente))).values(disponible_en=datetime(2000, 1, 1)))
+    db.commit()
+
+    assert tareas.purgar_hechas(db, horas=1, lote=1)['borradas'] >= 1
+    restantes = set(db.scalars(select(T.pk_id_tarea).where(T.pk_id_tarea.in_((pk_vieja, pk_reciente, pk_pendiente)))))
+    assert restantes == {pk_reciente, pk_pendiente}
+
+def test_profundidad_no_cuenta_las_hechas(db):
+    cola = tareas.profundidad(db)
+    assert set(cola) == {'pendiente', 'en_curso', 'fallida'}
+    _reclamada(db, 'profundidad')
+    despues = tareas.profundidad(db)
+    assert despues['pendiente'] + despues['en_curso'] == cola['pendiente'] + cola['en_curso'] + 1